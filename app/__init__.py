@@ -1,8 +1,9 @@
 import os
 from flask import Flask
 from .models import db
-from .routes import general_bp, admin_bp, leader_bp, offline_bp
+from .routes import general_bp, admin_bp, leader_bp, offline_bp, api_bp
 from .auth import auth_bp
+from . import jobs, cache, bootstrap, engine, profiler, metrics, passwords, sessions
 from dotenv import load_dotenv
 from flask_migrate import Migrate # Import Migrate
 from flask_wtf.csrf import CSRFProtect
@@ -17,47 +18,14 @@ def create_app(test_config=None):
     """Create and configure an instance of the Flask application."""
     app = Flask(__name__, instance_relative_config=True) # instance_relative_config=True allows loading config from instance/ folder
     
-    # Add detailed logging for database connection
+    # Statement-level engine logging formats every query; it is opt-in (SQL_LOG=1).
+    # SQL_PROFILER=1 gives per-request query counts and timings far more cheaply.
     import logging
-    logging.basicConfig(level=logging.DEBUG)
-    logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
-    logging.getLogger('sqlalchemy.pool').setLevel(logging.INFO)
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
+    if os.environ.get('SQL_LOG') == '1':
+        logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
+        logging.getLogger('sqlalchemy.pool').setLevel(logging.INFO)
     
-    @app.before_request
-    def initialize_database():
-        if not hasattr(app, '_initialized'):
-            try:
-                with app.app_context():
-                    db.create_all()
-                    logging.info("Database tables created successfully")
-                app._initialized = True
-                
-                # Create admin user if it doesn't exist
-                from werkzeug.security import generate_password_hash
-                from .models import User
-                
-                with app.app_context():
-                    admin = User.query.filter_by(username='admin').first()
-                    if not admin:
-                        admin = User(
-                            username='admin',
-                            password_hash=generate_password_hash('admin123'),
-                            role='admin',
-                            preferred_nav='sidebar'
-                        )
-                        db.session.add(admin)
-                        db.session.commit()
-                        logging.info("Created admin user")
-            except Exception as e:
-                logging.error(f"Error creating database tables: {str(e)}")
-                raise
-        try:
-            with app.app_context():
-                db.create_all()
-                logging.info("Database tables created successfully")
-        except Exception as e:
-            logging.error(f"Error creating database tables: {str(e)}")
-
     # --- Configuration ---
     # Default configuration
     app.config.from_mapping(
@@ -65,6 +33,49 @@ def create_app(test_config=None):
         # Use DATABASE_URL from environment if available, otherwise use SQLite default
         SQLALCHEMY_DATABASE_URI=os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(app.instance_path, 'app.db')}"),
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        DB_ENGINE_PROFILE=os.environ.get('DB_ENGINE_PROFILE', 'web'), # web, worker or cli; see app/engine.py
+        # Optional overrides of single engine profile values; unset keeps the profile's own
+        DB_POOL_SIZE=int(os.environ['DB_POOL_SIZE']) if os.environ.get('DB_POOL_SIZE') else None,
+        DB_MAX_OVERFLOW=int(os.environ['DB_MAX_OVERFLOW']) if os.environ.get('DB_MAX_OVERFLOW') else None,
+        DB_POOL_TIMEOUT=int(os.environ['DB_POOL_TIMEOUT']) if os.environ.get('DB_POOL_TIMEOUT') else None, # Seconds to wait for a connection
+        DB_POOL_RECYCLE=int(os.environ['DB_POOL_RECYCLE']) if os.environ.get('DB_POOL_RECYCLE') else None, # Seconds before a connection is replaced
+        DB_POOL_PRE_PING=os.environ['DB_POOL_PRE_PING'] == '1' if os.environ.get('DB_POOL_PRE_PING') else None,
+        DB_STATEMENT_TIMEOUT_MS=int(os.environ['DB_STATEMENT_TIMEOUT_MS']) if os.environ.get('DB_STATEMENT_TIMEOUT_MS') else None, # PostgreSQL only; 0 disables
+        SQL_PROFILER=os.environ.get('SQL_PROFILER', '0') == '1', # Per-request query count and DB time headers
+        SQL_PROFILER_SAMPLE_RATE=float(os.environ.get('SQL_PROFILER_SAMPLE_RATE', 0.01)), # Share of requests logged; N+1 hits always are
+        SQL_PROFILER_SLOWEST=int(os.environ.get('SQL_PROFILER_SLOWEST', 3)), # Slowest statements kept in each log line
+        SQL_PROFILER_REPEAT_THRESHOLD=int(os.environ.get('SQL_PROFILER_REPEAT_THRESHOLD', 5)), # Same statement this often is flagged N+1
+        METRICS_ENABLED=os.environ.get('METRICS_ENABLED', '1') == '1', # Prometheus metrics at /metrics
+        METRICS_TOKEN=os.environ.get('METRICS_TOKEN'), # Bearer token for scrapers; without it only admins can read /metrics
+        METRICS_DIR=os.environ.get('METRICS_DIR', os.path.join(app.instance_path, 'metrics')), # Shared by all workers on a host
+        METRICS_FLUSH_INTERVAL=float(os.environ.get('METRICS_FLUSH_INTERVAL', 5)), # Seconds between a worker's writes to METRICS_DIR
+        BOOTSTRAP_ON_START=os.environ.get('BOOTSTRAP_ON_START', '0') == '1', # Create schema and seed admin at boot
+        WEB_CONCURRENCY=int(os.environ.get('WEB_CONCURRENCY', 1)), # Worker processes serving the app; gunicorn.conf.py sets it
+        # lru (per worker), filesystem (per host) or redis; more than one worker
+        # defaults to filesystem, so a data change reaches every worker at once
+        CACHE_BACKEND=os.environ.get('CACHE_BACKEND', 'filesystem' if int(os.environ.get('WEB_CONCURRENCY', 1)) > 1 else 'lru'),
+        CACHE_TTL=int(os.environ.get('CACHE_TTL', 300)), # Seconds; also bounds staleness across workers with lru
+        CACHE_MAX_ENTRIES=int(os.environ.get('CACHE_MAX_ENTRIES', 1024)),
+        CACHE_DIR=os.path.join(app.instance_path, 'cache'),
+        CACHE_REDIS_URL=os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'),
+        SESSION_BACKEND=os.environ.get('SESSION_BACKEND', 'database'), # 'database' (server-side, revocable) or 'cookie' (Flask's signed cookie)
+        SESSION_IDLE_TIMEOUT=int(os.environ.get('SESSION_IDLE_TIMEOUT', 24 * 3600)), # Seconds of inactivity before a session expires
+        SESSION_REFRESH_INTERVAL=int(os.environ.get('SESSION_REFRESH_INTERVAL', 300)), # An unchanged session's expiry is written at most this often
+        SESSION_PURGE_INTERVAL=int(os.environ.get('SESSION_PURGE_INTERVAL', 300)), # Seconds between expired-session sweeps per process
+        SESSION_PURGE_BATCH_SIZE=int(os.environ.get('SESSION_PURGE_BATCH_SIZE', 1000)), # Expired sessions deleted per sweep
+        PRINCIPAL_VERSION_TTL=int(os.environ.get('PRINCIPAL_VERSION_TTL', 30)), # Seconds a published auth version is trusted; lru with several workers reads it from the database
+        ADMIN_USERS_PAGE_SIZE=int(os.environ.get('ADMIN_USERS_PAGE_SIZE', 50)), # Rows per page of the admin user list
+        EXPORT_BATCH_SIZE=int(os.environ.get('EXPORT_BATCH_SIZE', 5000)), # Rows fetched and written at a time by exports
+        IMPORT_JOB_WORKERS=int(os.environ.get('IMPORT_JOB_WORKERS', 2)), # Imports that may run at the same time per process
+        IMPORT_UPLOAD_FOLDER=os.path.join(app.instance_path, 'imports'),
+        IMPORT_REPORT_FOLDER=os.path.join(app.instance_path, 'import_reports'), # CSVs of rejected rows, one per job
+        IMPORT_BATCH_SIZE=int(os.environ.get('IMPORT_BATCH_SIZE', 5000)), # Rows read from an upload at a time
+        IMPORT_CHUNK_SIZE=int(os.environ.get('IMPORT_CHUNK_SIZE', 1000)), # Rows per bulk upsert statement
+        IMPORT_HASH_WORKERS=int(os.environ.get('IMPORT_HASH_WORKERS', 0)) or None, # Defaults to the CPU count
+        PASSWORD_HASH_METHOD=os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1'), # werkzeug method and cost; old hashes upgrade at login
+        PASSWORD_HASH_WORKERS=int(os.environ.get('PASSWORD_HASH_WORKERS', 2)), # Login checks hashed at the same time per process
+        PASSWORD_HASH_QUEUE_LIMIT=int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT', 16)), # Waiting logins beyond this get a retry message
+        PASSWORD_HASH_TIMEOUT=float(os.environ.get('PASSWORD_HASH_TIMEOUT', 5)), # Seconds a login waits for its check
     )
 
     if test_config is None:
@@ -81,8 +92,17 @@ def create_app(test_config=None):
         pass # Already exists
 
     # --- Initialize Extensions ---
+    engine.configure(app) # Pool sizing and timeouts for this process's profile
     db.init_app(app)
+    engine.init_app(app) # Pool telemetry
+    profiler.init_app(app) # Opt-in SQL profiling
     migrate.init_app(app, db) # Initialize Migrate with app and db
+    sessions.init_app(app) # Server-side sessions; the cookie only carries an id
+    jobs.init_app(app) # Background import workers
+    passwords.init_app(app) # Login password checks off the request threads
+    cache.init_app(app) # Dashboard aggregate cache
+    metrics.init_app(app) # Request, pool and import metrics
+    bootstrap.init_app(app)
 
     # --- Register Blueprints ---
     app.register_blueprint(general_bp)
@@ -90,6 +110,18 @@ def create_app(test_config=None):
     app.register_blueprint(admin_bp)
     app.register_blueprint(leader_bp)
     app.register_blueprint(offline_bp) # Add /auth prefix to auth routes
+    app.register_blueprint(api_bp) # JSON chart data for the dashboards
+
+    # --- Startup Bootstrap ---
+    # Runs once per process (once in total with gunicorn --preload), not per request
+    if app.config['BOOTSTRAP_ON_START']:
+        bootstrap.bootstrap_database(app)
+
+    @app.cli.command('bootstrap')
+    def bootstrap_command():
+        """Create missing tables and the seed admin user."""
+        bootstrap.bootstrap_database(app)
+        print('Database bootstrapped.')
 
     # --- Database Initialization Command (Optional but helpful) ---
     @app.cli.command('init-db')
@@ -100,9 +132,54 @@ def create_app(test_config=None):
             db.create_all()
         print('Initialized the database.')
 
+    # --- Rollup Maintenance Commands ---
+    from . import rollups, hierarchy
+
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """Recompute the dashboard rollup tables from the raw performance data."""
+        rollups.rebuild()
+        db.session.commit()
+        print('Rollups rebuilt.')
+
+    @app.cli.command('verify-rollups')
+    def verify_rollups_command():
+        """Check the dashboard rollup tables against the raw performance data."""
+        mismatches = rollups.verify()
+        for mismatch in mismatches:
+            print(mismatch)
+        if mismatches:
+            print(f'{len(mismatches)} rollup mismatch(es) found. Run "flask rebuild-rollups" to fix.')
+            raise SystemExit(1)
+        print('Rollups match the performance data.')
+
+    @app.cli.command('rebuild-hierarchy')
+    def rebuild_hierarchy_command():
+        """Recompute the team hierarchy closure table from users.leader_id."""
+        hierarchy.rebuild()
+        db.session.commit()
+        print('Team hierarchy rebuilt.')
+
+    @app.cli.command('verify-hierarchy')
+    def verify_hierarchy_command():
+        """Check the team hierarchy closure table against users.leader_id."""
+        mismatches = hierarchy.verify()
+        for mismatch in mismatches:
+            print(mismatch)
+        if mismatches:
+            print(f'{len(mismatches)} hierarchy mismatch(es) found. Run "flask rebuild-hierarchy" to fix.')
+            raise SystemExit(1)
+        print('Team hierarchy matches users.leader_id.')
+
+    @app.cli.command('purge-sessions')
+    def purge_sessions_command():
+        """Delete expired sessions, in batches."""
+        removed = sessions.purge_expired(app.config['SESSION_PURGE_BATCH_SIZE'])
+        print(f'{removed} expired session(s) removed.')
+
     # --- User Creation Command ---
     import click
-    from werkzeug.security import generate_password_hash
+    from .passwords import hash_password
     from .models import User # Import User model
 
     @app.cli.command('create-user')
@@ -133,7 +210,7 @@ def create_app(test_config=None):
             print("Warning: --can-view-funds flag is ignored for roles other than 'leader'.")
             can_view_funds = False # Ensure it's false if not a leader
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = hash_password(password)
         new_user = User(
             username=username,
             password_hash=hashed_password,
@@ -142,6 +219,8 @@ def create_app(test_config=None):
             can_view_funds=can_view_funds if role == 'leader' else False
         )
         db.session.add(new_user)
+        db.session.flush()
+        hierarchy.attach_users([new_user.id])
         db.session.commit()
         print(f"User '{username}' ({role}) created successfully.")
 
@@ -151,6 +230,13 @@ def create_app(test_config=None):
     def hello():
         return 'Hello, World!'
 
+    # --- Readiness probe: 503 until the schema has been bootstrapped ---
+    @app.route('/readyz')
+    def readyz():
+        if bootstrap.is_ready(app):
+            return {'status': 'ready'}
+        return {'status': 'starting'}, 503
+
     # --- Add Context Processor ---
     @app.context_processor
     def inject_current_year():
@@ -1,8 +1,8 @@
 # This file will contain authentication routes and logic (login, logout, etc.)
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from werkzeug.security import generate_password_hash, check_password_hash
 from .models import User, db # Import User model and db
-from .utils import login_required # Import login_required decorator
+from .utils import login_required, store_principal # Import login_required decorator
+from .passwords import verify_password, HasherBusy
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -25,21 +25,21 @@ def login():
 
         if user is None:
             error = 'Incorrect username.'
-        elif not check_password_hash(user.password_hash, password):
-            error = 'Incorrect password.'
+        else:
+            try:
+                if not verify_password(user, password):
+                    error = 'Incorrect password.'
+            except HasherBusy:
+                flash('Too many people are signing in right now. Please try again in a moment.', 'warning')
+                return render_template('auth/login.html'), 503
 
         if error is None:
+            db.session.commit() # Saves an upgraded password hash, if any
             # Store user info in session
             session.clear()
-            session['user_id'] = user.id
-            session['user_role'] = user.role
-            session['username'] = user.username
+            store_principal(user)
             session['preferred_nav'] = user.preferred_nav
 
-            # Store can_view_funds flag only for leaders
-            if user.role == 'leader':
-                session['user_can_view_funds'] = user.can_view_funds
-
             flash(f'Welcome back, {user.username}!', 'success')
             # Redirect to appropriate dashboard based on role
             if user.role == 'admin':
@@ -0,0 +1,43 @@
+# One-off startup work: schema creation and the seed admin. This runs from
+# `flask bootstrap` or once at worker boot, never inside a request.
+import logging
+from sqlalchemy import inspect
+from .models import db, User
+from . import hierarchy
+from .passwords import hash_password
+
+def init_app(app):
+    app.extensions['bootstrap'] = {'ready': False}
+
+def bootstrap_database(app):
+    """Create missing tables and the seed admin user. Safe to run repeatedly."""
+    with app.app_context():
+        db.create_all()
+        logging.info("Database tables created successfully")
+
+        admin = User.query.filter_by(username='admin').first()
+        if not admin:
+            admin = User(
+                username='admin',
+                password_hash=hash_password('admin123'),
+                role='admin',
+                preferred_nav='sidebar'
+            )
+            db.session.add(admin)
+            db.session.flush()
+            hierarchy.attach_users([admin.id])
+            db.session.commit()
+            logging.info("Created admin user")
+    app.extensions['bootstrap']['ready'] = True
+
+def is_ready(app):
+    """True once bootstrap ran here, or the schema is found to exist already.
+
+    The schema check is only done until it first succeeds, so a ready
+    process never touches the database for this.
+    """
+    state = app.extensions['bootstrap']
+    if not state['ready']:
+        with app.app_context():
+            state['ready'] = inspect(db.engine).has_table(User.__tablename__)
+    return state['ready']
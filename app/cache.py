@@ -0,0 +1,220 @@
+# Cache for dashboard aggregates. Every key embeds the current data version;
+# writers call bump_data_version() after committing, which orphans every
+# cached aggregate at once instead of deleting keys one by one.
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from flask import current_app
+
+try:
+    import fcntl
+except ImportError: # Windows; see FileSystemBackend._locked
+    fcntl = None
+
+MISSING = object()
+VERSION_KEY = 'data_version'
+
+class LRUBackend:
+    """In-process LRU with per-entry TTL. Each gunicorn worker has its own copy."""
+
+    name = 'lru'
+    shared = False # Other workers never see what this one stores
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {} # Never evicted, or an old data version could come back
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def size(self):
+        return len(self._entries)
+
+class FileSystemBackend:
+    """Shared by every worker on one host; the local stand-in for Redis."""
+
+    name = 'filesystem'
+    shared = True
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key.replace('/', '_').replace(':', '__'))
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                value, expires_at = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return MISSING
+        if expires_at is not None and expires_at < time.time():
+            return MISSING
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        # Write then rename so readers in other workers never see half a file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((value, expires_at), f)
+        os.replace(tmp_path, self._path(key))
+
+    @contextmanager
+    def _locked(self, key):
+        """Hold an exclusive lock for ``key`` across every worker on the host."""
+        if fcntl is None: # No flock: only this process's threads are kept apart
+            with self._lock:
+                yield
+            return
+        # set() renames a new file over the key, so the lock lives in a file of its own
+        with open(self._path(key) + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX) # Released when the file closes
+            yield
+
+    def incr(self, key):
+        with self._locked(key):
+            value = self.get(key)
+            value = (0 if value is MISSING else value) + 1
+            self.set(key, value)
+        self.prune()
+        return value
+
+    def prune(self):
+        """Remove expired entries; bumps are rare, so this runs on incr."""
+        for name in os.listdir(self.directory):
+            if name.endswith('.lock'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'rb') as f:
+                    _, expires_at = pickle.load(f)
+                if expires_at is not None and expires_at < time.time():
+                    os.remove(path)
+            except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+                continue
+
+    def size(self):
+        return sum(1 for name in os.listdir(self.directory) if not name.endswith('.lock'))
+
+class RedisBackend:
+    """Shared cache for multi-host deployments. Needs the optional `redis` package."""
+
+    name = 'redis'
+    shared = True
+
+    def __init__(self, url, prefix='affiliate:'):
+        import redis # Optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return MISSING if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl or None)
+
+    def incr(self, key):
+        # Stored pickled like every other value so get() can read it back
+        with self.client.lock(self.prefix + key + ':lock', timeout=5):
+            value = self.get(key)
+            value = (0 if value is MISSING else value) + 1
+            self.set(key, value)
+            return value
+
+    def size(self):
+        return self.client.dbsize()
+
+class AggregateCache:
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def data_version(self):
+        version = self.backend.get(VERSION_KEY)
+        return 0 if version is MISSING else version
+
+    def bump(self):
+        return self.backend.incr(VERSION_KEY)
+
+    def get_or_compute(self, scope, compute):
+        key = f'v{self.data_version()}:{scope}'
+        value = self.backend.get(key)
+        with self._lock:
+            if value is MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is MISSING:
+            value = compute()
+            self.backend.set(key, value, self.ttl)
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.backend.name,
+            'data_version': self.data_version(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'entries': self.backend.size(),
+        }
+
+def create_backend(app):
+    backend = app.config['CACHE_BACKEND']
+    if backend == 'redis':
+        return RedisBackend(app.config['CACHE_REDIS_URL'])
+    if backend == 'filesystem':
+        return FileSystemBackend(app.config['CACHE_DIR'])
+    return LRUBackend(app.config['CACHE_MAX_ENTRIES'])
+
+def init_app(app):
+    app.extensions['aggregate_cache'] = AggregateCache(create_backend(app), app.config['CACHE_TTL'])
+
+def get_cache():
+    return current_app.extensions['aggregate_cache']
+
+def cached(scope, compute):
+    """Return the cached aggregate for ``scope``, computing it on a miss."""
+    return get_cache().get_or_compute(scope, compute)
+
+def bump_data_version():
+    """Invalidate every cached aggregate. Call after committing a data change."""
+    return get_cache().bump()
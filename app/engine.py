@@ -0,0 +1,205 @@
+# Database engine profiles and connection-pool telemetry. A process picks
+# its profile (web, worker or cli) with DB_ENGINE_PROFILE; DB_* settings
+# override single values of the chosen profile.
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from .models import db
+
+PROFILES = {
+    # Gunicorn workers: requests plus the in-process import threads, short
+    # statements, and fail fast when the pool is exhausted
+    'web': dict(pool_size=5, max_overflow=5, pool_timeout=10, pool_recycle=1800,
+                pool_pre_ping=True, statement_timeout_ms=15000),
+    # Import jobs: few connections held for long, big statements
+    'worker': dict(pool_size=2, max_overflow=0, pool_timeout=60, pool_recycle=1800,
+                   pool_pre_ping=True, statement_timeout_ms=600000),
+    # One-off commands (migrations, bootstrap, rollup rebuilds)
+    'cli': dict(pool_size=1, max_overflow=0, pool_timeout=30, pool_recycle=-1,
+                pool_pre_ping=False, statement_timeout_ms=0),
+}
+
+OVERRIDES = {
+    'DB_POOL_SIZE': 'pool_size',
+    'DB_MAX_OVERFLOW': 'max_overflow',
+    'DB_POOL_TIMEOUT': 'pool_timeout',
+    'DB_POOL_RECYCLE': 'pool_recycle',
+    'DB_POOL_PRE_PING': 'pool_pre_ping',
+    'DB_STATEMENT_TIMEOUT_MS': 'statement_timeout_ms',
+}
+
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0) # Seconds
+
+_statement_timeout = contextvars.ContextVar('statement_timeout', default=None)
+
+class PoolTelemetry:
+    """Counters for one engine's pool, updated from pool events."""
+
+    def __init__(self, pool_size, max_overflow):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.checkouts = 0
+        self.connects = 0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self.invalidations = 0
+        self.wait_count = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def observe_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.wait_count += 1
+            self.wait_sum += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.wait_buckets[i] += 1
+            if timed_out:
+                self.timeouts += 1
+
+    def attach(self, engine):
+        # Listening on the engine rather than engine.pool keeps the
+        # listeners when dispose() swaps in a new pool (e.g. after a fork)
+        self._engine = engine
+        if isinstance(engine.pool, TimedQueuePool):
+            engine.pool.telemetry = self
+
+        @event.listens_for(engine, 'connect')
+        def on_connect(dbapi_connection, connection_record):
+            with self._lock:
+                self.connects += 1
+                # A connection opened while the pool is past pool_size is overflow
+                if hasattr(engine.pool, 'overflow') and engine.pool.overflow() > 0:
+                    self.overflow_events += 1
+
+        @event.listens_for(engine, 'checkout')
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            with self._lock:
+                self.checkouts += 1
+
+        @event.listens_for(engine, 'invalidate')
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            with self._lock:
+                self.invalidations += 1
+
+    def snapshot(self):
+        pool = self._engine.pool
+        in_use = pool.checkedout() if hasattr(pool, 'checkedout') else None
+        with self._lock:
+            return {
+                'pool_class': type(pool).__name__,
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'in_use': in_use,
+                'idle': pool.checkedin() if hasattr(pool, 'checkedin') else None,
+                'overflow': max(pool.overflow(), 0) if hasattr(pool, 'overflow') else None,
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'overflow_events': self.overflow_events,
+                'timeouts': self.timeouts,
+                'invalidations': self.invalidations,
+                'wait_count': self.wait_count,
+                'wait_seconds_sum': round(self.wait_sum, 6),
+                'wait_seconds_max': round(self.wait_max, 6),
+                'wait_buckets': dict(zip(WAIT_BUCKETS, self.wait_buckets)),
+            }
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection."""
+
+    telemetry = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self.telemetry is not None:
+                self.telemetry.observe_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        if self.telemetry is not None:
+            self.telemetry.observe_wait(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.telemetry = self.telemetry
+        return pool
+
+def resolve_profile(config):
+    name = config['DB_ENGINE_PROFILE']
+    if name not in PROFILES:
+        raise ValueError(f"Unknown DB_ENGINE_PROFILE '{name}'. Choose from: {', '.join(PROFILES)}")
+    profile = dict(PROFILES[name])
+    for key, option in OVERRIDES.items():
+        if config.get(key) is not None:
+            profile[option] = config[key]
+    return profile
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured profile and database."""
+    profile = resolve_profile(config)
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {'pool_pre_ping': profile['pool_pre_ping']}
+
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # In-memory SQLite keeps its single-connection pool
+        return options
+
+    options.update(poolclass=TimedQueuePool,
+                   pool_size=profile['pool_size'],
+                   max_overflow=profile['max_overflow'],
+                   pool_timeout=profile['pool_timeout'],
+                   pool_recycle=profile['pool_recycle'])
+    if url.get_backend_name() == 'postgresql' and profile['statement_timeout_ms']:
+        # Set at connect time, so it costs nothing per statement
+        options['connect_args'] = {'options': f"-c statement_timeout={int(profile['statement_timeout_ms'])}"}
+    return options
+
+def configure(app):
+    """Fill in SQLALCHEMY_ENGINE_OPTIONS. Must run before db.init_app()."""
+    options = engine_options(app.config)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}) # Explicit options win
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+def init_app(app):
+    """Attach pool telemetry to the engine. Must run after db.init_app()."""
+    profile = resolve_profile(app.config)
+    with app.app_context():
+        engine = db.engine
+    telemetry = PoolTelemetry(profile['pool_size'], profile['max_overflow'])
+    telemetry.attach(engine)
+
+    @event.listens_for(engine, 'begin')
+    def apply_statement_timeout(connection):
+        timeout_ms = _statement_timeout.get()
+        if timeout_ms is not None and connection.dialect.name == 'postgresql':
+            connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout_ms)}')
+
+    app.extensions['engine_profile'] = {'name': app.config['DB_ENGINE_PROFILE'], 'telemetry': telemetry}
+
+@contextmanager
+def statement_timeout(profile_name):
+    """Use another profile's statement timeout for transactions begun in this context.
+
+    Lets an import running inside a web worker get the worker timeout
+    without a second engine.
+    """
+    token = _statement_timeout.set(PROFILES[profile_name]['statement_timeout_ms'])
+    try:
+        yield
+    finally:
+        _statement_timeout.reset(token)
+
+def pool_stats(app):
+    state = app.extensions['engine_profile']
+    return dict(profile=state['name'], **state['telemetry'].snapshot())
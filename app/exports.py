@@ -0,0 +1,171 @@
+# Raw performance exports. Rows are read with yield_per (a server-side cursor
+# on PostgreSQL) and written out as they arrive, so an export of any size
+# starts downloading at once and holds only one batch in memory.
+import csv
+import io
+import zipfile
+from xml.sax.saxutils import escape
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from .models import db, User, PerformanceData, UserHierarchy
+from .periods import format_period, range_clause
+
+COLUMNS = ['offline_username', 'period', 'sales_amount', 'leader_username'] # Importable as a performance upload
+FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+XLSX_SHEET_ROWS = 1048575 # Excel's row limit less the header; longer exports continue on another sheet
+
+def export_query(start=None, end=None, leader_id=None):
+    """Performance rows in COLUMNS order for a period key range, optionally for everyone under one leader.
+
+    Rows come in (period, user) order, which the period index already has,
+    so a company-wide export streams without a sort.
+    """
+    member = aliased(User)
+    leader = aliased(User)
+    stmt = select(member.username, PerformanceData.period, PerformanceData.metric_value, leader.username)\
+        .join(member, member.id == PerformanceData.offline_user_id)\
+        .outerjoin(leader, leader.id == member.leader_id)\
+        .where(*range_clause(PerformanceData.period, start, end))\
+        .order_by(PerformanceData.period, PerformanceData.offline_user_id)
+    if leader_id is not None:
+        stmt = stmt.join(UserHierarchy, UserHierarchy.descendant_id == member.id)\
+            .where(UserHierarchy.ancestor_id == leader_id, UserHierarchy.depth > 0)
+    return stmt
+
+def batches(stmt):
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+def stream_csv(stmt):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue()
+    for rows in batches(stmt):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows((username, format_period(period), value, leader or '')
+                        for username, period, value, leader in rows)
+        yield buffer.getvalue()
+
+class ChunkSink(io.RawIOBase):
+    """A write-only, unseekable file that hands back whatever was written since the last take()."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def xlsx_cell(column, row_number, value):
+    reference = f'{column}{row_number}'
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return f'<c r="{reference}" t="inlineStr"><is><t>{escape(value)}</t></is></c>'
+    return f'<c r="{reference}"><v>{value}</v></c>'
+
+def xlsx_row(row_number, values):
+    cells = ''.join(xlsx_cell(column, row_number, value) for column, value in zip('ABCD', values))
+    return f'<row r="{row_number}">{cells}</row>'
+
+def stream_xlsx(stmt):
+    """Write the workbook as a zip straight onto the response.
+
+    Sheets use inline strings so nothing has to be held back for a shared
+    string table, and the workbook parts that list the sheets are written
+    last, once the number of sheets is known.
+    """
+    sink = ChunkSink()
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED)
+    sheets = 0
+    row_number = 0
+
+    def open_sheet():
+        nonlocal sheets, row_number
+        sheets += 1
+        handle = archive.open(f'xl/worksheets/sheet{sheets}.xml', 'w', force_zip64=True)
+        handle.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                     b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+        handle.write(xlsx_row(1, COLUMNS).encode())
+        row_number = 1
+        return handle
+
+    def close_sheet(handle):
+        handle.write(b'</sheetData></worksheet>')
+        handle.close()
+
+    sheet = open_sheet()
+    for rows in batches(stmt):
+        lines = []
+        for username, period, value, leader in rows:
+            if row_number > XLSX_SHEET_ROWS:
+                sheet.write(''.join(lines).encode())
+                lines = []
+                close_sheet(sheet)
+                sheet = open_sheet()
+            row_number += 1
+            lines.append(xlsx_row(row_number, (username, format_period(period), value, leader)))
+        sheet.write(''.join(lines).encode())
+        yield sink.take()
+    close_sheet(sheet)
+
+    numbers = range(1, sheets + 1)
+    archive.writestr('[Content_Types].xml',
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        + ''.join(f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+                  'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                  for n in numbers)
+        + '</Types>')
+    archive.writestr('_rels/.rels',
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/></Relationships>')
+    archive.writestr('xl/workbook.xml',
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+        + ''.join(f'<sheet name="Performance {n}" sheetId="{n}" r:id="rId{n}"/>' for n in numbers)
+        + '</sheets></workbook>')
+    archive.writestr('xl/_rels/workbook.xml.rels',
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        + ''.join(f'<Relationship Id="rId{n}" '
+                  'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                  f'Target="worksheets/sheet{n}.xml"/>' for n in numbers)
+        + '</Relationships>')
+    archive.close()
+    yield sink.take()
+
+def stream_export(fmt, stmt):
+    return stream_csv(stmt) if fmt == 'csv' else stream_xlsx(stmt)
+
+def export_filename(scope, fmt, start, end):
+    if start is None and end is None:
+        period = ''
+    else:
+        period = f"_{format_period(start) if start else 'start'}_to_{format_period(end) if end else 'latest'}"
+    return f'performance_{scope}{period}.{fmt}'
@@ -0,0 +1,92 @@
+# Team hierarchy of any depth (regional leaders over team leaders over
+# members), stored as a closure table. Writers call these helpers inside
+# their own transaction whenever users are created or leader_id changes, the
+# same way they call the rollup helpers.
+from sqlalchemy import select, insert, delete, literal, and_, true
+from sqlalchemy.orm import aliased
+from .models import db, User, UserHierarchy
+
+MAX_DEPTH = 32 # Guards the rebuild against a leader_id cycle
+
+def attach_users(user_ids):
+    """Add closure rows for new users, whose leaders must already be in the hierarchy.
+
+    New users have no descendants yet, so each one gets its own row plus one
+    row per ancestor of its leader.
+    """
+    if not user_ids:
+        return
+    user_ids = list(user_ids)
+    db.session.execute(insert(UserHierarchy).from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(User.id, User.id, literal(0)).where(User.id.in_(user_ids))
+    ))
+    parent = aliased(UserHierarchy)
+    db.session.execute(insert(UserHierarchy).from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(parent.ancestor_id, User.id, parent.depth + 1)
+        .join(parent, parent.descendant_id == User.leader_id)
+        .where(User.id.in_(user_ids))
+    ))
+
+def move_subtree(user_id, new_leader_id):
+    """Re-link a user and everything under it below ``new_leader_id`` (or make it a root).
+
+    Two set-based statements however big the subtree: drop the links from
+    the old ancestors into the subtree, then link every new ancestor to
+    every subtree node. The caller sets users.leader_id.
+    """
+    subtree = select(UserHierarchy.descendant_id).where(UserHierarchy.ancestor_id == user_id)
+    old_ancestors = select(UserHierarchy.ancestor_id)\
+        .where(UserHierarchy.descendant_id == user_id, UserHierarchy.depth > 0)
+    db.session.execute(delete(UserHierarchy).where(
+        UserHierarchy.descendant_id.in_(subtree),
+        UserHierarchy.ancestor_id.in_(old_ancestors),
+    ))
+    if new_leader_id is None:
+        return
+    above = aliased(UserHierarchy)
+    below = aliased(UserHierarchy)
+    db.session.execute(insert(UserHierarchy).from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(above.ancestor_id, below.descendant_id, above.depth + below.depth + 1)
+        .select_from(above).join(below, true()) # Every pair: a cross join
+        .where(below.ancestor_id == user_id, above.descendant_id == new_leader_id)
+    ))
+
+def is_in_subtree(root_id, user_id):
+    """True if ``user_id`` is ``root_id`` or somewhere below it."""
+    return db.session.query(
+        select(UserHierarchy.depth).where(UserHierarchy.ancestor_id == root_id,
+                                          UserHierarchy.descendant_id == user_id).exists()
+    ).scalar()
+
+def subtree_ids(root_id, min_depth=0):
+    """Select of the ids at or below ``root_id``; min_depth=1 leaves the root out."""
+    return select(UserHierarchy.descendant_id)\
+        .where(UserHierarchy.ancestor_id == root_id, UserHierarchy.depth >= min_depth)
+
+# --- Rebuild and verification ---
+
+def expected():
+    """Every (ancestor, descendant, depth) implied by users.leader_id, via a recursive CTE."""
+    tree = select(User.id.label('ancestor_id'), User.id.label('descendant_id'), literal(0).label('depth'))\
+        .cte('tree', recursive=True)
+    tree = tree.union_all(
+        select(tree.c.ancestor_id, User.id, tree.c.depth + 1)
+        .join(User, and_(User.leader_id == tree.c.descendant_id, tree.c.depth < MAX_DEPTH))
+    )
+    return select(tree.c.ancestor_id, tree.c.descendant_id, tree.c.depth)
+
+def rebuild():
+    db.session.execute(delete(UserHierarchy))
+    db.session.execute(insert(UserHierarchy).from_select(['ancestor_id', 'descendant_id', 'depth'], expected()))
+
+def verify():
+    """Compare the closure table with users.leader_id and return a list of mismatches."""
+    stored = set(db.session.execute(
+        select(UserHierarchy.ancestor_id, UserHierarchy.descendant_id, UserHierarchy.depth)).all())
+    actual = set(db.session.execute(expected()).all())
+    mismatches = [f'user_hierarchy {row}: missing' for row in sorted(actual - stored)]
+    mismatches += [f'user_hierarchy {row}: unexpected' for row in sorted(stored - actual)]
+    return mismatches
@@ -0,0 +1,10 @@
+from .common import ImportResult
+from .readers import UploadReader
+from .performance import import_performance_frame, import_performance_batches, REQUIRED_COLUMNS as PERFORMANCE_COLUMNS
+from .users import import_users_frame, import_user_batches, REQUIRED_COLUMNS as USER_COLUMNS
+
+__all__ = [
+    'ImportResult', 'UploadReader',
+    'import_performance_frame', 'import_performance_batches', 'PERFORMANCE_COLUMNS',
+    'import_users_frame', 'import_user_batches', 'USER_COLUMNS',
+]
@@ -0,0 +1,133 @@
+import time
+from contextlib import contextmanager
+import pandas as pd
+from flask import current_app
+from sqlalchemy.dialects import postgresql, sqlite
+from ..models import db
+
+DEFAULT_CHUNK_SIZE = 1000
+
+class ImportResult:
+    """Counts and rejected rows collected while importing one file.
+
+    Rejected rows are kept column-wise, one frame per batch with the row
+    number, the file's own columns and the error text, so a file with
+    thousands of bad rows costs a few frames rather than thousands of
+    message strings. With ``dry_run`` set the importers validate and count
+    but leave the data as it was.
+    """
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.rejected = []
+        self.error_counts = {}
+        self.warnings = []
+        self.timings = {}
+
+    @property
+    def saved(self):
+        return self.created + self.updated
+
+    @property
+    def error_count(self):
+        return sum(len(frame) for frame in self.rejected)
+
+    def reject(self, df, checks, columns):
+        """Record the rows of ``df`` that fail any of ``checks`` and return the invalid mask.
+
+        ``checks`` holds (label, mask, message) triples, where ``message`` is
+        a string or a Series of per-row strings. ``columns`` are the file
+        columns copied into the report; leave out anything secret.
+        """
+        invalid = pd.Series(False, index=df.index)
+        messages = pd.Series('', index=df.index, dtype=object)
+        for label, mask, message in checks:
+            count = int(mask.sum())
+            if not count:
+                continue
+            invalid |= mask
+            self.error_counts[label] = self.error_counts.get(label, 0) + count
+            text = message[mask] if isinstance(message, pd.Series) else message
+            messages[mask] = messages[mask] + ' ' + text
+        if invalid.any():
+            frame = pd.DataFrame({'row': row_numbers(df)[invalid.to_numpy()]}, index=df.index[invalid])
+            for column in columns:
+                frame[column] = clean_column(df, column)[invalid]
+            frame['error'] = messages[invalid].str.strip()
+            self.rejected.append(frame)
+            self.skipped += len(frame)
+        return invalid
+
+    def error_samples(self, limit):
+        """The first ``limit`` row errors as 'Row N: message' strings."""
+        samples = []
+        for frame in self.rejected:
+            for row, error in zip(frame['row'].head(limit - len(samples)), frame['error']):
+                samples.append(f'Row {row}: {error}')
+            if len(samples) >= limit:
+                break
+        return samples
+
+    def write_report(self, path):
+        """Write the rejected rows to a CSV file; returns False if there were none."""
+        if not self.rejected:
+            return False
+        pd.concat(self.rejected, ignore_index=True).to_csv(path, index=False)
+        return True
+
+    def warn(self, message):
+        if message not in self.warnings:
+            self.warnings.append(message)
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block and add it to the named stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - started
+
+    def format_timings(self):
+        return ', '.join(f'{name} {seconds:.2f}s' for name, seconds in self.timings.items())
+
+def timed_batches(batches, result):
+    """Yield batches, charging the time spent reading them to the parse stage."""
+    iterator = iter(batches)
+    while True:
+        with result.stage('parse'):
+            batch = next(iterator, None)
+        if batch is None:
+            return
+        yield batch
+
+def chunk_size():
+    return current_app.config.get('IMPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def clean_column(df, column):
+    """Return a column as stripped strings, with missing cells as ''."""
+    if column not in df.columns:
+        return pd.Series('', index=df.index)
+    series = df[column]
+    return series.where(series.notna(), '').astype(str).str.strip()
+
+def row_numbers(df):
+    """Spreadsheet row numbers for a frame (header is row 1)."""
+    return df.index + 2
+
+def dialect_insert():
+    """Return the dialect's INSERT construct if it supports ON CONFLICT, else None."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert
+    if dialect == 'sqlite':
+        return sqlite.insert
+    return None
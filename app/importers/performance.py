@@ -0,0 +1,168 @@
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import func, update, bindparam
+from ..models import db, User, PerformanceData
+from .. import rollups
+from ..periods import PERIOD_REGEX
+from .common import ImportResult, chunk_size, chunks, clean_column, dialect_insert, timed_batches
+
+REQUIRED_COLUMNS = ['offline_username', 'period', 'sales_amount']
+# metric_value is Numeric(15, 2): amounts must stay below 10**13 once rounded to cents
+AMOUNT_TYPE = PerformanceData.__table__.c.metric_value.type
+MAX_AMOUNT = 10 ** (AMOUNT_TYPE.precision - AMOUNT_TYPE.scale)
+
+def load_offline_users():
+    """Map lower-cased offline usernames to ids, and ids to leader ids, with a single query."""
+    user_ids = {}
+    leader_of = {}
+    rows = db.session.query(func.lower(User.username), User.id, User.leader_id).filter(User.role == 'offline')
+    for username, user_id, leader_id in rows:
+        user_ids[username] = user_id
+        leader_of[user_id] = leader_id
+    return user_ids, leader_of
+
+def load_existing_values(user_ids, periods):
+    """Return the stored value of each (user_id, period) pair among the given users and periods."""
+    if not user_ids or not periods:
+        return {}
+    rows = db.session.query(PerformanceData.offline_user_id, PerformanceData.period, PerformanceData.metric_value)\
+        .filter(PerformanceData.offline_user_id.in_(user_ids), PerformanceData.period.in_(periods))
+    return {(user_id, period): value for user_id, period, value in rows}
+
+def validate_performance_frame(df, user_ids, result):
+    """Validate a performance frame column-wise, rejecting bad rows into ``result``.
+
+    Returns the valid rows as a frame with offline_user_id, period and
+    metric_value columns.
+    """
+    usernames = clean_column(df, 'offline_username')
+    periods = clean_column(df, 'period')
+    amount_strings = clean_column(df, 'sales_amount')
+    amounts = pd.to_numeric(amount_strings, errors='coerce')
+    resolved = usernames.str.lower().map(user_ids)
+
+    missing = (usernames == '') | (periods == '') | (amount_strings == '')
+    period_parts = periods.str.extract(f'^{PERIOD_REGEX}$')
+    bad_period = period_parts[0].isna()
+    bad_amount = amounts.isna() | (amounts.abs() == float('inf'))
+    out_of_range = ~bad_amount & (amounts.round(AMOUNT_TYPE.scale).abs() >= MAX_AMOUNT)
+    unknown_user = (usernames != '') & resolved.isna()
+
+    invalid = result.reject(df, [
+        ('Missing value', missing, 'Missing offline_username, period, or sales_amount.'),
+        ('Invalid period', bad_period,
+         "Invalid period '" + periods + "'. Use YYYY-MM with a month from 01 to 12."),
+        ('Invalid sales_amount', bad_amount, "Invalid sales_amount '" + amount_strings + "'. Must be a number."),
+        ('Out-of-range sales_amount', out_of_range,
+         "sales_amount '" + amount_strings + f"' is out of range. The largest allowed is {MAX_AMOUNT - rollups.CENT:,}."),
+        ('Unknown offline user', unknown_user, "Offline user '" + usernames + "' not found."),
+    ], REQUIRED_COLUMNS)
+
+    return pd.DataFrame({
+        'offline_user_id': resolved[~invalid].astype('int64'),
+        'period': period_parts[0][~invalid].astype('int64') * 100 + period_parts[1][~invalid].astype('int64'),
+        'metric_value': amounts[~invalid].astype(float).round(2),
+    })
+
+def upsert_performance_rows(rows, existing):
+    """Write rows keyed on (offline_user_id, period), one statement per chunk.
+
+    Callers pass only new or changed rows. ``existing`` is only consulted on
+    databases without ON CONFLICT support.
+    """
+    table = PerformanceData.__table__
+    insert = dialect_insert()
+    size = chunk_size()
+
+    if insert is not None:
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.offline_user_id, table.c.period],
+            set_={
+                'metric_value': stmt.excluded.metric_value,
+                'recorded_at': stmt.excluded.recorded_at,
+            }
+        )
+        for chunk in chunks(rows, size):
+            db.session.execute(stmt, chunk)
+        return
+
+    # No ON CONFLICT support: split on the keys we already know about
+    new_rows = [row for row in rows if (row['offline_user_id'], row['period']) not in existing]
+    changed_rows = [
+        {'b_user_id': row['offline_user_id'], 'b_period': row['period'],
+         'metric_value': row['metric_value'], 'recorded_at': row['recorded_at']}
+        for row in rows if (row['offline_user_id'], row['period']) in existing
+    ]
+    stmt = update(table)\
+        .where(table.c.offline_user_id == bindparam('b_user_id'))\
+        .where(table.c.period == bindparam('b_period'))\
+        .values(metric_value=bindparam('metric_value'), recorded_at=bindparam('recorded_at'))
+    for chunk in chunks(new_rows, size):
+        db.session.execute(table.insert(), chunk)
+    for chunk in chunks(changed_rows, size):
+        db.session.execute(stmt, chunk)
+
+def import_performance_frame(df, result=None, users=None, staged=None):
+    """Validate and upsert a performance frame and its rollups. The caller commits or rolls back.
+
+    A dry run stops after counting what would be created, updated and left
+    unchanged. Nothing is written, so ``staged`` carries the values earlier
+    batches would have stored, keyed like ``existing``.
+    """
+    result = result or ImportResult()
+    user_ids, leader_of = users or load_offline_users()
+    with result.stage('validate'):
+        valid = validate_performance_frame(df, user_ids, result)
+    if valid.empty:
+        return result
+
+    # Later rows for the same user and period win, and count as updates like before
+    duplicates = int(valid.duplicated(['offline_user_id', 'period'], keep='last').sum())
+    valid = valid.drop_duplicates(['offline_user_id', 'period'], keep='last')
+
+    existing = load_existing_values(valid['offline_user_id'].unique().tolist(), valid['period'].unique().tolist())
+    if staged:
+        existing.update((key, staged[key]) for key in zip(valid['offline_user_id'].tolist(),
+                                                          valid['period'].tolist()) if key in staged)
+    # Diff against the stored values and write only new and changed rows, so a
+    # re-upload with a few corrections touches just those rows and their rollups
+    recorded_at = datetime.utcnow()
+    rows = []
+    changes = []
+    for user_id, period, value in zip(valid['offline_user_id'].tolist(),
+                                      valid['period'].tolist(),
+                                      valid['metric_value'].tolist()):
+        key = (user_id, period)
+        is_new = key not in existing
+        delta = rollups.to_decimal(value) - rollups.to_decimal(existing.get(key))
+        if not is_new and delta == 0:
+            result.unchanged += 1
+            continue
+        if is_new:
+            result.created += 1
+        else:
+            result.updated += 1
+        rows.append({'offline_user_id': user_id, 'period': period, 'metric_value': value, 'recorded_at': recorded_at})
+        changes.append((user_id, period, delta, is_new))
+    result.updated += duplicates
+    if result.dry_run:
+        if staged is not None:
+            staged.update(((row['offline_user_id'], row['period']), row['metric_value']) for row in rows)
+        return result
+    if not rows:
+        return result
+
+    with result.stage('write'):
+        upsert_performance_rows(rows, existing)
+        rollups.record_performance_changes(changes, leader_of)
+    return result
+
+def import_performance_batches(batches, result=None):
+    """Import a stream of performance frames, resolving usernames only once."""
+    result = result or ImportResult()
+    users = load_offline_users()
+    staged = {} if result.dry_run else None
+    for df in timed_batches(batches, result):
+        import_performance_frame(df, result, users, staged)
+    return result
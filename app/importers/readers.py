@@ -0,0 +1,95 @@
+import codecs
+import pandas as pd
+from flask import current_app
+from openpyxl import load_workbook
+
+DEFAULT_BATCH_SIZE = 5000
+ENCODING_PROBE_BLOCK = 64 * 1024
+
+def batch_size():
+    return current_app.config.get('IMPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+def detect_csv_encoding(stream):
+    """Return 'utf-8' if the whole stream decodes as UTF-8, else 'latin1'.
+
+    Decodes block by block so the check runs in constant memory, then
+    rewinds the stream for the real read.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        while True:
+            block = stream.read(ENCODING_PROBE_BLOCK)
+            if not block:
+                decoder.decode(b'', final=True)
+                return 'utf-8'
+            decoder.decode(block)
+    except UnicodeDecodeError:
+        return 'latin1'
+    finally:
+        stream.seek(0)
+
+class UploadReader:
+    """Read an uploaded .xlsx or .csv file as a stream of DataFrame batches.
+
+    Batches are indexed by their 0-based data row position in the file, so
+    ``row_numbers`` still reports spreadsheet row numbers. The header is read
+    up front so callers can check ``columns`` before consuming any rows.
+    """
+
+    def __init__(self, file, filename, size=None):
+        self.size = size or batch_size()
+        if filename.endswith('.xlsx'):
+            self._batches = self._xlsx_batches(file)
+        else:
+            self._batches = self._csv_batches(file)
+        self.columns = next(self._batches)
+
+    def batches(self):
+        return self._batches
+
+    def close(self):
+        """Release the underlying workbook or CSV reader, even if not fully read."""
+        self._batches.close()
+
+    def _xlsx_batches(self, file):
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, ())
+            columns = [name if name is not None else f'Unnamed: {i}' for i, name in enumerate(header)]
+            yield columns
+
+            batch = []
+            blank_rows = []
+            start = 0
+            for row in rows:
+                row = tuple(row[:len(columns)]) + (None,) * (len(columns) - len(row))
+                # Trailing blank rows are dropped like pandas does; blank rows
+                # in the middle of the sheet are kept so row numbers line up
+                if all(value is None for value in row):
+                    blank_rows.append(row)
+                    continue
+                batch.extend(blank_rows)
+                blank_rows = []
+                batch.append(row)
+                if len(batch) >= self.size:
+                    yield pd.DataFrame(batch, columns=columns, index=range(start, start + len(batch)))
+                    start += len(batch)
+                    batch = []
+            if batch:
+                yield pd.DataFrame(batch, columns=columns, index=range(start, start + len(batch)))
+        finally:
+            workbook.close()
+
+    def _csv_batches(self, file):
+        encoding = detect_csv_encoding(file)
+        reader = pd.read_csv(file, encoding=encoding, chunksize=self.size)
+        with reader:
+            first = next(reader, None)
+            if first is None:
+                yield []
+                return
+            yield list(first.columns)
+            yield first
+            for chunk in reader:
+                yield chunk
@@ -0,0 +1,249 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from sqlalchemy import func, insert
+from ..models import db, User
+from ..passwords import hash_password, hash_function
+from .. import hierarchy
+from .common import ImportResult, chunk_size, chunks, clean_column, timed_batches
+
+REQUIRED_COLUMNS = ['username', 'password', 'role']
+ROLES = ['admin', 'leader', 'offline']
+# Columns copied into the rejected-rows report; passwords never are
+REPORT_COLUMNS = ['username', 'role', 'leader_username', 'can_view_funds']
+
+# Below this many rows the process pool costs more to start than it saves
+PARALLEL_HASH_THRESHOLD = 32
+
+def hash_workers():
+    return current_app.config.get('IMPORT_HASH_WORKERS') or os.cpu_count() or 1
+
+class HashPool:
+    """A process pool for password hashing, started by the first batch big enough to need it."""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.executor = None
+
+    def map(self, function, items, chunksize=1):
+        if self.executor is None:
+            # Spawned, not forked: a fork would copy the app's engine, pools and threads
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        return self.executor.map(function, items, chunksize=chunksize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+def hash_passwords(passwords, pool=None):
+    """Hash passwords, fanning out to a process pool for larger batches."""
+    workers = hash_workers()
+    if workers <= 1 or len(passwords) < PARALLEL_HASH_THRESHOLD:
+        return [hash_password(password) for password in passwords]
+    if pool is None:
+        with HashPool(workers) as pool:
+            return hash_passwords(passwords, pool)
+    return list(pool.map(hash_function(), passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+def load_existing_usernames(usernames):
+    """Return which of the (lower-cased) usernames are already taken."""
+    taken = set()
+    for chunk in chunks(sorted(usernames), chunk_size()):
+        rows = db.session.query(func.lower(User.username)).filter(func.lower(User.username).in_(chunk))
+        taken.update(username for username, in rows)
+    return taken
+
+def load_leader_ids(usernames):
+    """Map lower-cased leader usernames to ids."""
+    leader_ids = {}
+    for chunk in chunks(sorted(usernames), chunk_size()):
+        rows = db.session.query(func.lower(User.username), User.id)\
+            .filter(func.lower(User.username).in_(chunk), User.role == 'leader')
+        leader_ids.update(rows)
+    return leader_ids
+
+def order_new_leaders(parents, known):
+    """Give each new leader its depth below the leaders that already exist.
+
+    ``parents`` maps new leader keys to their leader key ('' for none) and
+    ``known`` holds the leader keys that exist already. Returns the depths
+    of the leaders that can be placed, and the keys whose chain of leaders
+    comes back to themselves.
+    """
+    levels = {}
+    pending = dict(parents)
+    while pending:
+        placed = {key: 0 if parent in known or not parent else levels[parent] + 1
+                  for key, parent in pending.items() if parent in known or not parent or parent in levels}
+        if not placed:
+            break
+        levels.update(placed)
+        for key in placed:
+            del pending[key]
+    cycles = set()
+    for key in pending:
+        seen, parent = set(), pending[key]
+        while parent != key and parent in pending and parent not in seen:
+            seen.add(parent)
+            parent = pending[parent]
+        if parent == key:
+            cycles.add(key)
+    return levels, cycles
+
+def validate_user_frame(df, result, staged=None):
+    """Validate a user frame column-wise and return the rows that can be created.
+
+    Each returned row carries a ``leader_key``: the lower-cased leader
+    username for offline users and leaders, resolved to an id once leaders
+    exist. A leader may report to a leader created earlier in the same
+    file; ``level`` is its depth below the leaders that exist already.
+    ``staged`` holds the lower-cased usernames and leader names that earlier
+    batches of a dry run would have created.
+    """
+    staged_usernames = staged['usernames'] if staged else set()
+    staged_leaders = staged['leaders'] if staged else set()
+    usernames = clean_column(df, 'username')
+    passwords = clean_column(df, 'password')
+    roles = clean_column(df, 'role')
+    leader_names = clean_column(df, 'leader_username')
+    can_view_funds = clean_column(df, 'can_view_funds').str.lower() == 'true'
+    lowered = usernames.str.lower()
+    leader_keys = leader_names.str.lower()
+
+    missing = (usernames == '') | (passwords == '') | (roles == '')
+    taken = lowered.isin(load_existing_usernames(set(lowered[usernames != ''])) | staged_usernames)
+    bad_role = ~roles.isin(ROLES)
+    # A later row reusing a username from an earlier valid row is a duplicate
+    base_invalid = missing | taken | bad_role
+    duplicate = ~base_invalid & lowered.where(~base_invalid).duplicated(keep='first')
+    base_invalid |= duplicate
+
+    offline = roles == 'offline'
+    led = roles.isin(['offline', 'leader']) & (leader_names != '')
+    no_leader = offline & (leader_names == '')
+    leader_ids = load_leader_ids(set(leader_keys[led]))
+    known = leader_ids.keys() | staged_leaders
+    new_leaders = ~base_invalid & (roles == 'leader')
+    levels, cycles = order_new_leaders(
+        dict(zip(lowered[new_leaders].tolist(), leader_keys.where(led, '')[new_leaders].tolist())), known)
+    cycle = new_leaders & lowered.isin(cycles)
+    unknown_leader = led & ~cycle & ~leader_keys.isin(known | levels.keys())
+
+    if ((roles == 'admin') & (leader_names != '')).any():
+        result.warn("Leader username is ignored for the admin role.")
+    if (can_view_funds & (roles != 'leader')).any():
+        result.warn("Can View Funds flag is ignored for roles other than 'leader'.")
+
+    invalid = result.reject(df, [
+        ('Missing value', missing, 'Missing username, password, or role.'),
+        ('Username taken', taken | duplicate, "Username '" + usernames + "' already exists."),
+        ('Invalid role', bad_role, "Invalid role '" + roles + "' for user '" + usernames + "'."),
+        ('Missing leader', no_leader, "Leader username is required for role 'offline'."),
+        ('Unknown leader', unknown_leader,
+         "Leader with username '" + leader_names + "' not found or is not a leader."),
+        ('Leader cycle', cycle, "'" + usernames + "' would end up reporting to themselves."),
+    ], REPORT_COLUMNS)
+
+    valid = ~invalid
+    rows = []
+    for username, password, role, leader_key, can_view in zip(
+            usernames[valid].tolist(), passwords[valid].tolist(), roles[valid].tolist(),
+            leader_keys.where(led, '')[valid].tolist(), (can_view_funds & (roles == 'leader'))[valid].tolist()):
+        rows.append({
+            'username': username,
+            'password': password,
+            'role': role,
+            'leader_key': leader_key or None,
+            'level': levels.get(username.lower(), 0),
+            'can_view_funds': can_view,
+        })
+    return rows, leader_ids
+
+def attach_to_hierarchy(rows):
+    """Add just-inserted users to the team hierarchy; their leaders must be in it already."""
+    for chunk in chunks(sorted(row['username'].lower() for row in rows), chunk_size()):
+        ids = [user_id for user_id, in db.session.query(User.id).filter(func.lower(User.username).in_(chunk))]
+        hierarchy.attach_users(ids)
+
+def insert_users(rows, leader_ids):
+    """Bulk insert validated rows, creating each leader before the users that point at them.
+
+    Records are keyed through the table's columns: bulk inserts silently
+    drop keys that are not columns, so a misspelt name fails here instead.
+    """
+    table = User.__table__
+    c = table.c
+
+    def to_record(row):
+        return {
+            c.username.key: row['username'],
+            c.password_hash.key: row['password_hash'],
+            c.role.key: row['role'],
+            c.leader_id.key: leader_ids.get(row['leader_key']) if row['leader_key'] else None,
+            c.can_view_funds.key: row['can_view_funds'],
+        }
+
+    size = chunk_size()
+    others = [row for row in rows if row['role'] != 'offline']
+    # Admins and leaders level by level from the top, then offline users, so each row's leader exists
+    groups = [[row for row in others if row['level'] == level] for level in sorted({row['level'] for row in others})]
+    groups.append([row for row in rows if row['role'] == 'offline'])
+    for group in groups:
+        pending = {row['leader_key'] for row in group if row['leader_key']} - leader_ids.keys()
+        if pending:
+            leader_ids = {**leader_ids, **load_leader_ids(pending)}
+        for chunk in chunks(group, size):
+            db.session.execute(insert(table), [to_record(row) for row in chunk])
+        attach_to_hierarchy(group)
+
+def import_users_frame(df, result=None, pool=None, staged=None):
+    """Validate, hash and bulk insert a user frame. The caller commits or rolls back.
+
+    A dry run stops after validating and counting. Nothing is inserted, so
+    ``staged`` carries the usernames and leaders earlier batches would have
+    created, for the duplicate and leader checks of later ones.
+    """
+    result = result or ImportResult()
+    with result.stage('validate'):
+        rows, leader_ids = validate_user_frame(df, result, staged)
+    if not rows:
+        return result
+    if result.dry_run:
+        if staged is not None:
+            staged['usernames'].update(row['username'].lower() for row in rows)
+            staged['leaders'].update(row['username'].lower() for row in rows if row['role'] == 'leader')
+        result.created += len(rows)
+        return result
+
+    with result.stage('hash'):
+        passwords = [row.pop('password') for row in rows]
+        hashes = hash_passwords(passwords, pool)
+        for row, password_hash in zip(rows, hashes):
+            row['password_hash'] = password_hash
+
+    with result.stage('insert'):
+        insert_users(rows, leader_ids)
+    result.created += len(rows)
+    return result
+
+def import_user_batches(batches, result=None):
+    """Import a stream of user frames, sharing one hashing pool across batches.
+
+    The pool only starts once a batch has enough passwords to hash, so a
+    small file or a dry run (which hashes nothing) never pays for it.
+
+    Users inserted (or, in a dry run, staged) by earlier batches are visible
+    to later ones, so duplicate and leader checks behave as if the file were
+    read in one go.
+    """
+    result = result or ImportResult()
+    staged = {'usernames': set(), 'leaders': set()} if result.dry_run else None
+    with HashPool(hash_workers()) as pool:
+        for df in timed_batches(batches, result):
+            import_users_frame(df, result, pool, staged)
+    return result
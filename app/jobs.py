@@ -0,0 +1,227 @@
+# Background import jobs: uploads are saved to disk, recorded in the import_jobs
+# table and processed on a small in-process thread pool, so no broker is needed.
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import update
+from .models import db, ImportJob
+from .cache import bump_data_version
+from .engine import statement_timeout
+from .profiler import profiling, log_profile
+from .metrics import record_import
+from .importers import (ImportResult, UploadReader, import_performance_batches, import_user_batches,
+                        PERFORMANCE_COLUMNS, USER_COLUMNS)
+
+IMPORTERS = {
+    'users': (USER_COLUMNS, import_user_batches),
+    'performance': (PERFORMANCE_COLUMNS, import_performance_batches),
+}
+
+# Rows processed by jobs running in this process. SQLite allows only one
+# writer, so there progress lives here instead of being written mid-import.
+_live_progress = {}
+
+# Row errors kept in import_jobs.result; the full list is in the job's report file
+ERROR_SAMPLE_SIZE = 20
+
+def init_app(app):
+    app.extensions['import_jobs'] = ThreadPoolExecutor(
+        max_workers=app.config['IMPORT_JOB_WORKERS'],
+        thread_name_prefix='import-job'
+    )
+
+def save_upload(file, path):
+    """Save an upload to ``path`` and return the SHA-256 of its bytes, in one pass."""
+    digest = hashlib.sha256()
+    with open(path, 'wb') as out:
+        for block in iter(lambda: file.stream.read(1024 * 1024), b''):
+            digest.update(block)
+            out.write(block)
+    return digest.hexdigest()
+
+def report_path(job_id):
+    """Where the CSV of a job's rejected rows is kept."""
+    return os.path.join(current_app.config['IMPORT_REPORT_FOLDER'], f'{job_id}.csv')
+
+def find_identical_import(kind, content_hash):
+    """The latest real import of ``kind``, if it succeeded with the same file contents.
+
+    Only the latest counts: re-uploading an older file after a newer one was
+    imported must still run, to put the older values back. A queued or
+    running job is never a match, so neither one still in progress nor one
+    left stuck by a dead worker can block a re-upload.
+    """
+    previous = ImportJob.query.filter(ImportJob.kind == kind, ImportJob.status != 'failed', ~ImportJob.dry_run)\
+        .order_by(ImportJob.id.desc()).first()
+    if previous is not None and previous.status == 'succeeded' and previous.content_hash == content_hash:
+        return previous
+    return None
+
+def submit_import(kind, file, user_id, force=False, dry_run=False):
+    """Save an uploaded file, record a queued job for it and hand it to the pool.
+
+    A performance file identical to the last one imported is not run again
+    unless ``force`` is set; its job is recorded as already finished. A
+    ``dry_run`` job validates and counts without saving anything.
+    """
+    folder = current_app.config['IMPORT_UPLOAD_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    extension = os.path.splitext(file.filename)[1].lower()
+    stored_path = os.path.join(folder, f'{uuid.uuid4().hex}{extension}')
+    content_hash = save_upload(file, stored_path)
+
+    previous = None if force or dry_run or kind != 'performance' else find_identical_import(kind, content_hash)
+    job = ImportJob(kind=kind, filename=file.filename[:255], stored_path=stored_path,
+                    content_hash=content_hash, dry_run=dry_run, submitted_by_id=user_id)
+    if previous is not None:
+        os.remove(stored_path)
+        job.status = 'succeeded'
+        job.started_at = job.finished_at = datetime.utcnow()
+        job.result = json.dumps({'messages': [(
+            'info', f'This file is identical to import #{previous.id} ({previous.filename}), '
+                    'so nothing was imported again.'
+        )]})
+        record_import(kind, 'identical', 0, 0)
+    db.session.add(job)
+    db.session.commit()
+    if previous is not None:
+        return job
+
+    app = current_app._get_current_object()
+    if app.config.get('IMPORT_JOBS_INLINE'):
+        run_import_job(app, job.id)
+    else:
+        app.extensions['import_jobs'].submit(run_import_job, app, job.id)
+    return job
+
+def track_progress(job_id, batches):
+    """Pass batches through, recording how many rows the importer has finished."""
+    rows = 0
+    for df in batches:
+        yield df
+        rows += len(df)
+        _live_progress[job_id] = rows
+        if db.engine.dialect.name != 'sqlite':
+            table = ImportJob.__table__
+            with db.engine.begin() as connection:
+                connection.execute(update(table).where(table.c.id == job_id).values(rows_processed=rows))
+
+def summary_message(kind, result):
+    if result.dry_run:
+        counts = f'Created: {result.created}' if kind == 'users' else \
+            f'Created: {result.created}, Updated: {result.updated}, Unchanged: {result.unchanged}'
+        return 'info', f'Dry run finished; nothing was saved. Would have {counts}, Skipped: {result.skipped}.'
+    if kind == 'users':
+        if result.error_count:
+            return 'warning', f'Import partially successful. Created: {result.created}, Skipped: {result.skipped}. See errors below.'
+        return 'success', f'User import successful! Created: {result.created}'
+    if result.error_count:
+        return 'warning', (f'Import partially successful. Created: {result.created}, Updated: {result.updated}, '
+                           f'Unchanged: {result.unchanged}, Skipped: {result.skipped}. See errors below.')
+    return 'success', (f'Performance import successful! Created: {result.created}, Updated: {result.updated}, '
+                       f'Unchanged: {result.unchanged}')
+
+def commit_import(kind, result):
+    """Commit or roll back an import the way the synchronous routes did. Dry runs always roll back."""
+    if result.dry_run:
+        db.session.rollback()
+        return 'succeeded', [summary_message(kind, result)]
+    if result.error_count and result.saved == 0 and result.unchanged == 0:
+        db.session.rollback()
+        nothing = 'No users were created' if kind == 'users' else 'No performance data saved'
+        return 'failed', [('danger', f'Import failed. {nothing}. See errors below.')]
+    try:
+        db.session.commit()
+    except Exception as commit_error:
+        db.session.rollback()
+        return 'failed', [('danger', f'Import failed during final commit. Error: {commit_error}')]
+    bump_data_version()
+    return 'succeeded', [summary_message(kind, result)]
+
+def run_import_job(app, job_id):
+    # Imports share the web engine but get the longer worker statement timeout
+    with app.app_context(), statement_timeout('worker'), profiling('import_job') as profile:
+        job = db.session.get(ImportJob, job_id)
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+        started = time.perf_counter()
+
+        result = ImportResult(dry_run=job.dry_run)
+        try:
+            columns, run = IMPORTERS[job.kind]
+            with open(job.stored_path, 'rb') as file:
+                with result.stage('parse'):
+                    reader = UploadReader(file, job.stored_path)
+                try:
+                    if not all(col in reader.columns for col in columns):
+                        status, messages = 'failed', [('danger', f'Missing required columns. Need: {columns}')]
+                    else:
+                        run(track_progress(job_id, reader.batches()), result)
+                        status, messages = commit_import(job.kind, result)
+                finally:
+                    reader.close()
+        except Exception as e:
+            db.session.rollback()
+            logging.exception('Import job %s failed', job_id)
+            status, messages = 'failed', [('danger', f'An critical error occurred during file processing: {e}')]
+        finally:
+            rows_processed = _live_progress.pop(job_id, 0)
+            try:
+                os.remove(job.stored_path)
+            except OSError:
+                pass
+
+        try:
+            os.makedirs(app.config['IMPORT_REPORT_FOLDER'], exist_ok=True)
+            has_report = result.write_report(report_path(job_id))
+        except OSError:
+            logging.exception('Could not write the error report of import job %s', job_id)
+            has_report = False
+
+        logging.info('Import job %s (%s) %s. Timings: %s', job_id, job.kind, status, result.format_timings())
+        record_import(job.kind, status, rows_processed, time.perf_counter() - started)
+        if app.config['SQL_PROFILER']:
+            log_profile(app, profile, job_id=job_id, kind=job.kind, status=status)
+        job = db.session.get(ImportJob, job_id)
+        job.status = status
+        job.finished_at = datetime.utcnow()
+        job.rows_processed = rows_processed
+        job.created_count = result.created
+        job.updated_count = result.updated
+        job.unchanged_count = result.unchanged
+        job.skipped_count = result.skipped
+        job.result = json.dumps({
+            'messages': messages,
+            'warnings': result.warnings,
+            'errors': result.error_samples(ERROR_SAMPLE_SIZE),
+            'error_count': result.error_count,
+            'error_counts': result.error_counts,
+            'has_report': has_report,
+            'timings': result.timings,
+        })
+        db.session.commit()
+
+def job_details(job):
+    return json.loads(job.result) if job.result else {}
+
+def job_status(job):
+    """Small JSON-able status payload for polling."""
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'finished': job.finished,
+        'rows_processed': max(job.rows_processed, _live_progress.get(job.id, 0)),
+        'created': job.created_count,
+        'updated': job.updated_count,
+        'unchanged': job.unchanged_count,
+        'skipped': job.skipped_count,
+        'dry_run': job.dry_run,
+    }
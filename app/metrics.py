@@ -0,0 +1,286 @@
+# Request, database and import metrics in the Prometheus text format.
+# Each process keeps its own registry and writes it to METRICS_DIR/<pid>.json
+# every METRICS_FLUSH_INTERVAL seconds; /metrics merges every worker's file,
+# so the numbers cover the whole gunicorn master, not just one worker.
+# Clear METRICS_DIR when the master starts, before any worker writes to it.
+# When a worker exits, the master folds its counters into archive.json and
+# removes its file (mark_process_dead), so recycled workers don't pile up.
+import glob
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from flask import Blueprint, Response, current_app, request, session, g, abort
+from .engine import pool_stats
+from .profiler import current_profile
+
+ARCHIVE = 'archive.json' # Counters and histograms of workers that have exited
+ARCHIVE_TOKENS = 100 # Folded-in process tokens remembered, see collect()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests handled, by endpoint, method and status.', None),
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint.', LATENCY_BUCKETS),
+    'http_request_db_seconds': ('histogram', 'Time spent in SQL per request, by endpoint.', LATENCY_BUCKETS),
+    'http_requests_in_flight': ('gauge', 'Requests being handled, by endpoint.', None),
+    'import_jobs_total': ('counter', 'Finished import jobs, by kind and status.', None),
+    'import_rows_total': ('counter', 'Rows read by import jobs, by kind.', None),
+    'import_seconds_total': ('counter', 'Wall time spent running import jobs, by kind.', None),
+    'import_last_rows_per_second': ('gauge', 'Throughput of the last finished import, by kind.', None),
+    'db_pool_connections_in_use': ('gauge', 'Connections checked out of the pool.', None),
+    'db_pool_checkouts_total': ('counter', 'Pool checkouts.', None),
+    'db_pool_overflow_events_total': ('counter', 'Connections opened beyond pool_size.', None),
+    'db_pool_timeouts_total': ('counter', 'Checkouts that gave up waiting for a connection.', None),
+    'db_pool_checkout_wait_seconds_total': ('counter', 'Time spent waiting for pool connections.', None),
+    'cache_hits_total': ('counter', 'Aggregate cache hits.', None),
+    'cache_misses_total': ('counter', 'Aggregate cache misses.', None),
+    'password_hash_queue_depth': ('gauge', 'Login password checks queued or running.', None),
+    'password_hash_rejected_total': ('counter', 'Logins turned away because password hashing was saturated.', None),
+}
+
+class Registry:
+    """One process's metric values, keyed by (name, sorted label pairs)."""
+
+    def __init__(self):
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.values[key] = value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            # Per-bucket (not cumulative) counts, then sum and count
+            histogram = self.values.setdefault(key, [0] * len(buckets) + [0.0, 0])
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def dump(self):
+        with self._lock:
+            return [[name, list(labels), value] for (name, labels), value in self.values.items()]
+
+def registry():
+    return current_app.extensions['metrics']['registry']
+
+def enabled():
+    return 'metrics' in current_app.extensions
+
+def record_import(kind, status, rows, seconds):
+    if not enabled():
+        return
+    metrics = registry()
+    metrics.inc('import_jobs_total', {'kind': kind, 'status': status})
+    metrics.inc('import_rows_total', {'kind': kind}, rows)
+    metrics.inc('import_seconds_total', {'kind': kind}, seconds)
+    if seconds > 0:
+        metrics.set('import_last_rows_per_second', {'kind': kind}, rows / seconds)
+
+def sample_process_metrics(app):
+    """Copy the pool, cache and password hashing counters of this process into the registry."""
+    metrics = app.extensions['metrics']['registry']
+    pool = pool_stats(app)
+    if pool['in_use'] is not None:
+        metrics.set('db_pool_connections_in_use', {}, pool['in_use'])
+    metrics.set('db_pool_checkouts_total', {}, pool['checkouts'])
+    metrics.set('db_pool_overflow_events_total', {}, pool['overflow_events'])
+    metrics.set('db_pool_timeouts_total', {}, pool['timeouts'])
+    metrics.set('db_pool_checkout_wait_seconds_total', {}, pool['wait_seconds_sum'])
+    cache = app.extensions['aggregate_cache']
+    metrics.set('cache_hits_total', {}, cache.hits)
+    metrics.set('cache_misses_total', {}, cache.misses)
+    hasher = app.extensions['password_hasher']
+    metrics.set('password_hash_queue_depth', {}, hasher.depth)
+    metrics.set('password_hash_rejected_total', {}, hasher.rejected)
+
+def process_token(state):
+    """A random id for this process's file; pids get reused, tokens don't."""
+    if state.get('token_pid') != os.getpid():
+        state['token_pid'] = os.getpid()
+        state['token'] = uuid.uuid4().hex
+    return state['token']
+
+def write_json(directory, name, data):
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, os.path.join(directory, name))
+
+def flush(app):
+    """Write this process's registry to its file in METRICS_DIR."""
+    state = app.extensions['metrics']
+    sample_process_metrics(app)
+    write_json(app.config['METRICS_DIR'], f'{os.getpid()}.json',
+               {'token': process_token(state), 'entries': state['registry'].dump()})
+    state['flushed_at'] = time.monotonic()
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def read_archive(directory):
+    try:
+        with open(os.path.join(directory, ARCHIVE)) as f:
+            return json.load(f)
+    except (ValueError, OSError):
+        return {'tokens': [], 'entries': []}
+
+def merge(merged, entries, gauges=True):
+    """Add file entries onto ``merged``: counters and histograms sum, gauges only if ``gauges``."""
+    for name, labels, value in entries:
+        if name not in METRICS:
+            continue
+        kind = METRICS[name][0]
+        if kind == 'gauge' and not gauges:
+            continue
+        key = (name, tuple(tuple(pair) for pair in labels))
+        if kind == 'histogram':
+            current = merged.setdefault(key, [0] * len(value))
+            merged[key] = [a + b for a, b in zip(current, value)]
+        else:
+            merged[key] = merged.get(key, 0) + value
+    return merged
+
+def mark_process_dead(directory, pid):
+    """Fold an exited worker's counters and histograms into the archive and remove its file.
+
+    Called by the gunicorn master (child_exit); its gauges are dropped.
+    """
+    path = os.path.join(directory, f'{pid}.json')
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (ValueError, OSError):
+        return
+    archive = read_archive(directory)
+    if data['token'] not in archive['tokens']:
+        merged = merge(merge({}, archive['entries']), data['entries'], gauges=False)
+        write_json(directory, ARCHIVE, {
+            'tokens': archive['tokens'][-(ARCHIVE_TOKENS - 1):] + [data['token']],
+            'entries': [[name, list(labels), value] for (name, labels), value in merged.items()],
+        })
+    os.remove(path)
+
+def collect(app):
+    """Merge every process's file and the archive: sum counters and histograms, and gauges of live processes."""
+    directory = app.config['METRICS_DIR']
+    files = []
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        if os.path.basename(path) == ARCHIVE:
+            continue
+        try:
+            pid = int(os.path.basename(path)[:-len('.json')])
+            with open(path) as f:
+                files.append((pid, json.load(f)))
+        except (ValueError, OSError):
+            continue
+    # Read after the process files: one folded in meanwhile is then listed
+    # here and skipped, instead of being counted twice
+    archive = read_archive(directory)
+    archived = set(archive['tokens'])
+    merged = merge({}, archive['entries'])
+    for pid, data in files:
+        if data['token'] in archived:
+            continue
+        # A dead worker's counters still count; its gauges no longer mean anything
+        merge(merged, data['entries'], gauges=pid == os.getpid() or process_alive(pid))
+    return merged
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+def render(merged):
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = sorted((labels, value) for (metric, labels), value in merged.items() if metric == name)
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in series:
+            if kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(buckets, value):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{format_labels(labels, [("le", repr(bound))])} {cumulative}')
+                lines.append(f'{name}_bucket{format_labels(labels, [("le", "+Inf")])} {value[-1]}')
+                lines.append(f'{name}_sum{format_labels(labels)} {value[-2]}')
+                lines.append(f'{name}_count{format_labels(labels)} {value[-1]}')
+            else:
+                lines.append(f'{name}{format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics_endpoint():
+    # Scrapers send the token; without one configured, only admins may look
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied, token):
+            abort(401)
+    elif session.get('user_role') != 'admin':
+        abort(403)
+    flush(current_app._get_current_object())
+    return Response(render(collect(current_app)), mimetype='text/plain; version=0.0.4')
+
+def init_app(app):
+    if not app.config['METRICS_ENABLED']:
+        return
+    os.makedirs(app.config['METRICS_DIR'], exist_ok=True)
+    app.extensions['metrics'] = {'registry': Registry(), 'flushed_at': time.monotonic()}
+    app.register_blueprint(metrics_bp)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_endpoint = request.endpoint or 'unmatched' # Raw paths would explode the label set
+        registry().inc('http_requests_in_flight', {'endpoint': g.metrics_endpoint})
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'metrics_started' not in g:
+            return response
+        labels = {'endpoint': g.metrics_endpoint}
+        metrics = registry()
+        metrics.inc('http_requests_total', dict(labels, method=request.method, status=str(response.status_code)))
+        metrics.observe('http_request_duration_seconds', labels, time.perf_counter() - g.metrics_started)
+        profile = current_profile()
+        if profile is not None:
+            metrics.observe('http_request_db_seconds', labels, profile.total)
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        endpoint = g.pop('metrics_endpoint', None)
+        if endpoint is None:
+            return
+        registry().inc('http_requests_in_flight', {'endpoint': endpoint}, -1)
+        state = app.extensions['metrics']
+        if time.monotonic() - state['flushed_at'] >= app.config['METRICS_FLUSH_INTERVAL']:
+            flush(app)
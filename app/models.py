@@ -1,6 +1,6 @@
 # This file will contain the SQLAlchemy database models
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import CheckConstraint, Numeric
+from sqlalchemy import CheckConstraint, Numeric, func, false
 
 from datetime import datetime
 
@@ -14,27 +14,35 @@ class User(db.Model):
     password_hash = db.Column(db.String(200), nullable=False)
     role = db.Column(db.String(30), nullable=False)
     account_status = db.Column(db.String(20), nullable=False, default='active')
-    preferred_navigation = db.Column(db.String(10), nullable=False, default='sidebar')
+    preferred_nav = db.Column(db.String(10), nullable=False, default='sidebar')
     leader_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
-    can_view_financials = db.Column(db.Boolean, nullable=False, default=False)
+    can_view_funds = db.Column(db.Boolean, nullable=False, default=False) # Leaders only
+    # Bumped whenever an admin edits the user; sessions stamped with an older value are refreshed
+    auth_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     __table_args__ = (
-        CheckConstraint(role.in_(['system_administrator', 'team_leader', 'team_member']), name='check_role'),
+        CheckConstraint(role.in_(['admin', 'leader', 'offline']), name='check_role'),
         CheckConstraint(account_status.in_(['active', 'inactive']), name='check_account_status'),
-        CheckConstraint(preferred_navigation.in_(['sidebar', 'navbar']), name='check_preferred_navigation'),
+        CheckConstraint(preferred_nav.in_(['sidebar', 'navbar']), name='check_preferred_nav'),
+        # Case-insensitive username lookups (importers, lower(username) IN ...)
+        db.Index('ix_users_username_lower', func.lower(username)),
+        # Team membership: members of a leader, optionally by role
+        db.Index('ix_users_leader_id_role', leader_id, role),
+        # Role filters and the admin user list ordering
+        db.Index('ix_users_role_username', role, username),
     )
 
     # Role descriptions
     ROLE_DESCRIPTIONS = {
-        'system_administrator': 'System Administrator - Full access to all system features',
-        'team_leader': 'Team Leader - Manages team members and views team performance',
-        'team_member': 'Team Member - Tracks and reports personal performance metrics'
+        'admin': 'Admin - Full access to all system features',
+        'leader': 'Leader - Manages team members and views team performance',
+        'offline': 'Offline - Tracks and reports personal performance'
     }
     
-    # Define relationship for team leader to access their team members
-    team_members = db.relationship('User', backref=db.backref('team_leader', remote_side=[id]), lazy='dynamic')
+    # Define relationship for a leader to access their team members
+    team_members = db.relationship('User', backref=db.backref('leader', remote_side=[id]), lazy='dynamic')
     
     def __repr__(self):
         role_desc = self.ROLE_DESCRIPTIONS.get(self.role, 'Unknown Role')
@@ -62,7 +70,7 @@ class PerformanceMetric(db.Model):
     __tablename__ = 'performance_metrics'
     
     id = db.Column(db.Integer, primary_key=True)
-    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('financial_accounts.id'), nullable=False)
     reporting_period = db.Column(db.String(7), nullable=False)
     performance_metric = db.Column(Numeric(15, 2), nullable=False)
     metric_status = db.Column(db.String(20), nullable=False, default='final')
@@ -74,9 +82,149 @@ class PerformanceMetric(db.Model):
         db.UniqueConstraint('account_id', 'reporting_period', name='uq_account_period'),
     )
     
-    # Define relationship back to the user
-    user = db.relationship('User', backref=db.backref('performance_metrics', lazy='dynamic'))
+    # Define relationship back to the account
+    account = db.relationship('FinancialAccount', backref=db.backref('performance_metrics', lazy='dynamic'))
     
     def __repr__(self):
-        user_info = self.user.username if self.user else f"UserID:{self.user_id}"
-        return f'<PerformanceMetric for {user_info} ({self.reporting_period}): {self.performance_metric}>'
+        account_info = self.account.name if self.account else f"AccountID:{self.account_id}"
+        return f'<PerformanceMetric for {account_info} ({self.reporting_period}): {self.performance_metric}>'
+
+class CompanySetting(db.Model):
+    __tablename__ = 'company_settings'
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(50), unique=True, nullable=False)
+    value = db.Column(db.String(200), nullable=False)
+    last_updated = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CompanySetting {self.key}={self.value}>'
+
+class PerformanceData(db.Model):
+    __tablename__ = 'performance_data'
+
+    id = db.Column(db.Integer, primary_key=True)
+    offline_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    period = db.Column(db.Integer, nullable=False) # year * 100 + month, e.g. 202405; see app/periods.py
+    metric_value = db.Column(Numeric(15, 2), nullable=False, default=0.00)
+    recorded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    # The bulk importer upserts on this key, so it must stay a real unique constraint
+    __table_args__ = (
+        db.UniqueConstraint('offline_user_id', 'period', name='uq_offline_user_period'),
+        # Covering index: per-user and per-user/period sums never touch the table
+        db.Index('ix_performance_data_user_period_value', 'offline_user_id', 'period', 'metric_value'),
+        # Period ranges across all users, in export order
+        db.Index('ix_performance_data_period', 'period', 'offline_user_id'),
+    )
+
+    user = db.relationship('User', backref=db.backref('performance_data', lazy='dynamic'))
+
+    def __repr__(self):
+        return f'<PerformanceData user={self.offline_user_id} ({self.period}): {self.metric_value}>'
+
+class ImportJob(db.Model):
+    __tablename__ = 'import_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    filename = db.Column(db.String(255), nullable=False)
+    stored_path = db.Column(db.String(500), nullable=False)
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    created_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_count = db.Column(db.Integer, nullable=False, default=0)
+    skipped_count = db.Column(db.Integer, nullable=False, default=0)
+    unchanged_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    content_hash = db.Column(db.String(64), nullable=True) # SHA-256 of the uploaded file
+    dry_run = db.Column(db.Boolean, nullable=False, default=False, server_default=false()) # Validated only, nothing saved
+    result = db.Column(db.Text, nullable=True) # JSON: messages, errors, warnings, timings
+    submitted_by_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        CheckConstraint(kind.in_(['users', 'performance']), name='check_import_kind'),
+        CheckConstraint(status.in_(['queued', 'running', 'succeeded', 'failed']), name='check_import_status'),
+        # Latest job of a kind, for spotting identical re-uploads
+        db.Index('ix_import_jobs_kind_id', 'kind', 'id'),
+    )
+
+    @property
+    def finished(self):
+        return self.status in ('succeeded', 'failed')
+
+    def __repr__(self):
+        return f'<ImportJob {self.id} {self.kind} {self.status}>'
+
+# --- Dashboard rollups ---
+# Kept in step with performance_data by the importer and user edits (see
+# app/rollups.py); `flask rebuild-rollups` recomputes them from scratch.
+
+class CompanyPeriodTotal(db.Model):
+    __tablename__ = 'rollup_company_period'
+
+    period = db.Column(db.Integer, primary_key=True)
+    total = db.Column(Numeric(18, 2), nullable=False, default=0)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    # The admin chart only counts rows belonging to offline users
+    offline_total = db.Column(Numeric(18, 2), nullable=False, default=0)
+    offline_row_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CompanyPeriodTotal {self.period}: {self.total}>'
+
+class LeaderPeriodTotal(db.Model):
+    __tablename__ = 'rollup_leader_period'
+
+    leader_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    period = db.Column(db.Integer, primary_key=True)
+    total = db.Column(Numeric(18, 2), nullable=False, default=0)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<LeaderPeriodTotal leader={self.leader_id} {self.period}: {self.total}>'
+
+class MemberTotal(db.Model):
+    __tablename__ = 'rollup_member_total'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    total = db.Column(Numeric(18, 2), nullable=False, default=0)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<MemberTotal user={self.user_id}: {self.total}>'
+
+# --- Team hierarchy ---
+# Closure table over users.leader_id: one row per (ancestor, descendant) pair,
+# including each user with itself at depth 0, so any subtree is one indexed
+# lookup. Kept in step by app/hierarchy.py; `flask rebuild-hierarchy` recomputes it.
+
+class UserHierarchy(db.Model):
+    __tablename__ = 'user_hierarchy'
+
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        # The primary key serves subtrees; this serves a user's chain of leaders
+        db.Index('ix_user_hierarchy_descendant_depth', 'descendant_id', 'depth'),
+    )
+
+    def __repr__(self):
+        return f'<UserHierarchy {self.ancestor_id} -> {self.descendant_id} ({self.depth})>'
+
+class UserSession(db.Model):
+    """Server-side session data; the browser only holds the session id (see app/sessions.py)."""
+    __tablename__ = 'user_sessions'
+
+    id = db.Column(db.String(64), primary_key=True) # SHA-256 of the id in the cookie
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True, index=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True) # Pushed along while the session is in use
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<UserSession user={self.user_id} expires={self.expires_at}>'
@@ -0,0 +1,104 @@
+# Password hashing. PASSWORD_HASH_METHOD is the one place the hash cost is
+# set; stored hashes made with another method are upgraded on the user's
+# next successful login. Login checks run on a small bounded thread pool so
+# a burst of logins can't tie up every request thread on key derivation.
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from functools import partial
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+class HasherBusy(Exception):
+    """The hashing queue is full or a check waited too long; the caller should ask the user to retry."""
+
+class PasswordHasher:
+    def __init__(self, workers, queue_limit, timeout):
+        self.executor = make_executor(workers)
+        self.queue_limit = queue_limit # Checks queued or running before new ones are turned away
+        self.timeout = timeout
+        self.depth = 0
+        self.rejected = 0
+        self.configured_method = self.canonical_method = None # See needs_rehash
+        self._lock = threading.Lock()
+
+    def run(self, function, *args):
+        with self._lock:
+            if self.depth >= self.queue_limit:
+                self.rejected += 1
+                raise HasherBusy()
+            self.depth += 1
+        try:
+            future = self.executor.submit(function, *args)
+        except BaseException:
+            self._done(None)
+            raise
+        # A check that timed out still holds its place until its thread is free
+        future.add_done_callback(self._done)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusy()
+
+    def _done(self, future):
+        with self._lock:
+            self.depth -= 1
+
+def make_executor(workers):
+    # Under gevent the threading module is patched into greenlets, which would
+    # hash on the hub; gevent's own pool runs on real threads
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+            return GeventThreadPoolExecutor(max_workers=workers)
+    except ImportError:
+        pass
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+
+def hasher():
+    return current_app.extensions['password_hasher']
+
+def hash_method():
+    return current_app.config['PASSWORD_HASH_METHOD']
+
+def hash_password(password):
+    """Hash a password with the configured method, in the calling thread."""
+    return generate_password_hash(password, method=hash_method())
+
+def hash_function():
+    """A picklable hash function for process pools (the bulk user importer)."""
+    return partial(generate_password_hash, method=hash_method())
+
+def needs_rehash(password_hash):
+    """True if a stored hash was made with a different method or cost than configured."""
+    stored, method = password_hash.split('$', 1)[0], hash_method()
+    if stored == method:
+        return False
+    state = hasher()
+    if state.configured_method != method:
+        # 'scrypt' is stored as 'scrypt:32768:8:1' etc.; hash once to learn the full spelling
+        state.canonical_method = state.run(generate_password_hash, '', method).split('$', 1)[0]
+        state.configured_method = method
+    return stored != state.canonical_method
+
+def verify_password(user, password):
+    """Check a login on the hashing pool, upgrading the stored hash if it is outdated.
+
+    The caller commits. Raises HasherBusy when the pool is saturated.
+    """
+    pool = hasher()
+    if not pool.run(check_password_hash, user.password_hash, password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.password_hash = pool.run(generate_password_hash, password, hash_method())
+    return True
+
+def init_app(app):
+    app.extensions['password_hasher'] = PasswordHasher(
+        app.config['PASSWORD_HASH_WORKERS'],
+        app.config['PASSWORD_HASH_QUEUE_LIMIT'],
+        app.config['PASSWORD_HASH_TIMEOUT'],
+    )
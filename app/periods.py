@@ -0,0 +1,73 @@
+# Reporting periods are stored as integer keys, year * 100 + month (2024-05 is
+# 202405), so they sort and range-scan like numbers. Users still read and
+# type 'YYYY-MM'; convert at the edges with these helpers.
+import re
+from datetime import date
+
+PERIOD_PATTERN = re.compile(r'^(\d{4})-(0[1-9]|1[0-2])$')
+PERIOD_REGEX = r'(\d{4})-(0[1-9]|1[0-2])' # For pandas str.fullmatch / str.extract
+
+def parse_period(text):
+    """'2024-05' -> 202405, or None if the text is not a valid YYYY-MM period."""
+    match = PERIOD_PATTERN.match(text or '')
+    if not match:
+        return None
+    return int(match.group(1)) * 100 + int(match.group(2))
+
+def format_period(key):
+    """202405 -> '2024-05'."""
+    return f'{key // 100:04d}-{key % 100:02d}'
+
+def shift_period(key, months):
+    """The period ``months`` after ``key`` (before, if negative)."""
+    index = (key // 100) * 12 + key % 100 - 1 + months
+    return (index // 12) * 100 + index % 12 + 1
+
+def current_period(today=None):
+    today = today or date.today()
+    return today.year * 100 + today.month
+
+def last_months(count, today=None):
+    """(start, end) keys of the ``count`` months up to and including the current one."""
+    end = current_period(today)
+    return shift_period(end, 1 - count), end
+
+def parse_period_range(args):
+    """Read the optional from/to query arguments as period keys.
+
+    Returns (start, end), either of which may be None for an open end, or
+    None if a given period is malformed or the range is backwards. A
+    ``months`` argument (e.g. months=12) stands for the latest N months.
+    """
+    if args.get('months'):
+        try:
+            count = int(args['months'])
+        except ValueError:
+            return None
+        return last_months(count) if 0 < count <= 1200 else None
+    start = parse_period(args['from']) if args.get('from') else None
+    end = parse_period(args['to']) if args.get('to') else None
+    if (args.get('from') and start is None) or (args.get('to') and end is None):
+        return None
+    if start is not None and end is not None and start > end:
+        return None
+    return start, end
+
+def range_args(period_range):
+    """Query arguments that reproduce a (start, end) range, for links and forms."""
+    start, end = period_range
+    args = {}
+    if start is not None:
+        args['from'] = format_period(start)
+    if end is not None:
+        args['to'] = format_period(end)
+    return args
+
+def range_clause(column, start, end):
+    """SQL conditions limiting ``column`` to the range; open ends add nothing."""
+    clauses = []
+    if start is not None:
+        clauses.append(column >= start)
+    if end is not None:
+        clauses.append(column <= end)
+    return clauses
@@ -0,0 +1,127 @@
+# Opt-in SQL profiler (SQL_PROFILER=1). Cursor events record every statement
+# run while a profile is active: one per request, or one per import job.
+# Results go out as response headers and a sampled one-line JSON log, which
+# replaces running the sqlalchemy.engine logger at INFO. The metrics read
+# each request's DB time from the same profiles.
+import contextvars
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from flask import request, g
+from sqlalchemy import event
+from .models import db
+
+logger = logging.getLogger('app.sql_profiler')
+
+_active = contextvars.ContextVar('sql_profile', default=None)
+
+# Expanded IN lists differ only in their parameter count; they are one shape
+IN_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s|%s)(?:\s*,\s*(?:\?|%\(\w+\)s|%s))*\s*\)')
+WHITESPACE = re.compile(r'\s+')
+
+def statement_shape(statement):
+    return WHITESPACE.sub(' ', IN_LIST.sub('(?)', statement)).strip()
+
+class Profile:
+    def __init__(self, label):
+        self.label = label
+        self.count = 0
+        self.total = 0.0
+        self.statements = [] # (seconds, statement, executemany)
+
+    def record(self, statement, seconds, executemany):
+        self.count += 1
+        self.total += seconds
+        self.statements.append((seconds, statement, executemany))
+
+    def slowest(self, n):
+        ranked = sorted(self.statements, key=lambda item: item[0], reverse=True)[:n]
+        return [(seconds, statement_shape(statement)) for seconds, statement, _ in ranked]
+
+    def repeated(self, threshold):
+        """Statement shapes run at least ``threshold`` times: likely N+1 lookups."""
+        # Batched executemany calls are the fix for N+1, not an instance of it
+        shapes = Counter(statement_shape(statement)
+                         for _, statement, executemany in self.statements if not executemany)
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+    def summary(self, config):
+        return {
+            'label': self.label,
+            'queries': self.count,
+            'db_ms': round(self.total * 1000, 2),
+            'slowest': [{'ms': round(seconds * 1000, 2), 'sql': shape[:300]}
+                        for seconds, shape in self.slowest(config['SQL_PROFILER_SLOWEST'])],
+            'n_plus_one': [{'count': count, 'sql': shape[:300]}
+                           for shape, count in self.repeated(config['SQL_PROFILER_REPEAT_THRESHOLD'])],
+        }
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active.get() is not None and context is not None:
+        context._profiler_started = time.perf_counter()
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active.get()
+    started = getattr(context, '_profiler_started', None)
+    if profile is not None and started is not None:
+        profile.record(statement, time.perf_counter() - started, executemany)
+
+@contextmanager
+def profiling(label):
+    """Record the statements run inside the block into a new Profile."""
+    profile = Profile(label)
+    token = _active.set(profile)
+    try:
+        yield profile
+    finally:
+        _active.reset(token)
+
+def log_profile(app, profile, **extra):
+    """Write the profile as one JSON line if sampled, and always when it shows an N+1 pattern."""
+    summary = profile.summary(app.config)
+    if summary['n_plus_one'] or random.random() < app.config['SQL_PROFILER_SAMPLE_RATE']:
+        summary.update(extra)
+        logger.log(logging.WARNING if summary['n_plus_one'] else logging.INFO, json.dumps(summary))
+
+def current_profile():
+    return _active.get()
+
+def init_app(app):
+    # The metrics use each request's DB time, so they need the profiles too
+    if not (app.config['SQL_PROFILER'] or app.config['METRICS_ENABLED']):
+        return
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+    @app.before_request
+    def start_sql_profile():
+        g.sql_profile_token = _active.set(Profile(request.endpoint or request.path))
+
+    @app.teardown_request
+    def stop_sql_profile(exc):
+        token = g.pop('sql_profile_token', None)
+        if token is not None:
+            _active.reset(token)
+
+    if not app.config['SQL_PROFILER']:
+        return
+
+    @app.after_request
+    def report_sql_profile(response):
+        profile = _active.get()
+        if profile is None:
+            return response
+        repeated = profile.repeated(app.config['SQL_PROFILER_REPEAT_THRESHOLD'])
+        response.headers['X-SQL-Queries'] = str(profile.count)
+        response.headers['X-SQL-Time-Ms'] = f'{profile.total * 1000:.2f}'
+        response.headers['X-SQL-N-Plus-One'] = str(len(repeated))
+        response.headers.add('Server-Timing', f'db;dur={profile.total * 1000:.2f};desc="{profile.count} queries"')
+        log_profile(app, profile, method=request.method, path=request.path, status=response.status_code)
+        return response
@@ -0,0 +1,257 @@
+# Precomputed dashboard totals. Writers call the record_* helpers inside their
+# own transaction so the rollups commit (or roll back) with the raw rows.
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import func, select, delete, update, insert, and_, case, cast, literal, literal_column, union_all
+from .models import (db, User, PerformanceData, CompanySetting, CompanyPeriodTotal, LeaderPeriodTotal, MemberTotal,
+                     UserHierarchy)
+from .importers.common import dialect_insert
+from .periods import range_clause
+
+CENT = Decimal('0.01')
+
+def to_decimal(value):
+    if value is None:
+        return Decimal('0.00')
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+def increment(model, keys, rows):
+    """Add the non-key columns of each row onto the matching rollup row, creating it if needed."""
+    if not rows:
+        return
+    table = model.__table__
+    values = [column for column in rows[0] if column not in keys]
+    dialect = dialect_insert()
+    if dialect is not None:
+        stmt = dialect(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[key] for key in keys],
+            set_={column: table.c[column] + stmt.excluded[column] for column in values}
+        )
+        db.session.execute(stmt, rows)
+        return
+
+    for row in rows:
+        match = and_(*[table.c[key] == row[key] for key in keys])
+        changed = db.session.execute(
+            update(table).where(match).values({column: table.c[column] + row[column] for column in values})
+        )
+        if changed.rowcount == 0:
+            db.session.execute(insert(table).values(row))
+
+def record_performance_changes(changes, leader_of):
+    """Apply imported performance changes to every rollup.
+
+    ``changes`` holds (user_id, period, value_delta, is_new_row) for offline
+    users; ``leader_of`` maps those user ids to their leader id.
+    """
+    company = defaultdict(lambda: [Decimal('0.00'), 0])
+    leaders = defaultdict(lambda: [Decimal('0.00'), 0])
+    members = defaultdict(lambda: [Decimal('0.00'), 0])
+    for user_id, period, delta, is_new in changes:
+        added = 1 if is_new else 0
+        targets = [company[period], members[user_id]]
+        leader_id = leader_of.get(user_id)
+        if leader_id is not None:
+            targets.append(leaders[(leader_id, period)])
+        for target in targets:
+            target[0] += delta
+            target[1] += added
+
+    increment(CompanyPeriodTotal, ['period'], [
+        {'period': period, 'total': total, 'row_count': count,
+         'offline_total': total, 'offline_row_count': count}
+        for period, (total, count) in company.items()
+    ])
+    increment(LeaderPeriodTotal, ['leader_id', 'period'], [
+        {'leader_id': leader_id, 'period': period, 'total': total, 'row_count': count}
+        for (leader_id, period), (total, count) in leaders.items()
+    ])
+    increment(MemberTotal, ['user_id'], [
+        {'user_id': user_id, 'total': total, 'row_count': count}
+        for user_id, (total, count) in members.items()
+    ])
+
+def record_member_change(user_id, old_leader_id, new_leader_id, was_offline, is_offline):
+    """Move a member's totals after an admin changes their leader or role."""
+    if old_leader_id == new_leader_id and was_offline == is_offline:
+        return
+    periods = db.session.query(
+        PerformanceData.period,
+        func.sum(PerformanceData.metric_value),
+        func.count(PerformanceData.id)
+    ).filter(PerformanceData.offline_user_id == user_id)\
+    .group_by(PerformanceData.period)\
+    .all()
+    if not periods:
+        return
+
+    if old_leader_id != new_leader_id:
+        moved = []
+        for period, total, count in periods:
+            if old_leader_id is not None:
+                moved.append({'leader_id': old_leader_id, 'period': period, 'total': -to_decimal(total), 'row_count': -count})
+            if new_leader_id is not None:
+                moved.append({'leader_id': new_leader_id, 'period': period, 'total': to_decimal(total), 'row_count': count})
+        increment(LeaderPeriodTotal, ['leader_id', 'period'], moved)
+
+    if was_offline != is_offline:
+        sign = 1 if is_offline else -1
+        increment(CompanyPeriodTotal, ['period'], [
+            {'period': period, 'offline_total': sign * to_decimal(total), 'offline_row_count': sign * count}
+            for period, total, count in periods
+        ])
+
+# --- Rebuild and verification ---
+
+def expected_company():
+    offline = User.role == 'offline'
+    return select(
+        PerformanceData.period,
+        func.sum(PerformanceData.metric_value),
+        func.count(PerformanceData.id),
+        func.coalesce(func.sum(case((offline, PerformanceData.metric_value), else_=0)), 0),
+        func.count(case((offline, PerformanceData.id))),
+    ).select_from(PerformanceData).outerjoin(User, User.id == PerformanceData.offline_user_id)\
+    .group_by(PerformanceData.period)
+
+def expected_leaders():
+    return select(
+        User.leader_id,
+        PerformanceData.period,
+        func.sum(PerformanceData.metric_value),
+        func.count(PerformanceData.id),
+    ).select_from(PerformanceData).join(User, User.id == PerformanceData.offline_user_id)\
+    .where(User.leader_id.isnot(None))\
+    .group_by(User.leader_id, PerformanceData.period)
+
+def expected_members():
+    return select(
+        PerformanceData.offline_user_id,
+        func.sum(PerformanceData.metric_value),
+        func.count(PerformanceData.id),
+    ).group_by(PerformanceData.offline_user_id)
+
+ROLLUPS = [
+    (CompanyPeriodTotal, ['period', 'total', 'row_count', 'offline_total', 'offline_row_count'], expected_company),
+    (LeaderPeriodTotal, ['leader_id', 'period', 'total', 'row_count'], expected_leaders),
+    (MemberTotal, ['user_id', 'total', 'row_count'], expected_members),
+]
+
+def rebuild():
+    """Recompute every rollup from performance_data with one INSERT ... SELECT each."""
+    for model, columns, expected in ROLLUPS:
+        db.session.execute(delete(model))
+        db.session.execute(insert(model).from_select(columns, expected()))
+
+def verify():
+    """Compare stored rollups with the raw table and return a list of mismatches."""
+    mismatches = []
+    for model, columns, expected in ROLLUPS:
+        key_count = len(model.__table__.primary_key.columns)
+        table = model.__table__
+
+        def normalise(rows):
+            return {
+                tuple(row[:key_count]): tuple(
+                    value if isinstance(value, int) else to_decimal(value) for value in row[key_count:]
+                )
+                for row in rows
+            }
+
+        stored = normalise(db.session.execute(select(*[table.c[column] for column in columns])).all())
+        actual = normalise(db.session.execute(expected()).all())
+        # Rows that netted out to zero after edits are harmless
+        stored = {key: values for key, values in stored.items() if any(values) or key in actual}
+        for key in sorted(stored.keys() | actual.keys(), key=str):
+            if stored.get(key) != actual.get(key):
+                mismatches.append(f'{table.name} {key}: stored {stored.get(key)}, expected {actual.get(key)}')
+    return mismatches
+
+# --- Dashboard reads ---
+
+def company_total(start=None, end=None):
+    """Sum of every period's total, optionally limited to a period key range."""
+    return db.session.query(func.coalesce(func.sum(CompanyPeriodTotal.total), 0.0))\
+        .filter(*range_clause(CompanyPeriodTotal.period, start, end))\
+        .scalar()
+
+def company_series(start=None, end=None):
+    return db.session.query(CompanyPeriodTotal.period, CompanyPeriodTotal.offline_total.label('total_sales'))\
+        .filter(CompanyPeriodTotal.offline_row_count > 0, *range_clause(CompanyPeriodTotal.period, start, end))\
+        .order_by(CompanyPeriodTotal.period.asc())\
+        .all()
+
+def member_totals(leader_id):
+    """Team members of a leader with their all-time totals, best first."""
+    total_sales = func.coalesce(MemberTotal.total, 0.0)
+    return db.session.query(User.id, User.username, User.created_at, total_sales.label('total_sales'))\
+        .outerjoin(MemberTotal, MemberTotal.user_id == User.id)\
+        .filter(User.leader_id == leader_id)\
+        .order_by(total_sales.desc(), User.username)
+
+def leader_dashboard(leader_id, top_n=3, start=None, end=None):
+    """Everything the leader dashboard shows for a leader's whole subtree, in one round trip.
+
+    The subtree comes from the user_hierarchy closure table, so a regional
+    leader sees every team below them. The parts are UNION ALL'd as (kind,
+    label, amount, rank) rows: one 'count', 'total' and 'funds' row, a
+    'series' row per period and a 'top' row for each of the best ``top_n``
+    members, ranked with row_number(). ``start`` and ``end`` limit the
+    totals, series and ranking to a period key range.
+    """
+    amount_type = LeaderPeriodTotal.total.type
+    team = select(User.id, User.username)\
+        .join(UserHierarchy, UserHierarchy.descendant_id == User.id)\
+        .where(UserHierarchy.ancestor_id == leader_id, UserHierarchy.depth > 0, User.role == 'offline')\
+        .cte('team')
+    # Rollups are kept per direct leader; a subtree's are the sum over the leaders in it
+    periods = select(LeaderPeriodTotal.period, func.sum(LeaderPeriodTotal.total).label('total'),
+                     func.sum(LeaderPeriodTotal.row_count).label('row_count'))\
+        .join(UserHierarchy, UserHierarchy.descendant_id == LeaderPeriodTotal.leader_id)\
+        .where(UserHierarchy.ancestor_id == leader_id, *range_clause(LeaderPeriodTotal.period, start, end))\
+        .group_by(LeaderPeriodTotal.period).cte('periods')
+    if start is None and end is None:
+        totals = select(MemberTotal.user_id, MemberTotal.total).subquery('member_totals')
+    else:
+        # Member totals are all-time; a range is summed from the covering (user, period, value) index
+        totals = select(PerformanceData.offline_user_id.label('user_id'),
+                        func.sum(PerformanceData.metric_value).label('total'))\
+            .join(team, team.c.id == PerformanceData.offline_user_id)\
+            .where(*range_clause(PerformanceData.period, start, end))\
+            .group_by(PerformanceData.offline_user_id).subquery('member_totals')
+    member_total = func.coalesce(totals.c.total, 0)
+    # Cut to the top N before ranking so the window only sees N rows, however big the team
+    best = select(team.c.username, member_total.label('total'))\
+        .select_from(team.outerjoin(totals, totals.c.user_id == team.c.id))\
+        .order_by(member_total.desc(), team.c.username).limit(top_n).subquery('best')
+    ranked = select(best.c.username, best.c.total,
+                    func.row_number().over(order_by=(best.c.total.desc(), best.c.username)).label('rank'))\
+        .cte('ranked')
+
+    def row(kind, label, amount, rank=None):
+        return (literal(kind).label('kind'), cast(label, db.String).label('label'),
+                cast(amount, amount_type).label('amount'), cast(rank, db.Integer).label('rank'))
+
+    statement = union_all(
+        select(*row('count', None, func.count())).select_from(team),
+        select(*row('total', None, func.coalesce(func.sum(periods.c.total), 0))).select_from(periods),
+        select(*row('funds', CompanySetting.value, None)).where(CompanySetting.key == 'total_funds'),
+        select(*row('series', periods.c.period, periods.c.total)).where(periods.c.row_count > 0),
+        select(*row('top', ranked.c.username, ranked.c.total, ranked.c.rank)),
+    ).order_by(literal_column('rank'), literal_column('label'))
+
+    result = {'count': 0, 'total': Decimal('0.00'), 'funds': None, 'series': [], 'top': []}
+    for kind, label, amount, rank in db.session.execute(statement):
+        if kind == 'count':
+            result['count'] = int(amount)
+        elif kind == 'total':
+            result['total'] = amount
+        elif kind == 'funds':
+            result['funds'] = label
+        elif kind == 'series':
+            # Period keys all have six digits, so their text sorts in period order
+            result['series'].append((int(label), amount))
+        else:
+            result['top'].append((label, amount)) # Ordered by rank
+    return result
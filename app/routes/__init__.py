@@ -2,5 +2,6 @@ from .general_routes import general_bp
 from .admin_routes import admin_bp
 from .leader_routes import leader_bp
 from .offline_routes import offline_bp
+from .api_routes import api_bp
 
-__all__ = ['general_bp', 'admin_bp', 'leader_bp', 'offline_bp']
+__all__ = ['general_bp', 'admin_bp', 'leader_bp', 'offline_bp', 'api_bp']
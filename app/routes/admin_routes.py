@@ -1,14 +1,20 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, session
-from ..utils import login_required, admin_required
-from ..models import User, db, CompanySetting, PerformanceData
-from sqlalchemy import func, extract
-import pandas as pd
+from flask import Blueprint, render_template, request, flash, redirect, url_for, session, jsonify, current_app, Response, stream_with_context, send_file, abort
+from ..utils import login_required, admin_required, publish_principal_version
+from ..models import User, db, CompanySetting, PerformanceData, ImportJob
+from ..passwords import hash_password
+from sqlalchemy import func, or_, and_
+from sqlalchemy.orm import aliased
 from werkzeug.utils import secure_filename
 import os
-from datetime import datetime
 from flask_wtf import FlaskForm
 from wtforms import HiddenField
-from werkzeug.security import generate_password_hash
+from ..jobs import submit_import, job_details, job_status, report_path
+from .. import rollups, hierarchy
+from ..cache import cached, get_cache, bump_data_version
+from ..engine import pool_stats
+from .. import exports
+from ..sessions import revoke_user_sessions
+from ..periods import parse_period_range, range_args, format_period
 
 class DeleteUserForm(FlaskForm):
     csrf_token = HiddenField()
@@ -19,42 +25,118 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 @login_required
 @admin_required
 def admin_dashboard():
+    period_range = parse_period_range(request.args)
+    if period_range is None:
+        flash('Invalid period range. Use YYYY-MM, with From not after To.', 'danger')
+        return redirect(url_for('admin.admin_dashboard'))
+    start, end = period_range
+    stats = cached(f'admin:dashboard:{start}:{end}', lambda: admin_dashboard_stats(start, end))
+    return render_template('admin/dashboard.html', range_args=range_args(period_range), **stats)
+
+def admin_dashboard_stats(start=None, end=None):
     setting = CompanySetting.query.filter_by(key='total_funds').first()
     total_funds = setting.value if setting else "N/A"
 
-    total_performance_result = db.session.query(func.coalesce(func.sum(PerformanceData.metric_value), 0.0)).scalar()
+    total_performance_result = rollups.company_total(start, end)
     total_performance = round(total_performance_result, 2) if total_performance_result is not None else 0.00
 
     leader_count = User.query.filter_by(role='leader').count()
     offline_user_count = User.query.filter_by(role='offline').count()
 
-    monthly_performance = db.session.query(
-        PerformanceData.period,
-        func.coalesce(func.sum(PerformanceData.metric_value), 0.0).label('total_sales')
-    ).outerjoin(User)\
-    .filter(User.role == 'offline')\
-    .group_by(PerformanceData.period)\
-    .order_by(PerformanceData.period.asc())\
-    .all()
+    monthly_performance = rollups.company_series(start, end)
 
-    chart_labels = [p.period for p in monthly_performance]
+    chart_labels = [format_period(p.period) for p in monthly_performance]
     chart_data = [float(p.total_sales) for p in monthly_performance]
 
-    return render_template('admin/dashboard.html',
-                           total_funds=total_funds,
-                           total_performance=total_performance,
-                           chart_labels=chart_labels,
-                           chart_data=chart_data,
-                           leader_count=leader_count,
-                           offline_user_count=offline_user_count)
+    return dict(total_funds=total_funds,
+                total_performance=total_performance,
+                chart_labels=chart_labels,
+                chart_data=chart_data,
+                leader_count=leader_count,
+                offline_user_count=offline_user_count)
+
+@admin_bp.route('/cache/stats')
+@login_required
+@admin_required
+def cache_stats():
+    return jsonify(get_cache().stats())
+
+@admin_bp.route('/db/pool')
+@login_required
+@admin_required
+def db_pool_stats():
+    return jsonify(pool_stats(current_app))
 
 @admin_bp.route('/users')
 @login_required
 @admin_required
 def list_users():
-    users = User.query.order_by(User.role, User.username).all()
+    filters = {
+        'role': request.args.get('role', ''),
+        'status': request.args.get('status', ''),
+        'leader': request.args.get('leader', '').strip(),
+        'q': request.args.get('q', '').strip(),
+    }
+    after = (request.args.get('after_role'), request.args.get('after'))
+    if after[1] is not None and after[0] is None and not filters['role']:
+        abort(400, 'The after cursor needs after_role unless the list is filtered by role.')
+    page_size = current_app.config['ADMIN_USERS_PAGE_SIZE']
+
+    rows = user_list_page(filters, after, page_size)
+    if rows is None:
+        flash(f"Leader with username '{filters['leader']}' not found.", 'warning')
+        rows = []
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    filter_args = {k: v for k, v in filters.items() if v}
+    next_args = None
+    if has_next:
+        last = rows[-1]
+        next_args = dict(filter_args, after_role=last.role, after=last.username)
+
     form = DeleteUserForm()
-    return render_template('admin/users.html', users=users, form=form)
+    # Not streamed: the session (and the flashes this consumes) is saved before a streamed body renders
+    return render_template('admin/users.html', users=rows, form=form, filters=filters,
+                           filter_args=filter_args, next_args=next_args, is_first_page=after[1] is None)
+
+def user_list_page(filters, after, page_size):
+    """One page of users in (role, username) order, plus one extra row to tell if there is a next page.
+
+    ``after`` is the (role, username) of the last row on the previous page;
+    the page starts right after it, so deep pages cost the same as the first.
+    Returns None if the leader filter names no leader.
+    """
+    Leader = aliased(User)
+    query = (db.session.query(User.id, User.username, User.role, User.account_status,
+                              Leader.username.label('leader_username'))
+             .outerjoin(Leader, User.leader_id == Leader.id))
+
+    if filters['role']:
+        query = query.filter(User.role == filters['role'])
+    if filters['status']:
+        query = query.filter(User.account_status == filters['status'])
+    if filters['leader']:
+        leader_id = (db.session.query(User.id)
+                     .filter(func.lower(User.username) == filters['leader'].lower(), User.role == 'leader')
+                     .scalar())
+        if leader_id is None:
+            return None
+        query = query.filter(User.leader_id == leader_id)
+    if filters['q']:
+        # A range rather than LIKE so the (role, username) index can serve it
+        prefix = filters['q']
+        query = query.filter(User.username >= prefix,
+                             User.username < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+    after_role, after_username = after
+    if after_username is not None:
+        if filters['role']:
+            query = query.filter(User.username > after_username)
+        else:
+            query = query.filter(or_(User.role > after_role,
+                                     and_(User.role == after_role, User.username > after_username)))
+
+    return query.order_by(User.role, User.username).limit(page_size + 1).all()
 
 @admin_bp.route('/users/create', methods=['GET', 'POST'])
 @login_required
@@ -76,22 +158,22 @@ def create_user_form():
             error = 'Invalid role specified.'
 
         leader_user = None
-        if role == 'offline':
-            if not leader_username:
-                error = "Leader username is required for role 'offline'."
-            else:
-                leader_user = User.query.filter_by(username=leader_username, role='leader').first()
-                if not leader_user:
-                    error = f"Leader with username '{leader_username}' not found or is not a leader."
+        if role == 'offline' and not leader_username:
+            error = "Leader username is required for role 'offline'."
+        elif role in ('offline', 'leader') and leader_username:
+            # Leaders may report to another leader (e.g. a regional leader)
+            leader_user = User.query.filter_by(username=leader_username, role='leader').first()
+            if not leader_user:
+                error = f"Leader with username '{leader_username}' not found or is not a leader."
         elif leader_username:
-            flash("Leader username is ignored for roles other than 'offline'.", 'warning')
+            flash("Leader username is ignored for the admin role.", 'warning')
 
         if role != 'leader' and can_view_funds:
             flash("Can View Funds flag is ignored for roles other than 'leader'.", 'warning')
             can_view_funds = False
 
         if error is None:
-            hashed_password = generate_password_hash(password)
+            hashed_password = hash_password(password)
             new_user = User(
                 username=username,
                 password_hash=hashed_password,
@@ -100,7 +182,10 @@ def create_user_form():
                 can_view_funds=can_view_funds
             )
             db.session.add(new_user)
+            db.session.flush()
+            hierarchy.attach_users([new_user.id])
             db.session.commit()
+            bump_data_version()
             flash(f"User '{username}' ({role}) created successfully.", 'success')
             return redirect(url_for('admin.list_users'))
         else:
@@ -131,29 +216,41 @@ def edit_user(user_id):
             error = 'Invalid role specified.'
 
         leader_user = None
-        if role == 'offline':
-            if not leader_username:
-                error = "Leader username is required for role 'offline'."
-            else:
-                leader_user = User.query.filter_by(username=leader_username, role='leader').first()
-                if not leader_user:
-                    error = f"Leader with username '{leader_username}' not found or is not a leader."
+        if role == 'offline' and not leader_username:
+            error = "Leader username is required for role 'offline'."
+        elif role in ('offline', 'leader') and leader_username:
+            leader_user = User.query.filter_by(username=leader_username, role='leader').first()
+            if not leader_user:
+                error = f"Leader with username '{leader_username}' not found or is not a leader."
+            elif hierarchy.is_in_subtree(user_to_edit.id, leader_user.id):
+                error = f"'{leader_username}' reports to '{user_to_edit.username}', so it cannot be their leader."
         elif leader_username:
-            flash("Leader username is ignored for roles other than 'offline'.", 'warning')
+            flash("Leader username is ignored for the admin role.", 'warning')
 
         if role != 'leader' and can_view_funds:
             flash("Can View Funds flag is ignored for roles other than 'leader'.", 'warning')
             can_view_funds = False
 
         if error is None:
+            old_leader_id = user_to_edit.leader_id
+            was_offline = user_to_edit.role == 'offline'
             user_to_edit.username = username
             user_to_edit.role = role
+            user_to_edit.auth_version = (user_to_edit.auth_version or 0) + 1
             if password:
-                user_to_edit.password_hash = generate_password_hash(password)
+                user_to_edit.password_hash = hash_password(password)
             user_to_edit.leader_id = leader_user.id if leader_user else None
             user_to_edit.can_view_funds = can_view_funds if role == 'leader' else False
+            if user_to_edit.leader_id != old_leader_id:
+                hierarchy.move_subtree(user_to_edit.id, user_to_edit.leader_id) # Brings everyone under them along
+            rollups.record_member_change(user_to_edit.id, old_leader_id, user_to_edit.leader_id,
+                                         was_offline, role == 'offline')
 
             db.session.commit()
+            bump_data_version()
+            publish_principal_version(user_to_edit)
+            if password and user_to_edit.id != session.get('user_id'):
+                revoke_user_sessions(user_to_edit.id) # A new password signs them out everywhere
             flash(f"User '{user_to_edit.username}' updated successfully.", 'success')
             return redirect(url_for('admin.list_users'))
         else:
@@ -162,6 +259,18 @@ def edit_user(user_id):
     leaders = User.query.filter_by(role='leader').order_by(User.username).all()
     return render_template('admin/edit_user.html', user=user_to_edit, leaders=leaders)
 
+@admin_bp.route('/users/<int:user_id>/sessions/revoke', methods=['POST'])
+@login_required
+@admin_required
+def revoke_sessions(user_id):
+    user = User.query.get_or_404(user_id)
+    if user.id == session.get('user_id'):
+        flash('Use Logout to end your own session.', 'warning')
+        return redirect(url_for('admin.edit_user', user_id=user.id))
+    ended = revoke_user_sessions(user.id)
+    flash(f"Signed '{user.username}' out of {ended} session{'s' if ended != 1 else ''}.", 'success')
+    return redirect(url_for('admin.edit_user', user_id=user.id))
+
 @admin_bp.route('/settings/funds', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -179,6 +288,7 @@ def manage_funds():
                     setting = CompanySetting(key='total_funds', value=new_value)
                     db.session.add(setting)
                 db.session.commit()
+                bump_data_version()
                 flash('Total funds updated successfully.', 'success')
             except ValueError:
                 flash('Invalid amount entered. Please enter a number.', 'danger')
@@ -208,108 +318,9 @@ def import_users():
             return redirect(request.url)
 
         if file and (file.filename.endswith('.xlsx') or file.filename.endswith('.csv')):
-            try:
-                if file.filename.endswith('.xlsx'):
-                    df = pd.read_excel(file, engine='openpyxl')
-                else:
-                    try:
-                        df = pd.read_csv(file)
-                    except UnicodeDecodeError:
-                        file.seek(0)
-                        df = pd.read_csv(file, encoding='latin1')
-
-                required_columns = ['username', 'password', 'role']
-                if not all(col in df.columns for col in required_columns):
-                    flash(f'Missing required columns. Need: {required_columns}', 'danger')
-                    return redirect(request.url)
-
-                created_count = 0
-                skipped_count = 0
-                errors = []
-
-                for index, row in df.iterrows():
-                    username = str(row['username']).strip() if pd.notna(row['username']) else ''
-                    password = str(row['password']).strip() if pd.notna(row['password']) else ''
-                    role = str(row['role']).strip() if pd.notna(row['role']) else ''
-                    leader_username = str(row.get('leader_username', '')).strip() if pd.notna(row.get('leader_username', '')) else ''
-                    can_view_funds = str(row.get('can_view_funds', '')).strip().lower() == 'true' if pd.notna(row.get('can_view_funds', '')) else False
-
-                    row_num = index + 2
-                    error_prefix = f"Row {row_num}: "
-                    row_errors = []
-
-                    if not username or not password or not role:
-                        row_errors.append(f"{error_prefix}Missing username, password, or role.")
-                    existing_user = User.query.filter(User.username.ilike(username)).first()
-                    if existing_user:
-                        row_errors.append(f"{error_prefix}Username '{username}' already exists.")
-                    if role not in ['admin', 'leader', 'offline']:
-                        row_errors.append(f"{error_prefix}Invalid role '{role}' for user '{username}'.")
-
-                    leader_user = None
-                    if role == 'offline':
-                        if not leader_username:
-                            row_errors.append(f"{error_prefix}Leader username is required for role 'offline'.")
-                            continue
-                        leader_user = User.query.filter(User.username.ilike(leader_username), User.role == 'leader').first()
-                        if not leader_user:
-                            row_errors.append(f"{error_prefix}Leader with username '{leader_username}' not found or is not a leader.")
-                            continue
-                    elif leader_username:
-                        flash("Leader username is ignored for roles other than 'offline'.", 'warning')
-
-                    if role != 'leader' and can_view_funds:
-                        flash("Can View Funds flag is ignored for roles other than 'leader'.", 'warning')
-                        can_view_funds = False
-
-                    if row_errors:
-                        errors.extend(row_errors)
-                        skipped_count += 1
-                        continue
-
-                    try:
-                        hashed_password = generate_password_hash(password)
-                        new_user = User(
-                            username=username,
-                            password_hash=hashed_password,
-                            role=role,
-                            leader_id=leader_user.id if leader_user else None,
-                            can_view_funds=can_view_funds
-                        )
-                        db.session.add(new_user)
-                        created_count += 1
-                    except Exception as e:
-                        errors.append(f"{error_prefix}Error creating user '{username}': {e}")
-                        skipped_count += 1
-                        db.session.rollback()
-
-                if errors and created_count == 0:
-                    db.session.rollback()
-                    flash('Import failed. No users were created. See errors below.', 'danger')
-                elif errors:
-                    try:
-                        db.session.commit()
-                        flash(f'Import partially successful. Created: {created_count}, Skipped: {skipped_count}. See errors below.', 'warning')
-                    except Exception as commit_error:
-                        db.session.rollback()
-                        flash(f'Import failed during final commit after partial success. Error: {commit_error}', 'danger')
-                        for error in errors:
-                            flash(error, 'danger')
-                        return redirect(request.url)
-                else:
-                    db.session.commit()
-                    flash(f'User import successful! Created: {created_count}', 'success')
-
-                for error in errors:
-                    flash(error, 'danger')
-
-                return redirect(url_for('admin.list_users'))
-
-            except Exception as e:
-                db.session.rollback()
-                flash(f'An critical error occurred during file processing: {e}', 'danger')
-                return redirect(request.url)
-
+            job = submit_import('users', file, session.get('user_id'), dry_run=bool(request.form.get('dry_run')))
+            flash(f"User {'dry run' if job.dry_run else 'import'} of '{job.filename}' queued.", 'info')
+            return redirect(url_for('admin.import_job', job_id=job.id))
         else:
             flash('Invalid file type. Please upload .xlsx or .csv', 'danger')
             return redirect(request.url)
@@ -330,109 +341,53 @@ def import_performance():
             return redirect(request.url)
 
         if file and (file.filename.endswith('.xlsx') or file.filename.endswith('.csv')):
-            try:
-                if file.filename.endswith('.xlsx'):
-                    df = pd.read_excel(file, engine='openpyxl')
-                else:
-                    try:
-                        df = pd.read_csv(file)
-                    except UnicodeDecodeError:
-                        file.seek(0)
-                        df = pd.read_csv(file, encoding='latin1')
-
-                required_columns = ['offline_username', 'period', 'sales_amount']
-                if not all(col in df.columns for col in required_columns):
-                    flash(f'Missing required columns. Need: {required_columns}', 'danger')
-                    return redirect(request.url)
-
-                created_count = 0
-                updated_count = 0
-                skipped_count = 0
-                errors = []
-
-                for index, row in df.iterrows():
-                    username = str(row['offline_username']).strip() if pd.notna(row['offline_username']) else ''
-                    period = str(row['period']).strip() if pd.notna(row['period']) else ''
-                    sales_amount_str = str(row['sales_amount']).strip() if pd.notna(row['sales_amount']) else ''
-
-                    row_num = index + 2
-                    error_prefix = f"Row {row_num}: "
-                    row_errors = []
-
-                    if not username or not period or not sales_amount_str:
-                        row_errors.append(f"{error_prefix}Missing offline_username, period, or sales_amount.")
-
-                    if not (len(period) == 7 and period[4] == '-' and period[:4].isdigit() and period[5:].isdigit()):
-                        row_errors.append(f"{error_prefix}Invalid period format '{period}'. Use YYYY-MM.")
-
-                    try:
-                        sales_amount = float(sales_amount_str)
-                    except ValueError:
-                        row_errors.append(f"{error_prefix}Invalid sales_amount '{sales_amount_str}'. Must be a number.")
-
-                    offline_user = None
-                    if username:
-                        offline_user = User.query.filter(User.username.ilike(username), User.role == 'offline').first()
-                        if not offline_user:
-                            row_errors.append(f"{error_prefix}Offline user '{username}' not found.")
-
-                    if row_errors:
-                        errors.extend(row_errors)
-                        skipped_count += 1
-                        continue
-
-                    existing_record = PerformanceData.query.filter_by(
-                        offline_user_id=offline_user.id,
-                        period=period
-                    ).first()
-
-                    try:
-                        if existing_record:
-                            existing_record.metric_value = sales_amount
-                            existing_record.recorded_at = datetime.utcnow()
-                            updated_count += 1
-                        else:
-                            new_record = PerformanceData(
-                                offline_user_id=offline_user.id,
-                                period=period,
-                                metric_value=sales_amount
-                            )
-                            db.session.add(new_record)
-                            created_count += 1
-                    except Exception as e:
-                        errors.append(f"{error_prefix}Error saving performance for '{username}' period '{period}': {e}")
-                        skipped_count += 1
-                        db.session.rollback()
-
-                if errors and (created_count + updated_count == 0):
-                    db.session.rollback()
-                    flash('Import failed. No performance data saved. See errors below.', 'danger')
-                elif errors:
-                    try:
-                        db.session.commit()
-                        flash(f'Import partially successful. Created: {created_count}, Updated: {updated_count}, Skipped: {skipped_count}. See errors below.', 'warning')
-                    except Exception as commit_error:
-                        db.session.rollback()
-                        flash(f'Import failed during final commit. Error: {commit_error}', 'danger')
-                        for error in errors:
-                            flash(error, 'danger')
-                        return redirect(request.url)
-                else:
-                    db.session.commit()
-                    flash(f'Performance import successful! Created: {created_count}, Updated: {updated_count}', 'success')
-
-                for error in errors:
-                    flash(error, 'danger')
-
-                return redirect(url_for('admin.admin_dashboard'))
-
-            except Exception as e:
-                db.session.rollback()
-                flash(f'An critical error occurred during file processing: {e}', 'danger')
-                return redirect(request.url)
-
+            job = submit_import('performance', file, session.get('user_id'), force=bool(request.form.get('force')),
+                                dry_run=bool(request.form.get('dry_run')))
+            flash(f"Performance {'dry run' if job.dry_run else 'import'} of '{job.filename}' queued.", 'info')
+            return redirect(url_for('admin.import_job', job_id=job.id))
         else:
             flash('Invalid file type. Please upload .xlsx or .csv', 'danger')
             return redirect(request.url)
 
     return render_template('admin/import_performance.html')
+
+@admin_bp.route('/performance/export')
+@login_required
+@admin_required
+def export_performance():
+    fmt = request.args.get('format', 'csv')
+    period_range = parse_period_range(request.args)
+    if fmt not in exports.FORMATS or period_range is None:
+        flash('Invalid export options. Use YYYY-MM periods, with From not after To.', 'danger')
+        return redirect(url_for('admin.admin_dashboard'))
+
+    stmt = exports.export_query(*period_range)
+    filename = exports.export_filename('company', fmt, *period_range)
+    return Response(stream_with_context(exports.stream_export(fmt, stmt)), mimetype=exports.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@admin_bp.route('/imports/<int:job_id>')
+@login_required
+@admin_required
+def import_job(job_id):
+    job = ImportJob.query.get_or_404(job_id)
+    return render_template('admin/import_job.html', job=job, details=job_details(job), status=job_status(job))
+
+@admin_bp.route('/imports/<int:job_id>/errors.csv')
+@login_required
+@admin_required
+def import_job_errors(job_id):
+    job = ImportJob.query.get_or_404(job_id)
+    path = report_path(job.id)
+    if not os.path.exists(path):
+        abort(404)
+    name = os.path.splitext(secure_filename(job.filename))[0] or 'import'
+    return send_file(path, mimetype='text/csv', as_attachment=True,
+                     download_name=f'{name}_import_{job.id}_errors.csv')
+
+@admin_bp.route('/imports/<int:job_id>/status')
+@login_required
+@admin_required
+def import_job_status(job_id):
+    job = ImportJob.query.get_or_404(job_id)
+    return jsonify(job_status(job))
@@ -0,0 +1,148 @@
+from flask import Blueprint, Response, request, session, json, abort
+import gzip
+import hashlib
+from ..utils import login_required, admin_required, leader_required
+from ..cache import cached
+from ..models import db, User
+from .. import rollups
+from ..periods import parse_period_range, format_period
+from .admin_routes import admin_dashboard_stats
+from .leader_routes import leader_dashboard_stats
+
+api_bp = Blueprint('api', __name__, url_prefix='/api')
+
+def encode_payload(data):
+    """Serialize once: the JSON body, its gzipped copy and a strong ETag for each."""
+    body = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    return {
+        'body': body,
+        'gzipped': gzip.compress(body, compresslevel=6),
+        'etag': digest,
+        'gzip_etag': digest + '-gzip', # A different representation needs a different strong ETag
+    }
+
+def json_response(scope, compute):
+    """Cached JSON for ``scope`` with ETag revalidation and gzip.
+
+    The encoded payload is cached under the current data version, so a
+    request only serializes when the data changed, and a client holding the
+    current ETag gets a bodiless 304.
+    """
+    payload = cached(f'api:{scope}', lambda: encode_payload(compute()))
+    use_gzip = request.accept_encodings.quality('gzip') > 0
+    etag = payload['gzip_etag'] if use_gzip else payload['etag']
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(payload['gzipped'] if use_gzip else payload['body'], mimetype='application/json')
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    # Per-user data: browsers may keep it, but must check the ETag each time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+    response.vary.add('Cookie')
+    return response
+
+def requested_range():
+    """The from/to (or months) period range of the request; a malformed one is a 400."""
+    period_range = parse_period_range(request.args)
+    if period_range is None:
+        abort(400, 'Invalid period range. Use YYYY-MM, with from not after to.')
+    return period_range
+
+def admin_stats(start, end):
+    return cached(f'admin:dashboard:{start}:{end}', lambda: admin_dashboard_stats(start, end))
+
+def leader_stats(start, end):
+    leader_id = session['user_id']
+    return cached(f'leader:{leader_id}:dashboard:{start}:{end}', lambda: leader_dashboard_stats(leader_id, start, end))
+
+@api_bp.route('/admin/series')
+@login_required
+@admin_required
+def admin_series():
+    start, end = requested_range()
+
+    def series():
+        stats = admin_stats(start, end)
+        return {'labels': stats['chart_labels'], 'values': stats['chart_data']}
+    return json_response(f'admin:series:{start}:{end}', series)
+
+@api_bp.route('/admin/totals')
+@login_required
+@admin_required
+def admin_totals():
+    start, end = requested_range()
+
+    def totals():
+        stats = admin_stats(start, end)
+        return {
+            'total_funds': stats['total_funds'],
+            'total_performance': float(stats['total_performance']),
+            'leader_count': stats['leader_count'],
+            'offline_user_count': stats['offline_user_count'],
+        }
+    return json_response(f'admin:totals:{start}:{end}', totals)
+
+@api_bp.route('/admin/teams/<int:user_id>')
+@login_required
+@admin_required
+def admin_team(user_id):
+    """Totals, member count, monthly series and top members for any leader's whole subtree."""
+    leader = db.session.get(User, user_id)
+    if leader is None or leader.role != 'leader':
+        abort(404)
+    start, end = requested_range()
+
+    def team():
+        dashboard = rollups.leader_dashboard(user_id, top_n=10, start=start, end=end)
+        return {
+            'leader': leader.username,
+            'offline_user_count': dashboard['count'],
+            'total_performance': float(dashboard['total']),
+            'series': {'labels': [format_period(period) for period, _ in dashboard['series']],
+                       'values': [float(total) for _, total in dashboard['series']]},
+            'top_members': [{'username': username, 'total_sales': float(total)} for username, total in dashboard['top']],
+        }
+    return json_response(f'admin:team:{user_id}:{start}:{end}', team)
+
+@api_bp.route('/leader/series')
+@login_required
+@leader_required
+def leader_series():
+    start, end = requested_range()
+
+    def series():
+        stats = leader_stats(start, end)
+        return {'labels': stats['chart_labels'], 'values': stats['chart_data']}
+    return json_response(f"leader:{session['user_id']}:series:{start}:{end}", series)
+
+@api_bp.route('/leader/top-members')
+@login_required
+@leader_required
+def leader_top_members():
+    start, end = requested_range()
+    return json_response(f"leader:{session['user_id']}:top:{start}:{end}", lambda: [
+        {'username': member['username'], 'total_sales': float(member['total_sales'])}
+        for member in leader_stats(start, end)['top_offline_users']
+    ])
+
+@api_bp.route('/leader/totals')
+@login_required
+@leader_required
+def leader_totals():
+    can_view = session.get('user_can_view_funds', False)
+    start, end = requested_range()
+
+    def totals():
+        stats = leader_stats(start, end)
+        return {
+            'offline_user_count': stats['offline_user_count'],
+            'total_performance': float(stats['total_performance']),
+            'company_funds': stats['total_funds'] if can_view else None,
+        }
+    # Funds visibility is part of the scope so the two variants never share an ETag
+    return json_response(f"leader:{session['user_id']}:totals:{int(can_view)}:{start}:{end}", totals)
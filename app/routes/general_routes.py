@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, session, abort
-from werkzeug.security import generate_password_hash
-from ..utils import login_required
+from ..utils import login_required, current_user
 from ..models import User, db
+from ..passwords import hash_password
 from datetime import datetime
 
 general_bp = Blueprint('general', __name__)
@@ -18,7 +18,7 @@ def index():
 @general_bp.route('/dashboard')
 @login_required
 def dashboard():
-    user = User.query.get(session.get('user_id'))
+    user = current_user()
     if user is None:
         flash("User not found.", 'danger')
         session.clear()
@@ -72,7 +72,7 @@ def settings():
 @general_bp.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
-    user = User.query.get(session.get('user_id'))
+    user = current_user()
     if user is None:
         flash("User not found.", 'danger')
         session.clear()
@@ -91,7 +91,7 @@ def profile():
         if error is None:
             user.username = username
             if password:
-                user.password_hash = generate_password_hash(password)
+                user.password_hash = hash_password(password)
 
             db.session.commit()
             session['username'] = user.username
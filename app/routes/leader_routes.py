@@ -1,8 +1,12 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, session
-from ..utils import login_required, leader_required
+from flask import Blueprint, render_template, request, flash, redirect, url_for, session, Response, stream_with_context
+from ..utils import login_required, leader_required, current_user
 from ..models import User, CompanySetting, db, PerformanceData
+from ..passwords import hash_password
 from sqlalchemy import func
-from werkzeug.security import generate_password_hash
+from .. import rollups, hierarchy
+from ..cache import cached, bump_data_version
+from .. import exports
+from ..periods import parse_period_range, range_args, format_period
 import pandas as pd
 from werkzeug.utils import secure_filename
 import os
@@ -15,76 +19,79 @@ leader_bp = Blueprint('leader', __name__, url_prefix='/leader')
 @leader_required
 def leader_dashboard():
     leader_id = session.get('user_id')
-    leader = User.query.get(leader_id)
+    leader = current_user()
     if not leader:
         flash("Leader not found.", "danger")
         session.clear()
         return redirect(url_for('auth.login'))
 
-    offline_user_count = User.query.filter_by(leader_id=leader_id).count()
+    period_range = parse_period_range(request.args)
+    if period_range is None:
+        flash('Invalid period range. Use YYYY-MM, with From not after To.', 'danger')
+        return redirect(url_for('leader.leader_dashboard'))
+    start, end = period_range
+    stats = cached(f'leader:{leader_id}:dashboard:{start}:{end}', lambda: leader_dashboard_stats(leader_id, start, end))
 
     company_funds_display = None
     can_view = session.get('user_can_view_funds', False)
     if can_view:
-        setting = CompanySetting.query.filter_by(key='total_funds').first()
-        company_funds_display = setting.value if setting else "N/A"
-
-    total_performance_result = db.session.query(func.coalesce(func.sum(PerformanceData.metric_value), 0.0))\
-        .join(User)\
-        .filter(User.leader_id == leader_id)\
-        .scalar()
-    total_performance = round(total_performance_result, 2) if total_performance_result is not None else 0.00
-
-    monthly_performance = db.session.query(
-        PerformanceData.period,
-        func.coalesce(func.sum(PerformanceData.metric_value), 0.0).label('total_sales')
-    ).join(User)\
-    .filter(User.leader_id == leader_id)\
-    .group_by(PerformanceData.period)\
-    .order_by(PerformanceData.period.asc())\
-    .all()
-
-    chart_labels = [p.period for p in monthly_performance]
-    chart_data = [float(p.total_sales) for p in monthly_performance]
-
-    top_offline_users = db.session.query(
-        User.username,
-        func.coalesce(func.sum(PerformanceData.metric_value), 0.0).label('total_sales')
-    ).outerjoin(PerformanceData)\
-    .filter(User.leader_id == leader_id)\
-    .group_by(User.username)\
-    .order_by(func.coalesce(func.sum(PerformanceData.metric_value), 0.0).desc())\
-    .limit(3)\
-    .all()
+        company_funds_display = stats['total_funds']
 
     return render_template('leader/dashboard.html',
-                           offline_user_count=offline_user_count,
-                           total_performance=total_performance,
+                           offline_user_count=stats['offline_user_count'],
+                           total_performance=stats['total_performance'],
                            company_funds_display=company_funds_display,
-                           chart_labels=chart_labels,
-                           chart_data=chart_data,
-                           top_offline_users=top_offline_users)
+                           range_args=range_args(period_range))
+
+def leader_dashboard_stats(leader_id, start=None, end=None):
+    dashboard = rollups.leader_dashboard(leader_id, top_n=3, start=start, end=end)
+
+    total_funds = dashboard['funds'] if dashboard['funds'] is not None else "N/A"
+    total_performance = round(dashboard['total'], 2) if dashboard['total'] is not None else 0.00
+
+    chart_labels = [format_period(period) for period, _ in dashboard['series']]
+    chart_data = [float(total) for _, total in dashboard['series']]
+
+    top_offline_users = [
+        {'username': username, 'total_sales': total}
+        for username, total in dashboard['top']
+    ]
+
+    return dict(offline_user_count=dashboard['count'],
+                total_funds=total_funds,
+                total_performance=total_performance,
+                chart_labels=chart_labels,
+                chart_data=chart_data,
+                top_offline_users=top_offline_users)
 
 @leader_bp.route('/offline-users')
 @login_required
 @leader_required
 def list_offline_users():
     leader_id = session.get('user_id')
-    leader = User.query.get(leader_id)
-
-    offline_users_with_performance = db.session.query(
-        User.id,
-        User.username,
-        User.created_at,
-        func.coalesce(func.sum(PerformanceData.metric_value), 0.0).label('total_sales')
-    ).outerjoin(PerformanceData)\
-    .filter(User.leader_id == leader_id)\
-    .group_by(User.id, User.username, User.created_at)\
-    .order_by(User.username)\
-    .all()
+
+    offline_users_with_performance = rollups.member_totals(leader_id)\
+        .order_by(None)\
+        .order_by(User.username)\
+        .all()
 
     return render_template('leader/offline_users.html', users=offline_users_with_performance)
 
+@leader_bp.route('/performance/export')
+@login_required
+@leader_required
+def export_performance():
+    fmt = request.args.get('format', 'csv')
+    period_range = parse_period_range(request.args)
+    if fmt not in exports.FORMATS or period_range is None:
+        flash('Invalid export options. Use YYYY-MM periods, with From not after To.', 'danger')
+        return redirect(url_for('leader.leader_dashboard'))
+
+    stmt = exports.export_query(*period_range, leader_id=session.get('user_id'))
+    filename = exports.export_filename('team', fmt, *period_range)
+    return Response(stream_with_context(exports.stream_export(fmt, stmt)), mimetype=exports.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 @leader_bp.route('/offline-users/create', methods=['GET', 'POST'])
 @login_required
 @leader_required
@@ -102,7 +109,7 @@ def create_offline_user():
             error = f"Username '{username}' is already taken."
 
         if error is None:
-            hashed_password = generate_password_hash(password)
+            hashed_password = hash_password(password)
             new_user = User(
                 username=username,
                 password_hash=hashed_password,
@@ -110,7 +117,10 @@ def create_offline_user():
                 leader_id=leader_id
             )
             db.session.add(new_user)
+            db.session.flush()
+            hierarchy.attach_users([new_user.id])
             db.session.commit()
+            bump_data_version()
             flash(f"Offline user '{username}' created successfully.", 'success')
             return redirect(url_for('leader.list_offline_users'))
         else:
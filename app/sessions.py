@@ -0,0 +1,184 @@
+# Server-side sessions: the cookie holds only a random session id and the
+# session data lives in the user_sessions table. Rows are written only when a
+# session changes (or, at most once per SESSION_REFRESH_INTERVAL, to push its
+# idle expiry along), and an admin can sign a user out everywhere by
+# deleting that user's rows. Anonymous sessions (a flash on the login page)
+# never get a row: they stay in Flask's signed cookie, as before.
+import hashlib
+import secrets
+import time
+from datetime import datetime, timedelta
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin, SecureCookieSessionInterface
+from sqlalchemy import select, delete, insert, update
+from werkzeug.datastructures import CallbackDict
+from .models import db, UserSession
+
+serializer = TaggedJSONSerializer() # What Flask's cookie sessions use, so flashes and tuples round-trip
+
+# Requests that never need the session, so never look it up
+SESSIONLESS_PATHS = ('/readyz',)
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, user_id=None, expires_at=None):
+        def on_update(session):
+            session.modified = True
+            session.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.stored_user_id = user_id # Whose session the stored row is
+        self.expires_at = expires_at
+        self.new = sid is None
+        self.modified = False
+        self.accessed = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+def session_key(sid):
+    """Rows are keyed by a hash of the cookie value, so reading the table does not give out live cookies."""
+    return hashlib.sha256(sid.encode()).hexdigest()
+
+class DatabaseSessionInterface(SessionInterface):
+    def __init__(self):
+        self._last_purge = 0.0
+        self.cookie_sessions = SecureCookieSessionInterface() # Holds anonymous sessions
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or request.path in SESSIONLESS_PATHS or \
+                (app.static_url_path and request.path.startswith(app.static_url_path + '/')):
+            return ServerSession()
+        if '.' in sid:
+            # A signed anonymous session; session ids never contain a dot. A
+            # signed-in one (left from the cookie backend) can't be revoked: drop it
+            data = self.cookie_sessions.open_session(app, request)
+            session = ServerSession(dict(data) if data and 'user_id' not in data else None)
+            session.new = False
+            session.modified = bool(data) and 'user_id' in data # So the cookie is cleared
+            return session
+        row = db.session.execute(
+            select(UserSession.data, UserSession.user_id, UserSession.expires_at)
+            .where(UserSession.id == session_key(sid))
+        ).first()
+        if row is None or row.expires_at < datetime.utcnow():
+            return ServerSession() # Unknown, revoked or idle too long: start over
+        return ServerSession(serializer.loads(row.data), sid, row.user_id, row.expires_at)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        user_id = session.get('user_id')
+        if user_id is None:
+            self.save_anonymous_session(app, session, response)
+            return
+
+        now = datetime.utcnow()
+        idle = timedelta(seconds=app.config['SESSION_IDLE_TIMEOUT'])
+        refresh_due = session.expires_at is not None and \
+            session.expires_at - now < idle - timedelta(seconds=app.config['SESSION_REFRESH_INTERVAL'])
+        if not (session.new or session.modified or refresh_due):
+            return # Nothing changed and the expiry is fresh enough: no write, no Set-Cookie
+
+        # Whatever the view left uncommitted would be rolled back at teardown
+        # anyway; doing it now means the commit below only saves the session
+        db.session.rollback()
+        if session.sid is not None and user_id != session.stored_user_id:
+            # Signing in or switching user gets a fresh id, so a planted one is useless
+            db.session.execute(delete(UserSession).where(UserSession.id == session_key(session.sid)))
+            session.sid = None
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+            db.session.execute(insert(UserSession).values(
+                id=session_key(session.sid), user_id=user_id, data=serializer.dumps(dict(session)),
+                expires_at=now + idle, updated_at=now))
+        elif session.modified:
+            db.session.execute(update(UserSession).where(UserSession.id == session_key(session.sid)).values(
+                data=serializer.dumps(dict(session)), expires_at=now + idle, updated_at=now))
+        else:
+            db.session.execute(update(UserSession).where(UserSession.id == session_key(session.sid))
+                               .values(expires_at=now + idle))
+        db.session.commit()
+        self.purge_if_due(app)
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def save_anonymous_session(self, app, session, response):
+        """Keep a session without a user in the signed cookie; signing out deletes its row."""
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        signed_out = session.sid is not None
+        if signed_out:
+            self.delete(session.sid)
+        if not session:
+            if signed_out or session.modified:
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not (signed_out or session.modified):
+            return
+        response.set_cookie(
+            name, self.cookie_sessions.get_signing_serializer(app).dumps(dict(session)),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+    def delete(self, sid):
+        db.session.rollback()
+        db.session.execute(delete(UserSession).where(UserSession.id == session_key(sid)))
+        db.session.commit()
+
+    def purge_if_due(self, app):
+        """Expire one batch of idle sessions, at most once per SESSION_PURGE_INTERVAL per process."""
+        if time.monotonic() - self._last_purge < app.config['SESSION_PURGE_INTERVAL']:
+            return
+        self._last_purge = time.monotonic()
+        purge_expired(app.config['SESSION_PURGE_BATCH_SIZE'], max_batches=1)
+
+def purge_expired(batch_size=1000, max_batches=None):
+    """Delete expired sessions in batches of ``batch_size``, each its own transaction.
+
+    Returns the number of sessions removed.
+    """
+    removed = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        expired = select(UserSession.id).where(UserSession.expires_at < datetime.utcnow()).limit(batch_size)
+        count = db.session.execute(delete(UserSession).where(UserSession.id.in_(expired))).rowcount
+        db.session.commit()
+        removed += count
+        batches += 1
+        if count < batch_size:
+            break
+    return removed
+
+def revoke_user_sessions(user_id):
+    """Sign a user out everywhere, at once. Commits, and returns the number of sessions ended."""
+    ended = db.session.execute(delete(UserSession).where(UserSession.user_id == user_id)).rowcount
+    db.session.commit()
+    return ended
+
+def init_app(app):
+    if app.config['SESSION_BACKEND'] == 'database':
+        app.session_interface = DatabaseSessionInterface()
@@ -1,6 +1,68 @@
 # This file will contain utility functions, e.g., for permission checks
 from functools import wraps
-from flask import session, flash, redirect, url_for, abort, request
+from flask import session, flash, redirect, url_for, abort, request, g, current_app
+from .models import db, User
+from .cache import get_cache
+
+def principal_key(user_id):
+    return f'principal:{user_id}'
+
+def current_user():
+    """The logged-in user, loaded from the database at most once per request."""
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = db.session.get(User, user_id) if user_id is not None else None
+    return g.current_user
+
+def store_principal(user):
+    """Copy what the decorators and templates need about a user into the session."""
+    session['user_id'] = user.id
+    session['user_role'] = user.role
+    session['username'] = user.username
+    session['auth_version'] = user.auth_version
+    if user.role == 'leader':
+        session['user_can_view_funds'] = user.can_view_funds
+    else:
+        session.pop('user_can_view_funds', None)
+
+def principal_registry():
+    """The cache backend that auth versions are published to, or None if it can't be trusted.
+
+    A shared backend is seen by every worker, and a per-worker one is enough
+    when this is the only worker. An lru cache in one of several workers
+    would miss edits made through the others.
+    """
+    backend = get_cache().backend
+    if backend.shared or current_app.config['WEB_CONCURRENCY'] <= 1:
+        return backend
+    return None
+
+def publish_principal_version(user):
+    """Record a user's current auth version so stale sessions are caught without a query."""
+    registry = principal_registry()
+    if registry is not None:
+        registry.set(principal_key(user.id), user.auth_version, current_app.config['PRINCIPAL_VERSION_TTL'])
+
+def principal_is_current():
+    """Check the session's auth version stamp, refreshing the session if it is stale.
+
+    Returns False if the user no longer exists. While the registry holds
+    the session's version this costs no query; otherwise the user is
+    loaded once, through current_user(), so the route can reuse the row.
+    """
+    user_id = session['user_id']
+    registry = principal_registry()
+    if registry is not None and registry.get(principal_key(user_id)) == session.get('auth_version'):
+        return True
+
+    user = current_user()
+    if user is None:
+        return False
+    publish_principal_version(user)
+    if user.auth_version != session.get('auth_version'):
+        # Role, name or funds access changed since login; pick the new values up now
+        store_principal(user)
+    return True
 
 def login_required(f):
     """Decorate routes to require login."""
@@ -9,6 +71,10 @@ def login_required(f):
         if 'user_id' not in session:
             flash('Please log in to access this page.', 'warning')
             return redirect(url_for('auth.login', next=request.url))
+        if not principal_is_current():
+            session.clear()
+            flash('Please log in to access this page.', 'warning')
+            return redirect(url_for('auth.login', next=request.url))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -20,6 +86,10 @@ def role_required(role_name):
             if 'user_id' not in session:
                 flash('Please log in to access this page.', 'warning')
                 return redirect(url_for('auth.login', next=request.url))
+            if not principal_is_current():
+                session.clear()
+                flash('Please log in to access this page.', 'warning')
+                return redirect(url_for('auth.login', next=request.url))
             if session.get('user_role') != role_name:
                 abort(403) # Forbidden
             return f(*args, **kwargs)
@@ -0,0 +1,71 @@
+"""Per-request overhead of schema bootstrap, before and after moving it out of requests.
+
+"before" re-installs the old before_request hook that ran db.create_all() on
+every request; "after" is the app as it ships, bootstrapped once at startup.
+
+    python -m benchmarks.cold_start --requests 500
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from app import create_app
+from app.models import db
+from benchmarks.common import percentile
+
+def build_app(legacy_hook, database_path):
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{database_path}',
+        'BOOTSTRAP_ON_START': not legacy_hook,
+        'TESTING': True,
+    })
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.WARNING)
+    logging.getLogger('sqlalchemy.pool').setLevel(logging.WARNING)
+    if legacy_hook:
+        @app.before_request
+        def initialize_database():
+            db.create_all()
+    return app
+
+def run(legacy_hook, requests):
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        app = build_app(legacy_hook, os.path.join(tmp, 'bench.db'))
+        client = app.test_client()
+        boot = time.perf_counter() - started
+
+        started = time.perf_counter()
+        client.get('/hello')
+        first = time.perf_counter() - started
+
+        samples = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            client.get('/hello')
+            samples.append(time.perf_counter() - started)
+    return {
+        'boot_ms': boot * 1000,
+        'first_request_ms': first * 1000,
+        'mean_ms': statistics.mean(samples) * 1000,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    args = parser.parse_args()
+
+    before = run(True, args.requests)
+    after = run(False, args.requests)
+    print(f"{'':18}{'before':>10}{'after':>10}")
+    for key in before:
+        print(f'{key:18}{before[key]:10.3f}{after[key]:10.3f}')
+    print(f"per-request overhead removed: {before['mean_ms'] - after['mean_ms']:.3f} ms")
+
+if __name__ == '__main__':
+    main()
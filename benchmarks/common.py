@@ -0,0 +1,111 @@
+"""Shared helpers for the benchmark and plan-check scripts."""
+import logging
+import random
+
+from sqlalchemy import create_engine, inspect, insert, text
+from werkzeug.security import generate_password_hash
+
+from app import create_app, rollups, hierarchy
+from app.models import db, User, PerformanceData
+from app.periods import parse_period
+
+PASSWORD = 'password'
+
+def bench_app(database_uri, **config):
+    """An app bootstrapped against ``database_uri`` with imports run inline and quiet logs."""
+    settings = {
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'BOOTSTRAP_ON_START': True,
+        'IMPORT_JOBS_INLINE': True,
+        'WTF_CSRF_ENABLED': False,
+        'TESTING': True,
+    }
+    settings.update(config)
+    app = create_app(settings)
+    for name in ('', 'sqlalchemy.engine', 'sqlalchemy.pool'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    return app
+
+def reset_database(database_uri, drop=False):
+    """Make sure the benchmark starts from an empty database, before any app touches it.
+
+    A database that already has tables is only emptied when ``drop`` is
+    set (the scripts' --drop flag); otherwise the script stops, so pointing
+    --database-url at a real database cannot wipe it.
+    """
+    engine = create_engine(database_uri)
+    try:
+        tables = inspect(engine).get_table_names()
+        if tables and not drop:
+            raise SystemExit(f'{engine.url.render_as_string(hide_password=True)} already has tables '
+                             f'({", ".join(sorted(tables)[:5])}...). Pass --drop to drop them, or use an empty database.')
+        if tables:
+            db.metadata.drop_all(engine)
+    finally:
+        engine.dispose()
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def period_labels(months, start_year=2020):
+    return [f'{start_year + m // 12}-{m % 12 + 1:02d}' for m in range(months)]
+
+def seed(app, leaders, members_per_leader, months, rng_seed=0):
+    """Bulk load leaders, their offline members and one performance row per member and month.
+
+    ``members_per_leader`` is either one team size for every leader or a
+    list with each leader's team size. Every seeded user has the password
+    ``PASSWORD``; usernames are ``leader_<n>`` and ``offline_<n>``.
+    """
+    if isinstance(members_per_leader, int):
+        team_sizes = [members_per_leader] * leaders
+    else:
+        team_sizes = list(members_per_leader)
+    rng = random.Random(rng_seed)
+    # One cheap hash shared by every seeded user keeps seeding fast
+    password_hash = generate_password_hash(PASSWORD, method='pbkdf2:sha256:1000')
+    periods = period_labels(months)
+    # Bulk inserts silently drop keys that are not columns, so key through the table
+    users = User.__table__
+    c = users.c
+    with app.app_context():
+        db.session.execute(insert(users), [
+            {c.username.key: f'leader_{i}', c.password_hash.key: password_hash, c.role.key: 'leader',
+             c.can_view_funds.key: i % 2 == 0}
+            for i in range(leaders)
+        ])
+        leader_ids = [user_id for user_id, in db.session.query(User.id).filter(User.role == 'leader').order_by(User.id)]
+
+        owners = [leader_id for leader_id, size in zip(leader_ids, team_sizes) for _ in range(size)]
+        members = [
+            {c.username.key: f'offline_{n}', c.password_hash.key: password_hash, c.role.key: 'offline',
+             c.leader_id.key: leader_id}
+            for n, leader_id in enumerate(owners)
+        ]
+        for start in range(0, len(members), 5000):
+            db.session.execute(insert(users), members[start:start + 5000])
+
+        member_ids = [user_id for user_id, in db.session.query(User.id).filter(User.role == 'offline')]
+        batch = []
+        for user_id in member_ids:
+            for period in periods:
+                batch.append({'offline_user_id': user_id, 'period': parse_period(period),
+                              'metric_value': round(rng.uniform(100, 5000), 2)})
+            if len(batch) >= 20000:
+                db.session.execute(insert(PerformanceData), batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(PerformanceData), batch)
+
+        rollups.rebuild()
+        hierarchy.rebuild()
+        db.session.commit()
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+
+def login(client, username, password=PASSWORD):
+    response = client.post('/auth/login', data={'username': username, 'password': password})
+    if response.status_code != 302:
+        raise RuntimeError(f'Login failed for {username}')
+    return response
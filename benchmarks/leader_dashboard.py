@@ -0,0 +1,71 @@
+"""Leader dashboard latency by team size.
+
+Seeds one leader per requested team size, then times the consolidated
+dashboard query on its own and the whole uncached /leader/dashboard
+request for each of them.
+
+    python -m benchmarks.leader_dashboard --sizes 10 1000 50000
+    python -m benchmarks.leader_dashboard --database-url postgresql://...
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from app import rollups
+from app.cache import bump_data_version
+from app.models import db, User
+from benchmarks.common import bench_app, reset_database, seed, login, percentile
+
+def timed(samples, fn):
+    started = time.perf_counter()
+    fn()
+    samples.append(time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file')
+    parser.add_argument('--drop', action='store_true', help='Drop the tables of a non-empty --database-url first')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 50000], help='Team sizes to measure')
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    tmp = None
+    database_url = args.database_url
+    if database_url is None:
+        tmp = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(tmp.name, 'leaders.db')}"
+
+    if args.database_url:
+        reset_database(database_url, args.drop)
+    app = bench_app(database_url)
+    seed(app, len(args.sizes), args.sizes, args.months)
+
+    print(f"{'members':>8}{'query p50':>12}{'query p95':>12}{'page p50':>12}{'page p95':>12}  (ms)")
+    for index, size in enumerate(args.sizes):
+        username = f'leader_{index}'
+        with app.app_context():
+            leader_id = db.session.query(User.id).filter_by(username=username).scalar()
+            query_samples = []
+            for _ in range(args.iterations):
+                timed(query_samples, lambda: rollups.leader_dashboard(leader_id))
+                db.session.rollback()
+
+        client = app.test_client()
+        login(client, username)
+        page_samples = []
+        for _ in range(args.iterations):
+            with app.app_context():
+                bump_data_version() # Skip the aggregate cache so every request runs the query
+            timed(page_samples, lambda: client.get('/leader/dashboard'))
+
+        print(f'{size:>8}'
+              f'{percentile(query_samples, 50) * 1000:12.3f}{percentile(query_samples, 95) * 1000:12.3f}'
+              f'{percentile(page_samples, 50) * 1000:12.3f}{percentile(page_samples, 95) * 1000:12.3f}')
+
+    if tmp is not None:
+        tmp.cleanup()
+
+if __name__ == '__main__':
+    main()
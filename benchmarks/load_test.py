@@ -0,0 +1,181 @@
+"""Load test of the production server, one run per gunicorn worker model.
+
+Seeds a local SQLite database, starts gunicorn with gunicorn.conf.py for
+each worker model in turn, and has admin, leader and offline personas log
+in and browse their real pages until the time is up. Reports throughput
+and tail latency per worker model and persona.
+
+    python -m benchmarks.load_test --models sync gthread --duration 20
+    python -m benchmarks.load_test --database-url postgresql://localhost/affiliate --users 8
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from app.models import db
+from benchmarks.common import bench_app, reset_database, seed, percentile, PASSWORD
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PERSONAS = {
+    'admin': ['/admin/dashboard', '/admin/users', '/admin/users?role=offline', '/api/admin/series',
+              '/api/admin/totals'],
+    'leader': ['/leader/dashboard', '/leader/offline-users', '/api/leader/series', '/api/leader/top-members',
+               '/api/leader/totals'],
+    'offline': ['/offline/dashboard'],
+}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_until_ready(base_url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            with urllib.request.urlopen(base_url + '/readyz', timeout=1) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('gunicorn did not become ready in time')
+
+def credentials(persona, index, leaders, members):
+    if persona == 'admin':
+        return 'admin', 'admin123'
+    if persona == 'leader':
+        return f'leader_{index % leaders}', PASSWORD
+    return f'offline_{index % members}', PASSWORD
+
+def virtual_user(base_url, persona, username, password, deadline, samples, errors):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    login = urllib.parse.urlencode({'username': username, 'password': password}).encode()
+    opener.open(base_url + '/auth/login', data=login, timeout=30).read()
+    rng = random.Random(username)
+    while time.monotonic() < deadline:
+        path = rng.choice(PERSONAS[persona])
+        started = time.perf_counter()
+        try:
+            with opener.open(base_url + path, timeout=30) as response:
+                response.read()
+                # Being sent back to the login page means the session was lost
+                ok = response.status == 200 and '/auth/login' not in response.url
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            ok = False
+        elapsed = time.perf_counter() - started
+        (samples if ok else errors).append((persona, path, elapsed))
+
+def run_model(model, args, database_url, metrics_dir):
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    env = dict(os.environ,
+               DATABASE_URL=database_url,
+               WEB_WORKER_CLASS=model,
+               PORT=str(port),
+               METRICS_DIR=metrics_dir,
+               SECRET_KEY='load-test',
+               LOG_LEVEL='WARNING')
+    if args.workers:
+        env['WEB_CONCURRENCY'] = str(args.workers)
+    if args.threads:
+        env['WEB_THREADS'] = str(args.threads)
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'run:app'],
+                               cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(base_url, process)
+        samples, errors = [], []
+        deadline = time.monotonic() + args.duration
+        users = [threading.Thread(target=virtual_user,
+                                  args=(base_url, persona, *credentials(persona, i, args.leaders,
+                                                                        args.leaders * args.members),
+                                        deadline, samples, errors))
+                 for persona in PERSONAS for i in range(args.users)]
+        started = time.monotonic()
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        elapsed = time.monotonic() - started
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+
+    def summarize(rows):
+        latencies = [row[2] for row in rows]
+        if not latencies:
+            return {'requests': 0}
+        return {
+            'requests': len(latencies),
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        }
+
+    report = {'model': model, 'errors': len(errors), 'total': summarize(samples)}
+    for persona in PERSONAS:
+        report[persona] = summarize([row for row in samples if row[0] == persona])
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--models', nargs='+', default=['sync', 'gthread', 'gevent'],
+                        choices=['sync', 'gthread', 'gevent'])
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file')
+    parser.add_argument('--drop', action='store_true', help='Drop the tables of a non-empty --database-url first')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds of load per worker model')
+    parser.add_argument('--users', type=int, default=4, help='Concurrent virtual users per persona')
+    parser.add_argument('--workers', type=int, help='WEB_CONCURRENCY for every model')
+    parser.add_argument('--threads', type=int, help='WEB_THREADS for gthread')
+    parser.add_argument('--leaders', type=int, default=20)
+    parser.add_argument('--members', type=int, default=50, help='Offline users per leader')
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--json', action='store_true', help='Print the reports as JSON')
+    args = parser.parse_args()
+
+    models = list(args.models)
+    if 'gevent' in models:
+        try:
+            import gevent # noqa: F401
+        except ImportError:
+            print('gevent is not installed; skipping the gevent worker model.', file=sys.stderr)
+            models.remove('gevent')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'load.db')}"
+        if args.database_url:
+            reset_database(database_url, args.drop)
+        app = bench_app(database_url)
+        seed(app, args.leaders, args.members, args.months)
+        reports = [run_model(model, args, database_url, os.path.join(tmp, f'metrics-{model}')) for model in models]
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+    print(f"{'model':8}{'persona':9}{'requests':>9}{'rps':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for report in reports:
+        for persona in ['total', *PERSONAS]:
+            row = report[persona]
+            if not row['requests']:
+                continue
+            print(f"{report['model']:8}{persona:9}{row['requests']:>9}{row['rps']:>8}"
+                  f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}")
+        print(f"{report['model']:8}{'errors':9}{report['errors']:>9}")
+
+if __name__ == '__main__':
+    main()
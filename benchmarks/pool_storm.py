@@ -0,0 +1,66 @@
+"""Connection storm against the engine profile, reporting pool telemetry.
+
+Starts more threads than the pool holds, each checking out a connection
+and keeping it for a while, the way a burst of requests does after a
+deploy. Prints what the pool telemetry recorded.
+
+    python -m benchmarks.pool_storm --threads 20 --hold-ms 50
+    DB_POOL_SIZE=2 python -m benchmarks.pool_storm --profile web
+    python -m benchmarks.pool_storm --database-url postgresql://localhost/affiliate
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import text
+
+from app.engine import pool_stats
+from app.models import db
+from benchmarks.common import bench_app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file')
+    parser.add_argument('--profile', default='web', choices=['web', 'worker', 'cli'])
+    parser.add_argument('--threads', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=5, help='Checkouts per thread')
+    parser.add_argument('--hold-ms', type=int, default=50, help='How long each checkout keeps its connection')
+    args = parser.parse_args()
+
+    tmp = None
+    database_url = args.database_url
+    if database_url is None:
+        tmp = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(tmp.name, 'pool.db')}"
+
+    app = bench_app(database_url, DB_ENGINE_PROFILE=args.profile)
+    errors = []
+
+    def hammer():
+        with app.app_context():
+            for _ in range(args.rounds):
+                try:
+                    with db.engine.connect() as connection:
+                        connection.execute(text('SELECT 1'))
+                        time.sleep(args.hold_ms / 1000)
+                except Exception as e:
+                    errors.append(type(e).__name__)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=hammer) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps(pool_stats(app), indent=2, default=str))
+    print(f'{args.threads * args.rounds} checkouts in {elapsed:.2f}s, {len(errors)} failed {sorted(set(errors))}')
+    if tmp is not None:
+        tmp.cleanup()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Query-plan regression check for the dashboard and import paths.
+
+Seeds a large synthetic dataset, drives the real routes through the test
+client while recording every SELECT, then EXPLAINs each statement and
+exits non-zero if any of them falls back to a full table scan.
+
+    python -m benchmarks.query_plans                      # SQLite temp file
+    python -m benchmarks.query_plans --database-url postgresql://...
+"""
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+
+from sqlalchemy import event
+
+from app.models import db
+from benchmarks.common import bench_app, reset_database, seed, login, period_labels
+
+# Tiny by design (a handful of settings, one row per month), so scanning is the right plan
+ALLOWED_FULL_SCANS = {'company_settings', 'rollup_company_period'}
+
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)$')
+
+def record_selects(engine):
+    statements = {}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith('SELECT'):
+            statements.setdefault(statement, parameters)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+def full_scans(connection, statement, parameters, tables):
+    """Return (table names scanned in full, plan text) for one statement."""
+    if connection.dialect.name == 'postgresql':
+        plan = connection.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+        scans = []
+
+        def walk(node):
+            if node.get('Node Type') == 'Seq Scan':
+                scans.append(node['Relation Name'])
+            for child in node.get('Plans', []):
+                walk(child)
+
+        walk(plan[0]['Plan'])
+        return scans, json.dumps(plan, indent=1)
+
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    details = [row[-1] for row in rows]
+    scans = []
+    for detail in details:
+        match = SQLITE_SCAN.match(detail)
+        if match and match.group(1) in tables:
+            scans.append(match.group(1))
+    return scans, '\n'.join(details)
+
+def exercise(app, leader, member):
+    """Hit every dashboard and both importers once."""
+    admin = app.test_client()
+    login(admin, 'admin', 'admin123')
+    admin.get('/admin/dashboard')
+    perf_csv = f'offline_username,period,sales_amount\n{member},{period_labels(1)[0]},123.45\n'
+    admin.post('/admin/performance/import', data={'perf_file': (io.BytesIO(perf_csv.encode()), 'perf.csv')},
+               content_type='multipart/form-data')
+    user_csv = f'username,password,role,leader_username\nplan_check_user,pw,offline,{leader}\n'
+    admin.post('/admin/users/import', data={'user_file': (io.BytesIO(user_csv.encode()), 'users.csv')},
+               content_type='multipart/form-data')
+
+    leader_client = app.test_client()
+    login(leader_client, leader)
+    leader_client.get('/leader/dashboard')
+    leader_client.get('/leader/offline-users')
+
+    member_client = app.test_client()
+    login(member_client, member)
+    member_client.get('/offline/dashboard')
+
+def check_plans(app, leader, member):
+    """Exercise the app and EXPLAIN every SELECT it ran.
+
+    Returns (statement, tables scanned in full outside ALLOWED_FULL_SCANS,
+    plan text) for each distinct statement.
+    """
+    with app.app_context():
+        statements = record_selects(db.engine)
+        tables = set(db.metadata.tables)
+    exercise(app, leader, member)
+
+    checked = []
+    with app.app_context(), db.engine.connect() as connection:
+        for statement, parameters in statements.items():
+            scans, plan = full_scans(connection, statement, parameters, tables)
+            checked.append((statement, [table for table in scans if table not in ALLOWED_FULL_SCANS], plan))
+    return checked
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file')
+    parser.add_argument('--drop', action='store_true', help='Drop the tables of a non-empty --database-url first')
+    parser.add_argument('--leaders', type=int, default=200)
+    parser.add_argument('--members', type=int, default=100, help='Offline users per leader')
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--verbose', action='store_true', help='Print every plan')
+    args = parser.parse_args()
+
+    tmp = None
+    database_url = args.database_url
+    if database_url is None:
+        tmp = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(tmp.name, 'plans.db')}"
+
+    if args.database_url:
+        reset_database(database_url, args.drop)
+    app = bench_app(database_url)
+    seed(app, args.leaders, args.members, args.months)
+
+    checked = check_plans(app, 'leader_0', 'offline_0')
+    failures = 0
+    for statement, bad, plan in checked:
+        if bad or args.verbose:
+            print('FULL SCAN on ' + ', '.join(bad) if bad else 'ok', '\n', statement, '\n', plan, '\n')
+        failures += bool(bad)
+
+    print(f'{len(checked)} statements checked, {failures} with full table scans.')
+    if tmp is not None:
+        tmp.cleanup()
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Route benchmarks over fixed-size synthetic datasets.
+
+Seeds a database at one scale tier and times the main routes through the
+Flask test client: the admin and leader dashboards (uncached), the leader's
+member list, the admin user list, and both importers on an upload sized to
+the tier. Results go to a JSON file so runs can be compared over time.
+
+    python -m benchmarks.routes --tier small
+    python -m benchmarks.routes --tier medium --output before.json
+    python -m benchmarks.routes --tier medium --output after.json --compare before.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from app.cache import bump_data_version
+from app.models import db
+from benchmarks.common import bench_app, reset_database, seed, login, percentile, period_labels
+
+# name: (leaders, offline users per leader, months, performance rows per import, users per import)
+TIERS = {
+    'small': (5, 20, 10, 100, 20),           # 1k performance rows
+    'medium': (50, 200, 10, 10000, 200),     # 100k
+    'large': (500, 1000, 10, 100000, 1000),  # 5M
+}
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def summarize(samples):
+    return {
+        'iterations': len(samples),
+        'mean_ms': round(statistics.mean(samples) * 1000, 3),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'min_ms': round(min(samples) * 1000, 3),
+        'max_ms': round(max(samples) * 1000, 3),
+    }
+
+def time_requests(app, client, iterations, make_request, uncached=True):
+    samples = []
+    for i in range(iterations):
+        if uncached:
+            with app.app_context():
+                bump_data_version()
+        started = time.perf_counter()
+        response = make_request(i)
+        response.get_data() # Streamed pages render while the body is read
+        samples.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{response.request.path} returned {response.status_code}')
+    return summarize(samples)
+
+def performance_upload(rows, members, months):
+    periods = period_labels(months)
+    lines = ['offline_username,period,sales_amount']
+    lines += [f'offline_{n % members},{periods[(n // members) % months]},{(n % 997) + 0.5:.2f}' for n in range(rows)]
+    return '\n'.join(lines).encode()
+
+def user_upload(rows, run, leaders):
+    lines = ['username,password,role,leader_username']
+    lines += [f'bench_{run}_{n},pw{n},offline,leader_{n % leaders}' for n in range(rows)]
+    return '\n'.join(lines).encode()
+
+def run_suite(app, tier, iterations, import_iterations):
+    leaders, members_per_leader, months, perf_rows, user_rows = TIERS[tier]
+    members = leaders * members_per_leader
+    results = {}
+
+    admin = app.test_client()
+    login(admin, 'admin', 'admin123')
+    leader = app.test_client()
+    login(leader, 'leader_0')
+
+    results['admin.admin_dashboard'] = time_requests(app, admin, iterations, lambda i: admin.get('/admin/dashboard'))
+    results['leader.leader_dashboard'] = time_requests(app, leader, iterations, lambda i: leader.get('/leader/dashboard'))
+    results['leader.list_offline_users'] = time_requests(app, leader, iterations,
+                                                         lambda i: leader.get('/leader/offline-users'))
+    results['admin.list_users'] = time_requests(app, admin, iterations, lambda i: admin.get('/admin/users'))
+    # 'offline_9' sorts near the end of the list; with keyset pagination that page
+    # should cost the same as the first one
+    results['admin.list_users (deep page)'] = time_requests(
+        app, admin, iterations, lambda i: admin.get('/admin/users?after_role=offline&after=offline_9'))
+
+    perf_file = performance_upload(perf_rows, members, months)
+    results[f'admin.import_performance ({perf_rows} rows)'] = time_requests(
+        app, admin, import_iterations, uncached=False,
+        make_request=lambda i: admin.post('/admin/performance/import', content_type='multipart/form-data',
+                                          data={'perf_file': (io.BytesIO(perf_file), 'performance.csv')}))
+    results[f'admin.import_users ({user_rows} rows)'] = time_requests(
+        app, admin, import_iterations, uncached=False,
+        make_request=lambda i: admin.post('/admin/users/import', content_type='multipart/form-data',
+                                          data={'user_file': (io.BytesIO(user_upload(user_rows, i, leaders)),
+                                                              'users.csv')}))
+    return results
+
+def print_results(results, baseline=None):
+    print(f"{'route':45}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}" + (f"{'p50 vs base':>14}" if baseline else ''))
+    for name, stats in results.items():
+        line = f"{name:45}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['mean_ms']:>10}"
+        if baseline and name in baseline:
+            change = (stats['p50_ms'] - baseline[name]['p50_ms']) / baseline[name]['p50_ms'] * 100
+            line += f'{change:>+13.1f}%'
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tier', choices=list(TIERS), default='small')
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file')
+    parser.add_argument('--drop', action='store_true', help='Drop the tables of a non-empty --database-url first')
+    parser.add_argument('--iterations', type=int, default=30, help='Requests per read-only route')
+    parser.add_argument('--import-iterations', type=int, default=3, help='Uploads per importer')
+    parser.add_argument('--output', help='JSON results file (default: benchmarks/results/routes-<tier>-<time>.json)')
+    parser.add_argument('--compare', help='Earlier results file to compare p50 against')
+    args = parser.parse_args()
+
+    leaders, members_per_leader, months, _, _ = TIERS[args.tier]
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{os.path.join(tmp, 'routes.db')}"
+        if args.database_url:
+            reset_database(database_url, args.drop)
+        app = bench_app(database_url, IMPORT_UPLOAD_FOLDER=os.path.join(tmp, 'imports'))
+        started = time.perf_counter()
+        seed(app, leaders, members_per_leader, months)
+        seed_seconds = time.perf_counter() - started
+        with app.app_context():
+            dialect = db.engine.dialect.name
+        results = run_suite(app, args.tier, args.iterations, args.import_iterations)
+
+    report = {
+        'suite': 'routes',
+        'tier': args.tier,
+        'performance_rows': leaders * members_per_leader * months,
+        'database': dialect,
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'seed_seconds': round(seed_seconds, 2),
+        'results': results,
+    }
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                         f"routes-{args.tier}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+    print(f'Results written to {output}')
+
+if __name__ == '__main__':
+    main()
@@ -1,94 +1,181 @@
+"""Generate synthetic affiliate users and performance data.
+
+Scale factor 1 is 10 leaders, 1,000 offline users and 12 months of
+performance (12,000 rows); everything grows linearly with --scale. Team
+sizes follow a power law and sales follow a yearly season, and the same
+--seed always gives the same data.
+
+    python generate_fake_data.py --scale 1 --format xlsx
+    python generate_fake_data.py --scale 100 --format csv --output data/
+    python generate_fake_data.py --scale 500 --format db   # straight into DATABASE_URL
+"""
+import argparse
+import csv
+import io
+import os
+import time
+from datetime import date, datetime
+
+import numpy as np
 import pandas as pd
-import random
-from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash
-
-# --- Configuration ---
-NUM_LEADERS = 5
-NUM_OFFLINE_PER_LEADER = 10
-NUM_ADMINS = 1
-PERFORMANCE_MONTHS = 6 # Generate data for the last 6 months
-
-# --- Generate Users ---
-users_data = []
-leaders = []
-
-# Admins
-for i in range(NUM_ADMINS):
-    username = f"admin_{i+1}"
-    password = "password" # Use a simple default password for fake data
-    users_data.append({
-        'username': username,
-        'password': password,
-        'role': 'admin',
-        'leader_username': '', # Admins don't have leaders
-        'can_view_funds': 'Yes' # Admins can view funds
+
+LEADERS_PER_SCALE = 10
+OFFLINE_PER_SCALE = 1000
+PASSWORD = 'password' # Every generated user gets this password
+XLSX_MAX_ROWS = 1048575 # One row of every sheet is the header
+
+def period_range(end_period, months):
+    year, month = map(int, end_period.split('-'))
+    index = year * 12 + month - 1 - np.arange(months)[::-1]
+    return index // 12, index % 12 + 1
+
+def generate(scale, months, end_period, seed, prefix=''):
+    """Return (users, performance) DataFrames in the importers' column layout."""
+    rng = np.random.default_rng(seed)
+    leaders = max(1, round(LEADERS_PER_SCALE * scale))
+    members = max(1, round(OFFLINE_PER_SCALE * scale))
+
+    # Power-law team sizes: a few leaders run most of the members
+    weights = rng.pareto(1.2, leaders) + 1
+    team_sizes = rng.multinomial(members, weights / weights.sum())
+    member_leader = np.repeat(np.arange(leaders), team_sizes)
+
+    leader_names = np.char.add(f'{prefix}leader_', (np.arange(leaders) + 1).astype(str))
+    member_names = np.char.add(f'{prefix}offline_', (np.arange(members) + 1).astype(str))
+    users = pd.DataFrame({
+        'username': np.concatenate([leader_names, member_names]),
+        'password': PASSWORD,
+        'role': np.concatenate([np.full(leaders, 'leader'), np.full(members, 'offline')]),
+        'leader_username': np.concatenate([np.full(leaders, ''), leader_names[member_leader]]),
+        'can_view_funds': np.concatenate([np.where(np.arange(leaders) % 2 == 0, 'Yes', 'No'),
+                                          np.full(members, 'No')]),
     })
 
-# Leaders
-for i in range(NUM_LEADERS):
-    username = f"leader_{i+1}"
-    password = "password"
-    can_view_funds = 'Yes' if i % 2 == 0 else 'No' # Alternate which leaders can view funds
-    users_data.append({
-        'username': username,
-        'password': password,
-        'role': 'leader',
-        'leader_username': '', # Leaders don't have leaders
-        'can_view_funds': can_view_funds
+    # Each member has a lognormal base level; months follow a season with a
+    # year-end peak; about one member-month in ten has no sales at all
+    years, month_numbers = period_range(end_period, months)
+    season = 1 + 0.25 * np.sin(2 * np.pi * (month_numbers - 4) / 12) + 0.35 * (month_numbers == 12)
+    base = rng.lognormal(mean=7.0, sigma=0.8, size=members)
+    amounts = base[:, None] * season[None, :] * rng.lognormal(0, 0.25, size=(members, months))
+    active = rng.random((members, months)) > 0.1
+
+    member_index, period_index = np.nonzero(active)
+    periods = np.char.add(np.char.add(years.astype(str), '-'), np.char.zfill(month_numbers.astype(str), 2))
+    performance = pd.DataFrame({
+        'offline_username': member_names[member_index],
+        'period': periods[period_index],
+        'sales_amount': np.round(amounts[member_index, period_index], 2),
     })
-    leaders.append(username)
-
-# Offline Users
-offline_user_counter = 1
-for leader_username in leaders:
-    for i in range(NUM_OFFLINE_PER_LEADER):
-        username = f"offline_{offline_user_counter}"
-        password = "password"
-        users_data.append({
-            'username': username,
-            'password': password,
-            'role': 'offline',
-            'leader_username': leader_username, # Assign to a leader
-            'can_view_funds': 'No' # Offline users cannot view funds
-        })
-        offline_user_counter += 1
-
-# Add one offline user with no leader for testing edge case
-users_data.append({
-    'username': 'unassigned_offline',
-    'password': 'password',
-    'role': 'offline',
-    'leader_username': '',
-    'can_view_funds': 'No'
-})
-
-
-users_df = pd.DataFrame(users_data)
-
-# --- Generate Performance Data ---
-performance_data = []
-offline_usernames = users_df[users_df['role'] == 'offline']['username'].tolist()
-
-today = datetime.utcnow()
-for i in range(PERFORMANCE_MONTHS):
-    current_month = today - timedelta(days=30 * i)
-    period = current_month.strftime('%Y-%m')
-    for username in offline_usernames:
-        # Generate random sales amount for the period
-        sales_amount = round(random.uniform(100.0, 5000.0), 2)
-        performance_data.append({
-            'offline_username': username,
-            'period': period,
-            'sales_amount': sales_amount
-        })
-
-performance_df = pd.DataFrame(performance_data)
-
-# --- Save to Excel ---
-output_file = 'fake_affiliate_data.xlsx'
-with pd.ExcelWriter(output_file) as writer:
-    users_df.to_excel(writer, sheet_name='Users', index=False)
-    performance_df.to_excel(writer, sheet_name='Performance', index=False)
-
-print(f"Fake data generated and saved to '{output_file}'")
+    return users, performance
+
+def write_files(users, performance, fmt, output):
+    os.makedirs(output, exist_ok=True)
+    if fmt == 'csv':
+        paths = [os.path.join(output, 'users.csv'), os.path.join(output, 'performance.csv')]
+        users.to_csv(paths[0], index=False)
+        performance.to_csv(paths[1], index=False)
+    elif fmt == 'parquet':
+        paths = [os.path.join(output, 'users.parquet'), os.path.join(output, 'performance.parquet')]
+        try:
+            users.to_parquet(paths[0], index=False)
+            performance.to_parquet(paths[1], index=False)
+        except ImportError:
+            raise SystemExit('Parquet output needs pyarrow: pip install pyarrow')
+    else:
+        if max(len(users), len(performance)) > XLSX_MAX_ROWS:
+            raise SystemExit(f'Too many rows for an xlsx sheet ({XLSX_MAX_ROWS} max); use --format csv or parquet.')
+        paths = [os.path.join(output, 'fake_affiliate_data.xlsx')]
+        with pd.ExcelWriter(paths[0]) as writer:
+            users.to_excel(writer, sheet_name='Users', index=False)
+            performance.to_excel(writer, sheet_name='Performance', index=False)
+    return paths
+
+def bulk_insert(connection, table, columns, rows, chunk_size=50000):
+    """Insert tuples through the driver: COPY with psycopg2, executemany otherwise.
+
+    ``table`` and ``columns`` are the model's Table and Column objects, so a
+    renamed column fails here by name instead of inside the database.
+    """
+    names = [column.name for column in columns]
+    table = table.name
+    cursor = connection.connection.cursor()
+    if connection.dialect.name == 'postgresql' and hasattr(cursor, 'copy_expert'):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} ({', '.join(names)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        return
+    placeholder = '?' if connection.dialect.paramstyle == 'qmark' else '%s'
+    statement = f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join([placeholder] * len(names))})"
+    for start in range(0, len(rows), chunk_size):
+        cursor.executemany(statement, rows[start:start + chunk_size])
+
+def load_database(users, performance, app=None):
+    """Bulk load into the configured database (or ``app``'s) and rebuild the rollups and team hierarchy."""
+    from werkzeug.security import generate_password_hash
+    from app import create_app, rollups, hierarchy
+    from app.models import db, User, PerformanceData
+
+    app = app or create_app()
+    with app.app_context():
+        taken = db.session.query(User.id).filter(User.username.in_(users['username'].head(1000).tolist())).first()
+        if taken:
+            raise SystemExit('Generated usernames already exist; run "flask init-db" first or pass --prefix.')
+
+        # One real hash shared by every user keeps logins realistic and loading fast
+        password_hash = generate_password_hash(PASSWORD)
+        now = datetime.utcnow()
+        leaders = users[users['role'] == 'leader']
+        members = users[users['role'] == 'offline']
+
+        connection = db.session.connection()
+        c = User.__table__.c
+        columns = [c.username, c.password_hash, c.role, c.leader_id, c.can_view_funds, c.preferred_nav,
+                   c.auth_version, c.account_status, c.created_at, c.updated_at]
+        bulk_insert(connection, User.__table__, columns,
+                    [(name, password_hash, 'leader', None, funds == 'Yes', 'sidebar', 1, 'active', now, now)
+                     for name, funds in zip(leaders['username'], leaders['can_view_funds'])])
+        leader_ids = dict(db.session.query(User.username, User.id).filter(User.role == 'leader'))
+
+        bulk_insert(connection, User.__table__, columns,
+                    [(name, password_hash, 'offline', leader_ids[leader], False, 'sidebar', 1, 'active', now, now)
+                     for name, leader in zip(members['username'], members['leader_username'])])
+        member_ids = pd.Series(dict(db.session.query(User.username, User.id).filter(User.role == 'offline')))
+
+        user_ids = member_ids.reindex(performance['offline_username']).to_numpy()
+        period_keys = performance['period'].str.replace('-', '').astype('int64') # 2024-05 -> 202405
+        p = PerformanceData.__table__.c
+        bulk_insert(connection, PerformanceData.__table__, [p.offline_user_id, p.period, p.metric_value, p.recorded_at],
+                    list(zip(user_ids.tolist(), period_keys.tolist(),
+                             performance['sales_amount'].tolist(), [now] * len(performance))))
+
+        rollups.rebuild()
+        hierarchy.rebuild()
+        db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=1.0, help='1 = 10 leaders, 1,000 offline users')
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--end-period', default=date.today().strftime('%Y-%m'), help='Last period, YYYY-MM')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--prefix', default='', help='Prepended to every username')
+    parser.add_argument('--format', choices=['csv', 'parquet', 'xlsx', 'db'], default='xlsx')
+    parser.add_argument('--output', default='.', help='Directory for file formats')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    users, performance = generate(args.scale, args.months, args.end_period, args.seed, args.prefix)
+    generated = time.perf_counter() - started
+    print(f'Generated {len(users)} users and {len(performance)} performance rows in {generated:.2f}s')
+
+    started = time.perf_counter()
+    if args.format == 'db':
+        load_database(users, performance)
+        print(f'Loaded into the database in {time.perf_counter() - started:.2f}s')
+    else:
+        paths = write_files(users, performance, args.format, args.output)
+        print(f"Wrote {', '.join(paths)} in {time.perf_counter() - started:.2f}s")
+
+if __name__ == '__main__':
+    main()
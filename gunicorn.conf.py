@@ -0,0 +1,90 @@
+# Production server settings: gunicorn -c gunicorn.conf.py run:app
+#
+# WEB_WORKER_CLASS picks the worker model:
+#   sync     one request at a time per worker process
+#   gthread  WEB_THREADS requests at a time per process (default)
+#   gevent   many cooperative requests per process; needs the optional
+#            gevent package (and psycogreen with PostgreSQL)
+import multiprocessing
+import os
+
+worker_class = os.environ.get('WEB_WORKER_CLASS', 'gthread')
+if worker_class not in ('sync', 'gthread', 'gevent'):
+    raise RuntimeError(f"WEB_WORKER_CLASS must be sync, gthread or gevent, not '{worker_class}'")
+
+if worker_class == 'gevent':
+    try:
+        from gevent import monkey
+    except ImportError:
+        raise RuntimeError('WEB_WORKER_CLASS=gevent needs the gevent package: pip install gevent')
+    # Patch before the app is preloaded so its locks and sockets are cooperative too
+    monkey.patch_all()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+cpus = multiprocessing.cpu_count()
+default_workers = cpus * 2 + 1 if worker_class == 'sync' else cpus + 1
+workers = int(os.environ.get('WEB_CONCURRENCY', default_workers))
+# The app reads this to pick a cache shared by the workers (see CACHE_BACKEND)
+os.environ['WEB_CONCURRENCY'] = str(workers)
+threads = int(os.environ.get('WEB_THREADS', 4)) if worker_class == 'gthread' else 1
+worker_connections = int(os.environ.get('WEB_WORKER_CONNECTIONS', 100)) # gevent only
+
+# Load the app once in the master so workers share its memory copy-on-write,
+# and startup work (BOOTSTRAP_ON_START) runs once instead of once per worker
+preload_app = os.environ.get('WEB_PRELOAD', '1') == '1'
+
+# Recycle workers now and then so slow leaks can't build up; the jitter keeps
+# them from all restarting at the same moment
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 100))
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30)) # Time to finish in-flight requests on restart
+keepalive = int(os.environ.get('WEB_KEEPALIVE', 5))
+
+accesslog = os.environ.get('WEB_ACCESS_LOG') # e.g. '-' for stdout; off by default
+errorlog = '-'
+
+def preloaded_app(server):
+    """The Flask app when it was preloaded in the master, else None."""
+    return server.app.wsgi() if server.cfg.preload_app else None
+
+def on_starting(server):
+    app = preloaded_app(server)
+    if app is None or not app.config['METRICS_ENABLED']:
+        return
+    # Files left by the previous master would be merged into the new totals
+    directory = app.config['METRICS_DIR']
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            os.remove(os.path.join(directory, name))
+
+def child_exit(server, worker):
+    # Fold the exited worker's metrics file into the archive so recycled
+    # workers (max_requests) don't leave a file each behind
+    app = preloaded_app(server)
+    if app is not None:
+        directory = app.config['METRICS_DIR'] if app.config['METRICS_ENABLED'] else None
+    else:
+        directory = os.environ.get('METRICS_DIR')
+    if directory:
+        from app.metrics import mark_process_dead
+        mark_process_dead(directory, worker.pid)
+
+def post_fork(server, worker):
+    app = preloaded_app(server)
+    if app is None:
+        return
+    from app import jobs, passwords
+    from app.models import db
+    with app.app_context():
+        # Connections opened in the master must not be shared between workers
+        db.engine.dispose(close=False)
+    jobs.init_app(app) # Executor threads do not survive the fork
+    passwords.init_app(app)
+
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            pass # Only needed with PostgreSQL
@@ -0,0 +1,35 @@
+"""add import_jobs.dry_run
+
+Revision ID: 0b6d2e8f4c37
+Revises: f4a07b3d9e12
+Create Date: 2026-10-18 18:11:52.630174
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b6d2e8f4c37'
+down_revision = 'f4a07b3d9e12'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    inspector = sa.inspect(op.get_bind())
+    return inspector.has_table(table) and column in [c['name'] for c in inspector.get_columns(table)]
+
+
+def upgrade():
+    # Fresh databases get the column from `flask bootstrap` (db.create_all)
+    if not sa.inspect(op.get_bind()).has_table('import_jobs') or _has_column('import_jobs', 'dry_run'):
+        return
+    with op.batch_alter_table('import_jobs') as batch_op:
+        batch_op.add_column(sa.Column('dry_run', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    if _has_column('import_jobs', 'dry_run'):
+        with op.batch_alter_table('import_jobs') as batch_op:
+            batch_op.drop_column('dry_run')
@@ -0,0 +1,35 @@
+"""index import_jobs on (kind, id)
+
+Revision ID: 3d8b5f1a6c92
+Revises: 5c1e9a7d3b20
+Create Date: 2026-10-19 10:02:47.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d8b5f1a6c92'
+down_revision = '5c1e9a7d3b20'
+branch_labels = None
+depends_on = None
+
+
+def _index_names(table):
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return None
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    # Databases made by `flask bootstrap` after the model gained the index already have it
+    existing = _index_names('import_jobs')
+    if existing is not None and 'ix_import_jobs_kind_id' not in existing:
+        op.create_index('ix_import_jobs_kind_id', 'import_jobs', ['kind', 'id'])
+
+
+def downgrade():
+    if 'ix_import_jobs_kind_id' in (_index_names('import_jobs') or ()):
+        op.drop_index('ix_import_jobs_kind_id', table_name='import_jobs')
@@ -0,0 +1,40 @@
+"""add user_sessions table for server-side sessions
+
+Revision ID: 5c1e9a7d3b20
+Revises: 0b6d2e8f4c37
+Create Date: 2026-10-18 19:02:18.204551
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e9a7d3b20'
+down_revision = '0b6d2e8f4c37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    # Fresh databases get the table from `flask bootstrap` (db.create_all)
+    if not inspector.has_table('users') or inspector.has_table('user_sessions'):
+        return
+    op.create_table(
+        'user_sessions',
+        sa.Column('id', sa.String(64), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=True),
+        sa.Column('data', sa.Text(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_user_sessions_user_id', 'user_sessions', ['user_id'])
+    op.create_index('ix_user_sessions_expires_at', 'user_sessions', ['expires_at'])
+
+
+def downgrade():
+    if sa.inspect(op.get_bind()).has_table('user_sessions'):
+        op.drop_index('ix_user_sessions_expires_at', table_name='user_sessions')
+        op.drop_index('ix_user_sessions_user_id', table_name='user_sessions')
+        op.drop_table('user_sessions')
@@ -0,0 +1,83 @@
+"""create and backfill the dashboard rollup tables
+
+Revision ID: 7e2c4a9b5d18
+Revises: 3d8b5f1a6c92
+Create Date: 2026-10-19 10:41:26.907154
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e2c4a9b5d18'
+down_revision = '3d8b5f1a6c92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('performance_data'):
+        return # Fresh databases get the tables from `flask bootstrap` (db.create_all)
+    if not inspector.has_table('rollup_company_period'):
+        op.create_table(
+            'rollup_company_period',
+            sa.Column('period', sa.Integer(), primary_key=True),
+            sa.Column('total', sa.Numeric(18, 2), nullable=False),
+            sa.Column('row_count', sa.Integer(), nullable=False),
+            sa.Column('offline_total', sa.Numeric(18, 2), nullable=False),
+            sa.Column('offline_row_count', sa.Integer(), nullable=False),
+        )
+    if not inspector.has_table('rollup_leader_period'):
+        op.create_table(
+            'rollup_leader_period',
+            sa.Column('leader_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+            sa.Column('period', sa.Integer(), primary_key=True),
+            sa.Column('total', sa.Numeric(18, 2), nullable=False),
+            sa.Column('row_count', sa.Integer(), nullable=False),
+        )
+    if not inspector.has_table('rollup_member_total'):
+        op.create_table(
+            'rollup_member_total',
+            sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+            sa.Column('total', sa.Numeric(18, 2), nullable=False),
+            sa.Column('row_count', sa.Integer(), nullable=False),
+        )
+
+    # Backfill from performance_data; same queries as app.rollups.rebuild()
+    op.execute('DELETE FROM rollup_company_period')
+    op.execute("""
+        INSERT INTO rollup_company_period (period, total, row_count, offline_total, offline_row_count)
+        SELECT performance_data.period,
+               SUM(performance_data.metric_value),
+               COUNT(performance_data.id),
+               COALESCE(SUM(CASE WHEN users.role = 'offline' THEN performance_data.metric_value ELSE 0 END), 0),
+               COUNT(CASE WHEN users.role = 'offline' THEN performance_data.id END)
+        FROM performance_data LEFT OUTER JOIN users ON users.id = performance_data.offline_user_id
+        GROUP BY performance_data.period
+    """)
+    op.execute('DELETE FROM rollup_leader_period')
+    op.execute("""
+        INSERT INTO rollup_leader_period (leader_id, period, total, row_count)
+        SELECT users.leader_id, performance_data.period, SUM(performance_data.metric_value), COUNT(performance_data.id)
+        FROM performance_data JOIN users ON users.id = performance_data.offline_user_id
+        WHERE users.leader_id IS NOT NULL
+        GROUP BY users.leader_id, performance_data.period
+    """)
+    op.execute('DELETE FROM rollup_member_total')
+    op.execute("""
+        INSERT INTO rollup_member_total (user_id, total, row_count)
+        SELECT offline_user_id, SUM(metric_value), COUNT(id)
+        FROM performance_data
+        GROUP BY offline_user_id
+    """)
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in ('rollup_company_period', 'rollup_leader_period', 'rollup_member_total'):
+            op.execute(f'ANALYZE {table}')
+
+
+def downgrade():
+    # The rollups are derived data that databases may also have from
+    # `flask bootstrap`; they are left in place (`flask rebuild-rollups`)
+    pass
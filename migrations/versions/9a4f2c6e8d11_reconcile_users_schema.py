@@ -0,0 +1,84 @@
+"""rename users columns and roles to the names the application uses
+
+Revision ID: 9a4f2c6e8d11
+Revises: 
+Create Date: 2026-10-18 00:12:41.207316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4f2c6e8d11'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+OLD_ROLES = {'system_administrator': 'admin', 'team_leader': 'leader', 'team_member': 'offline'}
+
+
+def _has_column(table, column):
+    inspector = sa.inspect(op.get_bind())
+    return inspector.has_table(table) and column in [c['name'] for c in inspector.get_columns(table)]
+
+
+def _check_names(table):
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_check_constraints(table)}
+
+
+def _restore_username_unique():
+    # Rebuilding the table on SQLite can drop an unnamed UNIQUE; put it back
+    inspector = sa.inspect(op.get_bind())
+    unique = any(c['column_names'] == ['username'] for c in inspector.get_unique_constraints('users')) or \
+        any(i['unique'] and i['column_names'] == ['username'] for i in inspector.get_indexes('users'))
+    if not unique:
+        op.create_index('uq_users_username', 'users', ['username'], unique=True)
+
+
+def _set_roles(mapping):
+    cases = ' '.join(f"WHEN '{old}' THEN '{new}'" for old, new in mapping.items())
+    op.execute(f'UPDATE users SET role = CASE role {cases} ELSE role END')
+
+
+def upgrade():
+    # Only a users table left by the original schema needs this; fresh
+    # databases get the current names from db.create_all()
+    if not _has_column('users', 'preferred_navigation'):
+        return
+    checks = _check_names('users')
+    with op.batch_alter_table('users') as batch_op:
+        for name in ('check_role', 'check_preferred_navigation'):
+            if name in checks:
+                batch_op.drop_constraint(name, type_='check')
+        batch_op.alter_column('preferred_navigation', new_column_name='preferred_nav',
+                              existing_type=sa.String(10), existing_nullable=False)
+        if _has_column('users', 'can_view_financials'):
+            batch_op.alter_column('can_view_financials', new_column_name='can_view_funds',
+                                  existing_type=sa.Boolean(), existing_nullable=False)
+    _set_roles(OLD_ROLES)
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.create_check_constraint('check_role', sa.column('role').in_(['admin', 'leader', 'offline']))
+        batch_op.create_check_constraint('check_preferred_nav', sa.column('preferred_nav').in_(['sidebar', 'navbar']))
+    _restore_username_unique()
+
+
+def downgrade():
+    if not _has_column('users', 'preferred_nav'):
+        return
+    checks = _check_names('users')
+    with op.batch_alter_table('users') as batch_op:
+        for name in ('check_role', 'check_preferred_nav'):
+            if name in checks:
+                batch_op.drop_constraint(name, type_='check')
+        batch_op.alter_column('preferred_nav', new_column_name='preferred_navigation',
+                              existing_type=sa.String(10), existing_nullable=False)
+        batch_op.alter_column('can_view_funds', new_column_name='can_view_financials',
+                              existing_type=sa.Boolean(), existing_nullable=False)
+    _set_roles({new: old for old, new in OLD_ROLES.items()})
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.create_check_constraint(
+            'check_role', sa.column('role').in_(['system_administrator', 'team_leader', 'team_member']))
+        batch_op.create_check_constraint(
+            'check_preferred_navigation', sa.column('preferred_navigation').in_(['sidebar', 'navbar']))
+    _restore_username_unique()
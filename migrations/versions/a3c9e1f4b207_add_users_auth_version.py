@@ -0,0 +1,35 @@
+"""add users.auth_version
+
+Revision ID: a3c9e1f4b207
+Revises: 9a4f2c6e8d11
+Create Date: 2026-10-18 09:12:44.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c9e1f4b207'
+down_revision = '9a4f2c6e8d11'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    inspector = sa.inspect(op.get_bind())
+    return inspector.has_table(table) and column in [c['name'] for c in inspector.get_columns(table)]
+
+
+def upgrade():
+    # Fresh databases get the column from `flask bootstrap` (db.create_all)
+    if not sa.inspect(op.get_bind()).has_table('users') or _has_column('users', 'auth_version'):
+        return
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('auth_version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    if _has_column('users', 'auth_version'):
+        with op.batch_alter_table('users') as batch_op:
+            batch_op.drop_column('auth_version')
@@ -0,0 +1,52 @@
+"""add indexes for username, team and performance lookups
+
+Revision ID: c51e7d2a9f38
+Revises: a3c9e1f4b207
+Create Date: 2026-10-18 11:40:02.905117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c51e7d2a9f38'
+down_revision = 'a3c9e1f4b207'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_users_username_lower', 'users', [sa.text('lower(username)')]),
+    ('ix_users_leader_id_role', 'users', ['leader_id', 'role']),
+    ('ix_users_role_username', 'users', ['role', 'username']),
+    ('ix_performance_data_user_period_value', 'performance_data', ['offline_user_id', 'period', 'metric_value']),
+]
+
+
+def _existing_indexes(table):
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return None
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    # Tables created by `flask bootstrap` already carry these indexes
+    indexed_tables = set()
+    for name, table, columns in INDEXES:
+        existing = _existing_indexes(table)
+        if existing is None or name in existing:
+            continue
+        op.create_index(name, table, columns)
+        indexed_tables.add(table)
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in sorted(indexed_tables):
+            op.execute(f'ANALYZE {table}')
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        existing = _existing_indexes(table)
+        if existing and name in existing:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,51 @@
+"""add user_hierarchy closure table
+
+Revision ID: d7f3a91c2b64
+Revises: c51e7d2a9f38
+Create Date: 2026-10-18 15:02:37.441920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7f3a91c2b64'
+down_revision = 'c51e7d2a9f38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('users'):
+        return # Fresh databases get the table from `flask bootstrap` (db.create_all)
+    if not inspector.has_table('user_hierarchy'):
+        op.create_table(
+            'user_hierarchy',
+            sa.Column('ancestor_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column('descendant_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+            sa.Column('depth', sa.Integer(), nullable=False),
+        )
+        op.create_index('ix_user_hierarchy_descendant_depth', 'user_hierarchy', ['descendant_id', 'depth'])
+
+    # Backfill from users.leader_id; same query as app.hierarchy.rebuild()
+    op.execute('DELETE FROM user_hierarchy')
+    op.execute("""
+        INSERT INTO user_hierarchy (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM users
+            UNION ALL
+            SELECT tree.ancestor_id, users.id, tree.depth + 1
+            FROM tree JOIN users ON users.leader_id = tree.descendant_id AND tree.depth < 32
+        )
+        SELECT ancestor_id, descendant_id, depth FROM tree
+    """)
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('ANALYZE user_hierarchy')
+
+
+def downgrade():
+    if sa.inspect(op.get_bind()).has_table('user_hierarchy'):
+        op.drop_index('ix_user_hierarchy_descendant_depth', table_name='user_hierarchy')
+        op.drop_table('user_hierarchy')
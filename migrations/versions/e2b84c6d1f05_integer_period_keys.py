@@ -0,0 +1,61 @@
+"""store periods as integer keys (year * 100 + month)
+
+Revision ID: e2b84c6d1f05
+Revises: d7f3a91c2b64
+Create Date: 2026-10-18 16:21:09.583114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b84c6d1f05'
+down_revision = 'd7f3a91c2b64'
+branch_labels = None
+depends_on = None
+
+
+TABLES = ['performance_data', 'rollup_company_period', 'rollup_leader_period']
+
+
+def _period_type(inspector, table):
+    for column in inspector.get_columns(table):
+        if column['name'] == 'period':
+            return column['type']
+    return None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        if not inspector.has_table(table) or isinstance(_period_type(inspector, table), sa.Integer):
+            continue # Fresh databases get integer periods from `flask bootstrap` (db.create_all)
+        # '2024-05' -> '202405' first, so the type change is a plain cast on every backend
+        op.execute(f"UPDATE {table} SET period = REPLACE(period, '-', '')")
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('period', type_=sa.Integer(), existing_type=sa.String(7),
+                                  existing_nullable=False, postgresql_using='period::integer')
+
+    if inspector.has_table('performance_data'):
+        existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('performance_data')}
+        if 'ix_performance_data_period' not in existing:
+            op.create_index('ix_performance_data_period', 'performance_data', ['period', 'offline_user_id'])
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in TABLES:
+            op.execute(f'ANALYZE {table}')
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table('performance_data'):
+        existing = {index['name'] for index in inspector.get_indexes('performance_data')}
+        if 'ix_performance_data_period' in existing:
+            op.drop_index('ix_performance_data_period', table_name='performance_data')
+    for table in TABLES:
+        if not inspector.has_table(table) or not isinstance(_period_type(inspector, table), sa.Integer):
+            continue
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('period', type_=sa.String(7), existing_type=sa.Integer(),
+                                  existing_nullable=False, postgresql_using='period::text')
+        op.execute(f"UPDATE {table} SET period = SUBSTR(period, 1, 4) || '-' || SUBSTR(period, 5, 2)")
@@ -0,0 +1,37 @@
+"""add import_jobs.content_hash and unchanged_count
+
+Revision ID: f4a07b3d9e12
+Revises: e2b84c6d1f05
+Create Date: 2026-10-18 17:05:31.902417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4a07b3d9e12'
+down_revision = 'e2b84c6d1f05'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    inspector = sa.inspect(op.get_bind())
+    return inspector.has_table(table) and column in [c['name'] for c in inspector.get_columns(table)]
+
+
+def upgrade():
+    # Fresh databases get the columns from `flask bootstrap` (db.create_all)
+    if not sa.inspect(op.get_bind()).has_table('import_jobs') or _has_column('import_jobs', 'content_hash'):
+        return
+    with op.batch_alter_table('import_jobs') as batch_op:
+        batch_op.add_column(sa.Column('unchanged_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('content_hash', sa.String(64), nullable=True))
+
+
+def downgrade():
+    if _has_column('import_jobs', 'content_hash'):
+        with op.batch_alter_table('import_jobs') as batch_op:
+            batch_op.drop_column('content_hash')
+            batch_op.drop_column('unchanged_count')
@@ -1,3 +1,4 @@
+import os
 from app import create_app
 from app.models import db, User, CompanySetting
 from werkzeug.security import generate_password_hash
@@ -43,6 +44,5 @@ def reset_db_command(seed):
         db.session.rollback()
 
 if __name__ == '__main__':
-    # Note: For Render deployment, Gunicorn will be used instead of this dev server.
-    # Debug mode should be False in production.
-    app.run(debug=True, host='0.0.0.0', port=5000) # Use 0.0.0.0 to be accessible on network
+    # Development server only; production runs gunicorn -c gunicorn.conf.py run:app
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000) # Use 0.0.0.0 to be accessible on network
@@ -0,0 +1,27 @@
+import pytest
+from app import create_app
+
+@pytest.fixture
+def app(tmp_path):
+    """A bootstrapped app on a throwaway SQLite file, with everything it writes kept under ``tmp_path``."""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+        'BOOTSTRAP_ON_START': True,
+        'CACHE_BACKEND': 'lru',
+        'IMPORT_JOBS_INLINE': True,
+        'WTF_CSRF_ENABLED': False,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'METRICS_DIR': str(tmp_path / 'metrics'),
+        'CACHE_DIR': str(tmp_path / 'cache'),
+        'IMPORT_UPLOAD_FOLDER': str(tmp_path / 'imports'),
+        'IMPORT_REPORT_FOLDER': str(tmp_path / 'import_reports'),
+    })
+    yield app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def login(client, username='admin', password='admin123'):
+    return client.post('/auth/login', data={'username': username, 'password': password})
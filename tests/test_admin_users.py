@@ -0,0 +1,14 @@
+from .conftest import login
+
+NOT_FOUND = b"Leader with username &#39;nobody&#39; not found."
+
+def test_user_list_flash_is_shown_once(client):
+    login(client)
+    assert NOT_FOUND in client.get('/admin/users?leader=nobody').data
+    assert NOT_FOUND not in client.get('/admin/users').data
+
+def test_user_list_cursor_without_role_is_rejected(client):
+    login(client)
+    assert client.get('/admin/users?after=admin').status_code == 400
+    assert client.get('/admin/users?role=admin&after=a').status_code == 200
+    assert client.get('/admin/users?after_role=admin&after=a').status_code == 200
@@ -0,0 +1,64 @@
+import gzip
+import json
+from benchmarks.common import seed, login as login_as
+from .conftest import login
+
+def test_json_is_revalidated_with_its_etag(app, client):
+    seed(app, leaders=1, members_per_leader=2, months=3)
+    login(client)
+    response = client.get('/api/admin/series')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    assert len(response.get_json()['values']) == 3
+    etag = response.headers['ETag']
+    assert not etag.startswith('W/')
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+    unchanged = client.get('/api/admin/series', headers={'If-None-Match': etag})
+    assert unchanged.status_code == 304
+    assert unchanged.data == b''
+    assert unchanged.headers['ETag'] == etag
+
+def test_etag_changes_when_the_data_does(app, client):
+    seed(app, leaders=1, members_per_leader=1, months=1)
+    login(client)
+    before = client.get('/api/admin/totals')
+    client.post('/admin/settings/funds', data={'total_funds': '77'})
+    after = client.get('/api/admin/totals', headers={'If-None-Match': before.headers['ETag']})
+    assert after.status_code == 200
+    assert after.get_json()['total_funds'] == '77'
+    assert after.headers['ETag'] != before.headers['ETag']
+
+def test_gzip_is_its_own_representation(app, client):
+    seed(app, leaders=1, members_per_leader=2, months=3)
+    login(client)
+    plain = client.get('/api/admin/totals')
+    zipped = client.get('/api/admin/totals', headers={'Accept-Encoding': 'gzip'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in zipped.headers['Vary']
+    assert json.loads(gzip.decompress(zipped.data)) == plain.get_json()
+    assert zipped.headers['ETag'] != plain.headers['ETag']
+
+    # The plain ETag does not validate the gzipped body, and vice versa
+    assert client.get('/api/admin/totals', headers={'Accept-Encoding': 'gzip',
+                                                    'If-None-Match': plain.headers['ETag']}).status_code == 200
+    assert client.get('/api/admin/totals', headers={'Accept-Encoding': 'gzip',
+                                                    'If-None-Match': zipped.headers['ETag']}).status_code == 304
+
+def test_leader_totals_only_show_funds_to_leaders_allowed_to_see_them(app):
+    seed(app, leaders=2, members_per_leader=1, months=1) # leader_0 may view funds, leader_1 may not
+    admin = app.test_client()
+    login(admin)
+    admin.post('/admin/settings/funds', data={'total_funds': '500'})
+
+    for username, funds in (('leader_0', '500'), ('leader_1', None)):
+        client = app.test_client()
+        login_as(client, username)
+        totals = client.get('/api/leader/totals').get_json()
+        assert totals['company_funds'] == funds
+        assert totals['offline_user_count'] == 1
+
+def test_malformed_range_is_rejected(client):
+    login(client)
+    assert client.get('/api/admin/series?from=2024-13').status_code == 400
+    assert client.get('/api/admin/series?from=2024-05&to=2024-01').status_code == 400
@@ -0,0 +1,69 @@
+from sqlalchemy import event
+from app import create_app
+from app.models import db, User
+from app.passwords import hash_password
+from .conftest import login
+
+def add_leader(app):
+    with app.app_context():
+        leader = User(username='lead', password_hash=hash_password('pw'), role='leader', can_view_funds=False)
+        db.session.add(leader)
+        db.session.commit()
+        return leader.id
+
+def grant_funds_elsewhere(app, leader_id):
+    with app.app_context():
+        # What the admin edit route does, but without this worker's cache hearing about it
+        user = db.session.get(User, leader_id)
+        user.can_view_funds = True
+        user.auth_version += 1
+        db.session.commit()
+
+def user_queries(app, client, path):
+    statements = []
+    with app.app_context():
+        engine = db.engine
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        client.get(path)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    return [statement for statement in statements if 'FROM users' in statement]
+
+def test_single_worker_checks_sessions_without_a_query(app, client):
+    assert app.extensions['aggregate_cache'].backend.name == 'lru'
+    login(client)
+    client.get('/admin/cache/stats') # Loads the admin once and publishes their version
+    assert user_queries(app, client, '/admin/cache/stats') == []
+
+def test_single_worker_picks_up_admin_edits(app, client):
+    leader_id = add_leader(app)
+    login(client, 'lead', 'pw')
+    assert client.get('/leader/dashboard').status_code == 200
+
+    admin = app.test_client()
+    login(admin)
+    admin.post(f'/admin/users/{leader_id}/edit', data={'username': 'lead', 'role': 'leader',
+                                                      'leader_username': '', 'can_view_funds': 'y'})
+    client.get('/leader/dashboard')
+    with client.session_transaction() as session:
+        assert session['user_can_view_funds'] is True
+        assert session['auth_version'] == 2
+
+def test_edit_made_elsewhere_reaches_the_session(app):
+    """With a per-worker lru cache in one of several workers, an edit made through another worker must still be picked up."""
+    worker = create_app(dict(app.config, WEB_CONCURRENCY=2))
+    assert worker.extensions['aggregate_cache'].backend.name == 'lru'
+    leader_id = add_leader(worker)
+    client = worker.test_client()
+    login(client, 'lead', 'pw')
+    assert client.get('/leader/dashboard').status_code == 200
+
+    grant_funds_elsewhere(worker, leader_id)
+    client.get('/leader/dashboard')
+    with client.session_transaction() as session:
+        assert session['user_can_view_funds'] is True
+        assert session['auth_version'] == 2
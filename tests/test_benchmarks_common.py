@@ -0,0 +1,23 @@
+import pytest
+from sqlalchemy import inspect
+from app.models import db, User
+from benchmarks.common import seed, reset_database
+
+def test_seed_stores_can_view_funds(app):
+    seed(app, leaders=3, members_per_leader=2, months=2)
+    with app.app_context():
+        flags = [flag for flag, in User.query.filter_by(role='leader').order_by(User.id).with_entities(User.can_view_funds)]
+        assert flags == [True, False, True]
+        assert User.query.filter_by(role='offline').count() == 6
+
+def test_reset_database_refuses_a_database_with_tables(app):
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    with pytest.raises(SystemExit):
+        reset_database(uri)
+    with app.app_context():
+        assert User.query.filter_by(username='admin').count() == 1
+
+    reset_database(uri, drop=True)
+    with app.app_context():
+        db.engine.dispose()
+        assert inspect(db.engine).get_table_names() == []
@@ -0,0 +1,35 @@
+from sqlalchemy import inspect
+from app.models import db, User
+from app import create_app
+from app.bootstrap import bootstrap_database
+from .conftest import login
+
+def test_bootstrap_creates_schema_and_admin(app):
+    with app.app_context():
+        tables = set(inspect(db.engine).get_table_names())
+        assert {'users', 'financial_accounts', 'performance_metrics', 'performance_data'} <= tables
+        admin = User.query.filter_by(username='admin').one()
+        assert admin.role == 'admin'
+        assert admin.preferred_nav == 'sidebar'
+
+def test_bootstrap_is_repeatable(app):
+    bootstrap_database(app)
+    with app.app_context():
+        assert User.query.filter_by(username='admin').count() == 1
+
+def test_admin_can_sign_in(client):
+    response = login(client)
+    assert response.status_code == 302
+    assert client.get('/admin/dashboard').status_code == 200
+    assert client.get('/admin/users').status_code == 200
+
+def test_cache_backend_follows_worker_count(tmp_path, monkeypatch):
+    config = {'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'CACHE_DIR': str(tmp_path / 'cache'),
+              'METRICS_DIR': str(tmp_path / 'metrics')}
+    monkeypatch.delenv('CACHE_BACKEND', raising=False)
+    monkeypatch.setenv('WEB_CONCURRENCY', '1')
+    assert create_app(config).extensions['aggregate_cache'].backend.name == 'lru'
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    assert create_app(config).extensions['aggregate_cache'].backend.name == 'filesystem'
+    monkeypatch.setenv('CACHE_BACKEND', 'lru')
+    assert create_app(config).extensions['aggregate_cache'].backend.name == 'lru'
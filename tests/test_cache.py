@@ -0,0 +1,65 @@
+import io
+import multiprocessing
+from app import create_app, rollups
+from app.cache import get_cache, FileSystemBackend, VERSION_KEY
+from benchmarks.common import seed
+from .conftest import login
+
+def bump_many(directory, times):
+    backend = FileSystemBackend(directory)
+    for _ in range(times):
+        backend.incr(VERSION_KEY)
+
+def admin_dashboard(client):
+    response = client.get('/admin/dashboard')
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+def test_dashboard_is_recomputed_after_each_kind_of_write(app, client):
+    seed(app, leaders=1, members_per_leader=1, months=1)
+    login(client)
+    admin_dashboard(client)
+    with app.app_context():
+        hits = get_cache().hits
+    assert 'Total Offline Users: <strong>1</strong>' in admin_dashboard(client)
+    with app.app_context():
+        assert get_cache().hits == hits + 1 # Served from the cache until something changes
+
+    client.post('/admin/settings/funds', data={'total_funds': '4242.42'})
+    assert 'Total Company Funds: <strong>4242.42</strong>' in admin_dashboard(client)
+
+    client.post('/admin/users/create', data={'username': 'new_member', 'password': 'pw', 'role': 'offline',
+                                             'leader_username': 'leader_0'})
+    assert 'Total Offline Users: <strong>2</strong>' in admin_dashboard(client)
+
+    csv = b'offline_username,period,sales_amount\nnew_member,2030-01,1000000\n'
+    client.post('/admin/performance/import', data={'perf_file': (io.BytesIO(csv), 'perf.csv')},
+                content_type='multipart/form-data')
+    with app.app_context():
+        total = round(rollups.company_total(), 2)
+    assert f'<strong>{total}</strong>' in admin_dashboard(client)
+
+def test_workers_sharing_the_filesystem_cache_see_each_others_writes(app, tmp_path):
+    seed(app, leaders=1, members_per_leader=1, months=1)
+    # A second worker on the same database and cache directory
+    config = dict(app.config, CACHE_BACKEND='filesystem')
+    first, second = create_app(config), create_app(config)
+    first_client, second_client = first.test_client(), second.test_client()
+    login(first_client)
+    login(second_client)
+
+    assert 'Total Company Funds: <strong>N/A</strong>' in admin_dashboard(first_client)
+    second_client.post('/admin/settings/funds', data={'total_funds': '99.50'})
+    assert 'Total Company Funds: <strong>99.50</strong>' in admin_dashboard(first_client)
+
+def test_concurrent_bumps_from_several_processes_are_all_counted(tmp_path):
+    directory = str(tmp_path / 'cache')
+    context = multiprocessing.get_context('fork') # Separate processes, like gunicorn workers
+    workers = [context.Process(target=bump_many, args=(directory, 50)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    backend = FileSystemBackend(directory)
+    assert backend.get(VERSION_KEY) == 200
+    assert backend.size() == 1 # The lock file is not an entry
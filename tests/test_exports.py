@@ -0,0 +1,78 @@
+import csv
+import io
+from decimal import Decimal
+import openpyxl
+from app import exports
+from app.models import User, PerformanceData
+from app.periods import format_period
+from benchmarks.common import seed, login as login_as
+from .conftest import login
+
+def expected_rows(app, start=None, end=None, usernames=None):
+    with app.app_context():
+        users = {user.id: user for user in User.query}
+        rows = []
+        for row in PerformanceData.query.order_by(PerformanceData.period, PerformanceData.offline_user_id):
+            member = users[row.offline_user_id]
+            if (start and row.period < start) or (end and row.period > end):
+                continue
+            if usernames is None or member.username in usernames:
+                leader = users[member.leader_id].username if member.leader_id else ''
+                rows.append([member.username, format_period(row.period), Decimal(str(row.metric_value)), leader])
+        return rows
+
+def read_csv(response):
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    return rows[0], [[username, period, Decimal(amount), leader] for username, period, amount, leader in rows[1:]]
+
+def read_xlsx(response):
+    workbook = openpyxl.load_workbook(io.BytesIO(response.data), read_only=True)
+    sheets = [list(sheet.iter_rows(values_only=True)) for sheet in workbook.worksheets]
+    rows = [[username, period, Decimal(str(amount)), leader or '']
+            for sheet in sheets for username, period, amount, leader in sheet[1:]]
+    return workbook.sheetnames, [sheet[0] for sheet in sheets], rows
+
+def test_company_csv_export_in_batches(app, client):
+    seed(app, leaders=2, members_per_leader=3, months=3)
+    app.config['EXPORT_BATCH_SIZE'] = 4 # Several batches
+    login(client)
+    response = client.get('/admin/performance/export?from=2020-02')
+    assert response.mimetype == 'text/csv'
+    assert response.headers['Content-Disposition'] == 'attachment; filename="performance_company_2020-02_to_latest.csv"'
+    header, rows = read_csv(response)
+    assert header == exports.COLUMNS
+    assert rows == expected_rows(app, start=202002)
+    assert len(rows) == 12
+
+def test_company_xlsx_export_opens_and_splits_long_sheets(app, client, monkeypatch):
+    seed(app, leaders=1, members_per_leader=3, months=2)
+    monkeypatch.setattr(exports, 'XLSX_SHEET_ROWS', 4)
+    login(client)
+    response = client.get('/admin/performance/export?format=xlsx')
+    assert response.mimetype == exports.FORMATS['xlsx']
+    names, headers, rows = read_xlsx(response)
+    assert names == ['Performance 1', 'Performance 2']
+    assert headers == [tuple(exports.COLUMNS)] * 2
+    assert rows == expected_rows(app)
+
+def test_leader_export_covers_their_whole_team_only(app):
+    seed(app, leaders=3, members_per_leader=[2, 1, 2], months=2)
+    admin = app.test_client()
+    login(admin)
+    with app.app_context():
+        leader_1 = User.query.filter_by(username='leader_1').one()
+    admin.post(f'/admin/users/{leader_1.id}/edit', data={'username': 'leader_1', 'role': 'leader',
+                                                        'leader_username': 'leader_0'})
+
+    client = app.test_client()
+    login_as(client, 'leader_0')
+    team = {'offline_0', 'offline_1', 'offline_2'} # Their own members and leader_1's
+    _, rows = read_csv(client.get('/leader/performance/export?from=2020-01&to=2020-01'))
+    assert rows == expected_rows(app, 202001, 202001, team)
+    _, _, rows = read_xlsx(client.get('/leader/performance/export?format=xlsx'))
+    assert rows == expected_rows(app, usernames=team)
+
+def test_invalid_export_options_are_refused(client):
+    login(client)
+    assert client.get('/admin/performance/export?format=pdf').status_code == 302
+    assert client.get('/admin/performance/export?from=2020-05&to=2020-01').status_code == 302
@@ -0,0 +1,21 @@
+from sqlalchemy import func
+from app.models import db, User, PerformanceData, MemberTotal, UserHierarchy
+from generate_fake_data import generate, load_database
+
+def test_load_database_at_small_scale(app):
+    users, performance = generate(0.01, 3, '2024-06', seed=1)
+    load_database(users, performance, app)
+
+    with app.app_context():
+        assert User.query.filter_by(role='leader').count() == 1
+        assert User.query.filter_by(role='offline').count() == 10
+        leader = User.query.filter_by(role='leader').one()
+        assert leader.can_view_funds is True # Even-numbered leaders get 'Yes'
+        assert leader.team_members.count() == 10
+        assert PerformanceData.query.count() == len(performance)
+        periods = {period for (period,) in db.session.query(PerformanceData.period).distinct()}
+        assert periods <= {202404, 202405, 202406}
+        # Rollups and the hierarchy were rebuilt from what was loaded
+        stored = db.session.query(func.sum(MemberTotal.total)).scalar()
+        assert round(float(stored), 2) == round(performance['sales_amount'].sum(), 2)
+        assert UserHierarchy.query.filter_by(ancestor_id=leader.id, depth=1).count() == 10
@@ -0,0 +1,46 @@
+from app import hierarchy, rollups
+from app.models import db, User
+from benchmarks.common import seed
+from .conftest import login
+
+def edit(client, user, leader_username):
+    return client.post(f'/admin/users/{user.id}/edit', data={
+        'username': user.username, 'role': user.role, 'leader_username': leader_username,
+    })
+
+def subtree_names(root_id):
+    return {name for name, in db.session.query(User.username).filter(User.id.in_(hierarchy.subtree_ids(root_id, 1)))}
+
+def test_moving_a_leader_brings_their_team_along(app, client):
+    seed(app, leaders=3, members_per_leader=2, months=2)
+    login(client)
+    with app.app_context():
+        regional, team_leader = User.query.filter_by(username='leader_0').one(), User.query.filter_by(username='leader_1').one()
+        team = subtree_names(team_leader.id)
+        assert len(team) == 2
+
+    assert edit(client, team_leader, 'leader_0').status_code == 302
+    with app.app_context():
+        assert hierarchy.verify() == []
+        assert rollups.verify() == []
+        assert subtree_names(regional.id) >= team | {'leader_1'}
+        assert rollups.leader_dashboard(regional.id)['count'] == 4
+
+    # Back to the top level: the old ancestors lose the whole subtree
+    assert edit(client, team_leader, '').status_code == 302
+    with app.app_context():
+        assert hierarchy.verify() == []
+        assert rollups.verify() == []
+        assert subtree_names(regional.id).isdisjoint(team | {'leader_1'})
+
+def test_a_leader_cannot_report_to_their_own_team(app, client):
+    seed(app, leaders=2, members_per_leader=1, months=1)
+    login(client)
+    with app.app_context():
+        first, second = User.query.filter_by(username='leader_0').one(), User.query.filter_by(username='leader_1').one()
+    assert edit(client, second, 'leader_0').status_code == 302
+    response = edit(client, first, 'leader_1')
+    assert response.status_code == 200
+    assert b'cannot be their leader' in response.data
+    with app.app_context():
+        assert hierarchy.verify() == []
@@ -0,0 +1,162 @@
+from decimal import Decimal
+import pandas as pd
+from werkzeug.security import check_password_hash
+from app import hierarchy, rollups
+from app.models import db, User, PerformanceData
+from app.importers import ImportResult, import_users_frame, import_user_batches, import_performance_frame
+from app.importers import users as user_importer
+
+def users_frame(rows):
+    return pd.DataFrame(rows, columns=['username', 'password', 'role', 'leader_username', 'can_view_funds'])
+
+def test_user_import_stores_can_view_funds(app):
+    df = users_frame([
+        ['lead_a', 'pw', 'leader', '', 'true'],
+        ['lead_b', 'pw', 'leader', '', 'false'],
+        ['member_a', 'pw', 'offline', 'lead_a', 'true'],
+    ])
+    with app.app_context():
+        result = import_users_frame(df)
+        assert result.created == 3
+        stored = dict(User.query.with_entities(User.username, User.can_view_funds))
+        assert stored['lead_a'] is True
+        assert stored['lead_b'] is False
+        assert stored['member_a'] is False # Only leaders keep the flag
+        assert User.query.filter_by(username='member_a').one().leader.username == 'lead_a'
+
+def test_user_dry_run_spans_batches_without_writing(app):
+    batches = [
+        users_frame([['lead_a', 'pw', 'leader', '', 'true'],
+                     ['member_a', 'pw', 'offline', 'lead_a', '']]),
+        users_frame([['member_b', 'pw', 'offline', 'lead_a', ''], # Leader from the first batch
+                     ['lead_b', 'pw', 'leader', 'lead_a', ''],
+                     ['MEMBER_A', 'pw', 'offline', 'lead_a', ''], # Duplicate of the first batch
+                     ['member_c', 'pw', 'offline', 'nobody', '']]),
+    ]
+    with app.app_context():
+        before = User.query.count()
+        result = import_user_batches(iter(batches), ImportResult(dry_run=True))
+        assert result.created == 4
+        assert result.skipped == 2
+        assert result.error_counts == {'Username taken': 1, 'Unknown leader': 1}
+        assert User.query.count() == before
+
+def leaders_frame(prefix, count):
+    return users_frame([[f'{prefix}_{i}', f'pw{i}', 'leader', '', ''] for i in range(count)])
+
+def test_hash_pool_starts_only_for_batches_that_need_it(app, monkeypatch):
+    started = []
+
+    class RecordingExecutor:
+        def __init__(self, max_workers, mp_context):
+            started.append(mp_context.get_start_method())
+
+        def map(self, function, items, chunksize=1):
+            return map(function, items)
+
+        def shutdown(self):
+            pass
+
+    monkeypatch.setattr(user_importer, 'ProcessPoolExecutor', RecordingExecutor)
+    app.config['IMPORT_HASH_WORKERS'] = 2
+    big = user_importer.PARALLEL_HASH_THRESHOLD
+    with app.app_context():
+        import_user_batches(iter([leaders_frame('dry', big)]), ImportResult(dry_run=True))
+        import_user_batches(iter([leaders_frame('small', 2), leaders_frame('small_b', 2)]))
+        assert started == []
+
+        result = import_user_batches(iter([leaders_frame('big', big), leaders_frame('big_b', big)]))
+        assert result.created == 2 * big
+        assert started == ['spawn'] # One pool, shared by both batches
+
+def test_hash_pool_hashes_in_spawned_workers(app):
+    app.config['IMPORT_HASH_WORKERS'] = 2
+    with app.app_context():
+        passwords = [f'pw{i}' for i in range(user_importer.PARALLEL_HASH_THRESHOLD)]
+        hashes = user_importer.hash_passwords(passwords)
+        assert all(check_password_hash(password_hash, password) for password_hash, password in zip(hashes, passwords))
+        assert hashes[0].startswith('pbkdf2:sha256:1000$')
+
+def test_user_import_links_leaders_to_leaders(app):
+    df = users_frame([
+        ['member_a', 'pw', 'offline', 'team_a', ''],
+        ['team_a', 'pw', 'leader', 'region', ''], # Its leader comes later in the file
+        ['region', 'pw', 'leader', 'top', ''],
+        ['top', 'pw', 'leader', '', ''],
+        ['loop_a', 'pw', 'leader', 'loop_b', ''],
+        ['loop_b', 'pw', 'leader', 'LOOP_A', ''],
+        ['below_loop', 'pw', 'leader', 'loop_a', ''],
+        ['admin_b', 'pw', 'admin', 'top', ''],
+    ])
+    with app.app_context():
+        result = import_users_frame(df)
+        assert result.created == 5
+        assert result.error_counts == {'Leader cycle': 2, 'Unknown leader': 1}
+        assert result.warnings == ["Leader username is ignored for the admin role."]
+        leaders = {user.username: user.leader.username if user.leader else None
+                   for user in User.query.filter(User.username.in_(['member_a', 'team_a', 'region', 'top', 'admin_b']))}
+        assert leaders == {'member_a': 'team_a', 'team_a': 'region', 'region': 'top', 'top': None, 'admin_b': None}
+        assert hierarchy.verify() == []
+        top = User.query.filter_by(username='top').one()
+        assert hierarchy.is_in_subtree(top.id, User.query.filter_by(username='member_a').one().id)
+
+        # A later file can hang a new leader under an existing one
+        result = import_users_frame(users_frame([['team_b', 'pw', 'leader', 'Region', '']]))
+        assert result.created == 1
+        assert User.query.filter_by(username='team_b').one().leader.username == 'region'
+        assert hierarchy.verify() == []
+
+def performance_frame(rows):
+    return pd.DataFrame(rows, columns=['offline_username', 'period', 'sales_amount'])
+
+def stored_performance():
+    return {(user.username, row.period): row.metric_value
+            for row, user in db.session.query(PerformanceData, User).join(User, User.id == PerformanceData.offline_user_id)}
+
+def add_members(*usernames):
+    import_users_frame(users_frame([['lead_p', 'pw', 'leader', '', '']] +
+                                   [[username, 'pw', 'offline', 'lead_p', ''] for username in usernames]))
+
+def test_performance_upsert_counts_and_rewrites_changed_rows(app):
+    with app.app_context():
+        add_members('member_a', 'member_b')
+        first = import_performance_frame(performance_frame([
+            ['member_a', '2024-01', '100'],
+            ['member_a', '2024-02', '200'],
+            ['member_b', '2024-01', '50'],
+            ['MEMBER_B', '2024-01', '75'], # Same key later in the file: the last value wins
+        ]))
+        db.session.commit()
+        assert (first.created, first.updated, first.unchanged, first.skipped) == (3, 1, 0, 0)
+        assert stored_performance() == {('member_a', 202401): Decimal('100.00'), ('member_a', 202402): Decimal('200.00'),
+                                        ('member_b', 202401): Decimal('75.00')}
+
+        again = import_performance_frame(performance_frame([
+            ['member_a', '2024-01', '100.00'],
+            ['member_a', '2024-02', '250.5'], # Corrected
+            ['member_b', '2024-01', '75'],
+            ['member_b', '2024-02', '10'], # New
+        ]))
+        db.session.commit()
+        assert (again.created, again.updated, again.unchanged, again.skipped) == (1, 1, 2, 0)
+        assert stored_performance()[('member_a', 202402)] == Decimal('250.50')
+        assert stored_performance()[('member_b', 202402)] == Decimal('10.00')
+        assert rollups.verify() == []
+
+def test_performance_rejects_amounts_the_column_cannot_hold(app):
+    with app.app_context():
+        add_members('member_a')
+        result = import_performance_frame(performance_frame([
+            ['member_a', '2024-01', 'inf'],
+            ['member_a', '2024-02', '-Infinity'],
+            ['member_a', '2024-03', '1e30'],
+            ['member_a', '2024-04', '-9999999999999.995'], # Rounds to -10**13
+            ['member_a', '2024-05', '9999999999999.99'],
+        ]))
+        db.session.commit()
+        assert result.created == 1
+        assert result.error_counts == {'Invalid sales_amount': 2, 'Out-of-range sales_amount': 2}
+        errors = pd.concat(result.rejected)['error'].tolist()
+        assert errors[2] == "sales_amount '1e30' is out of range. The largest allowed is 9,999,999,999,999.99."
+        assert stored_performance() == {('member_a', 202405): Decimal('9999999999999.99')}
+        assert rollups.verify() == []
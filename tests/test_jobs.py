@@ -0,0 +1,44 @@
+import io
+from werkzeug.datastructures import FileStorage
+from app.models import db, User, ImportJob, PerformanceData
+from app.jobs import submit_import
+
+CSV = b'offline_username,period,sales_amount\nmember,2024-05,100\n'
+
+def upload(data=CSV):
+    return FileStorage(io.BytesIO(data), filename='performance.csv')
+
+def submit(data=CSV):
+    """Submit and reload the job: inline jobs run in their own app context and session."""
+    job_id = submit_import('performance', upload(data), None).id
+    db.session.expire_all()
+    return db.session.get(ImportJob, job_id)
+
+def add_member():
+    leader = User(username='lead', password_hash='x', role='leader')
+    db.session.add(leader)
+    db.session.flush()
+    db.session.add(User(username='member', password_hash='x', role='offline', leader_id=leader.id))
+    db.session.commit()
+
+def test_identical_upload_after_success_is_skipped(app):
+    with app.test_request_context():
+        add_member()
+        first = submit()
+        assert first.status == 'succeeded' and first.created_count == 1
+        second = submit()
+        assert second.status == 'succeeded'
+        assert second.started_at == second.finished_at # Recorded as finished, never run
+        assert 'identical' in second.result
+
+def test_stuck_running_job_does_not_block_reupload(app):
+    with app.test_request_context():
+        add_member()
+        first = submit()
+        first.status = 'running' # As a worker that died mid-import would leave it
+        db.session.commit()
+        db.session.query(PerformanceData).delete()
+        db.session.commit()
+        second = submit()
+        assert second.created_count == 1
+        assert PerformanceData.query.count() == 1
@@ -0,0 +1,72 @@
+from collections import defaultdict
+from decimal import Decimal
+from app import rollups
+from app.models import db, User, PerformanceData, CompanySetting
+from benchmarks.common import seed
+from .conftest import login
+
+def expected_dashboard(leader_id, top_n=3, start=None, end=None):
+    """The leader dashboard worked out in Python from the raw rows."""
+    users = {user.id: user for user in User.query}
+
+    def under_leader(user):
+        seen = set()
+        while user.leader_id is not None and user.leader_id not in seen:
+            if user.leader_id == leader_id:
+                return True
+            seen.add(user.leader_id)
+            user = users[user.leader_id]
+        return False
+
+    team = {user.id for user in users.values() if user.role == 'offline' and under_leader(user)}
+    series = defaultdict(Decimal)
+    totals = {user_id: Decimal('0.00') for user_id in team}
+    for row in PerformanceData.query:
+        if (start is not None and row.period < start) or (end is not None and row.period > end):
+            continue
+        # The series and total cover every row of anyone below the leader, like the rollups
+        if under_leader(users[row.offline_user_id]):
+            series[row.period] += rollups.to_decimal(row.metric_value)
+        if row.offline_user_id in team:
+            totals[row.offline_user_id] += rollups.to_decimal(row.metric_value)
+    top = sorted(((users[user_id].username, total) for user_id, total in totals.items()),
+                 key=lambda item: (-item[1], item[0]))[:top_n]
+    return {'count': len(team), 'total': sum(series.values(), Decimal('0.00')),
+            'series': sorted(series.items()), 'top': top}
+
+def normalised(dashboard):
+    return {
+        'count': dashboard['count'],
+        'total': rollups.to_decimal(dashboard['total']),
+        'series': [(period, rollups.to_decimal(total)) for period, total in dashboard['series']],
+        'top': [(username, rollups.to_decimal(total)) for username, total in dashboard['top']],
+    }
+
+def test_leader_dashboard_matches_the_raw_rows(app, client):
+    seed(app, leaders=4, members_per_leader=[5, 3, 0, 2], months=4)
+    login(client)
+    with app.app_context():
+        leader_1 = User.query.filter_by(username='leader_1').one()
+    # leader_1 and their team now sit under leader_0
+    client.post(f'/admin/users/{leader_1.id}/edit', data={'username': 'leader_1', 'role': 'leader',
+                                                          'leader_username': 'leader_0'})
+    with app.app_context():
+        db.session.add(CompanySetting(key='total_funds', value='1234.56'))
+        db.session.commit()
+        for leader in User.query.filter_by(role='leader'):
+            dashboard = rollups.leader_dashboard(leader.id)
+            assert normalised(dashboard) == expected_dashboard(leader.id), leader.username
+            assert dashboard['funds'] == '1234.56'
+        regional = User.query.filter_by(username='leader_0').one()
+        assert rollups.leader_dashboard(regional.id)['count'] == 8
+
+def test_leader_dashboard_top_members_break_ties_by_username(app):
+    seed(app, leaders=1, members_per_leader=4, months=1)
+    with app.app_context():
+        PerformanceData.query.update({'metric_value': 10})
+        rollups.rebuild()
+        db.session.commit()
+        leader = User.query.filter_by(username='leader_0').one()
+        dashboard = rollups.leader_dashboard(leader.id, top_n=2)
+        assert [username for username, _ in dashboard['top']] == ['offline_0', 'offline_1']
+        assert normalised(dashboard) == expected_dashboard(leader.id, top_n=2)
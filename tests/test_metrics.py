@@ -0,0 +1,50 @@
+import json
+import os
+from app.metrics import ARCHIVE, collect, mark_process_dead
+
+DEAD_PID = 2 ** 22 + 7 # Above the default pid_max, so never a live process
+
+def write_file(directory, pid, token, entries):
+    with open(os.path.join(directory, f'{pid}.json'), 'w') as f:
+        json.dump({'token': token, 'entries': entries}, f)
+
+def worker_entries(requests, in_flight):
+    return [
+        ['http_requests_total', [['endpoint', 'index'], ['method', 'GET'], ['status', '200']], requests],
+        ['http_request_duration_seconds', [['endpoint', 'index']], [requests] + [0] * 10 + [0.5, requests]],
+        ['http_requests_in_flight', [['endpoint', 'index']], in_flight],
+    ]
+
+REQUESTS = ('http_requests_total', (('endpoint', 'index'), ('method', 'GET'), ('status', '200')))
+DURATION = ('http_request_duration_seconds', (('endpoint', 'index'),))
+IN_FLIGHT = ('http_requests_in_flight', (('endpoint', 'index'),))
+
+def test_dead_worker_is_folded_into_the_archive(app):
+    directory = app.config['METRICS_DIR']
+    write_file(directory, DEAD_PID, 'dead', worker_entries(5, 1))
+    write_file(directory, os.getpid(), 'live', worker_entries(2, 1))
+    before = collect(app)
+
+    mark_process_dead(directory, DEAD_PID)
+    assert not os.path.exists(os.path.join(directory, f'{DEAD_PID}.json'))
+    after = collect(app)
+    assert after[REQUESTS] == before[REQUESTS] == 7
+    assert after[DURATION][-1] == 7
+    assert after[IN_FLIGHT] == 1 # Only the live worker's gauge
+
+    # A second exit folds onto the first
+    write_file(directory, DEAD_PID, 'dead-again', worker_entries(3, 0))
+    mark_process_dead(directory, DEAD_PID)
+    assert collect(app)[REQUESTS] == 10
+
+def test_folded_file_still_on_disk_is_not_counted_twice(app):
+    directory = app.config['METRICS_DIR']
+    write_file(directory, DEAD_PID, 'dead', worker_entries(5, 0))
+    mark_process_dead(directory, DEAD_PID)
+    # As if collect listed the file just before the master removed it
+    write_file(directory, DEAD_PID, 'dead', worker_entries(5, 0))
+    assert collect(app)[REQUESTS] == 5
+    # A new process reusing the pid has its own token and does count
+    write_file(directory, DEAD_PID, 'reused', worker_entries(1, 0))
+    assert collect(app)[REQUESTS] == 6
+    assert os.path.exists(os.path.join(directory, ARCHIVE))
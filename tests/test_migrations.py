@@ -0,0 +1,22 @@
+import os
+from flask_migrate import stamp, upgrade
+from sqlalchemy import inspect, text
+from app import rollups
+from app.models import db, CompanyPeriodTotal, LeaderPeriodTotal, MemberTotal
+from benchmarks.common import seed
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations')
+
+def test_rollup_backfill_matches_rebuild(app):
+    seed(app, leaders=2, members_per_leader=3, months=3)
+    with app.app_context():
+        # As on a database from before the rollups existed
+        for model in (CompanyPeriodTotal, LeaderPeriodTotal, MemberTotal):
+            model.__table__.drop(db.engine)
+        stamp(directory=MIGRATIONS, revision='3d8b5f1a6c92')
+        upgrade(directory=MIGRATIONS, revision='7e2c4a9b5d18')
+
+        assert {'rollup_company_period', 'rollup_leader_period', 'rollup_member_total'} <= \
+            set(inspect(db.engine).get_table_names())
+        assert rollups.verify() == []
+        assert db.session.execute(text('SELECT COUNT(*) FROM rollup_member_total')).scalar() == 6
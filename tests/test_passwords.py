@@ -0,0 +1,62 @@
+import threading
+import time
+import pytest
+from werkzeug.security import generate_password_hash
+from app.models import db, User
+from app.passwords import PasswordHasher, HasherBusy, needs_rehash
+from .conftest import login
+
+def add_user(app, password_hash):
+    with app.app_context():
+        user = User(username='old_hash', password_hash=password_hash, role='offline')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+def stored_hash(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).password_hash
+
+def test_outdated_hash_is_upgraded_at_login(app, client):
+    user_id = add_user(app, generate_password_hash('pw', method='pbkdf2:sha256:500'))
+
+    assert login(client, 'old_hash', 'wrong').status_code == 200
+    assert stored_hash(app, user_id).startswith('pbkdf2:sha256:500$') # Only a correct password upgrades
+
+    assert login(client, 'old_hash', 'pw').status_code == 302
+    upgraded = stored_hash(app, user_id)
+    assert upgraded.startswith('pbkdf2:sha256:1000$')
+
+    client.get('/auth/logout')
+    assert login(client, 'old_hash', 'pw').status_code == 302
+    assert stored_hash(app, user_id) == upgraded # Already current: not hashed again
+
+def test_needs_rehash_knows_the_full_spelling_of_the_method(app):
+    app.config['PASSWORD_HASH_METHOD'] = 'scrypt'
+    with app.app_context():
+        assert not needs_rehash(generate_password_hash('pw', method='scrypt'))
+        assert needs_rehash(generate_password_hash('pw', method='scrypt:16384:8:1'))
+        assert needs_rehash(generate_password_hash('pw', method='pbkdf2:sha256:1000'))
+
+def test_busy_hasher_turns_logins_away(app, client):
+    app.extensions['password_hasher'].queue_limit = 0
+    response = login(client)
+    assert response.status_code == 503
+    assert b'Too many people are signing in' in response.data
+    assert app.extensions['password_hasher'].rejected == 1
+
+def test_hasher_bounds_its_queue_and_wait():
+    release = threading.Event()
+    hasher = PasswordHasher(workers=1, queue_limit=1, timeout=0.05)
+    try:
+        with pytest.raises(HasherBusy): # Timed out waiting
+            hasher.run(release.wait)
+        with pytest.raises(HasherBusy): # The timed-out check still holds the only place
+            hasher.run(len, 'pw')
+        assert (hasher.depth, hasher.rejected) == (1, 2)
+    finally:
+        release.set()
+    deadline = time.monotonic() + 5
+    while hasher.depth and time.monotonic() < deadline: # The place frees once the worker does
+        time.sleep(0.01)
+    assert hasher.run(len, 'pw') == 2
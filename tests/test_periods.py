@@ -0,0 +1,80 @@
+from datetime import date
+from decimal import Decimal
+from werkzeug.datastructures import MultiDict
+from app import rollups
+from app.models import User, PerformanceData
+from app.periods import parse_period, format_period, shift_period, last_months, parse_period_range, range_args
+from benchmarks.common import seed, login as login_as
+from .conftest import login
+from .test_leader_dashboard import expected_dashboard, normalised
+
+def raw_series(app, start, end):
+    with app.app_context():
+        series = {}
+        for row in PerformanceData.query.filter(PerformanceData.period.between(start, end)):
+            series[row.period] = series.get(row.period, Decimal('0.00')) + rollups.to_decimal(row.metric_value)
+        return dict(sorted(series.items()))
+
+def test_period_keys_round_trip():
+    assert parse_period('2024-05') == 202405
+    assert format_period(202405) == '2024-05'
+    assert format_period(99901) == '0999-01'
+    for text in ('2024-13', '2024-00', '2024-5', '24-05', '2024-05-01', '', None):
+        assert parse_period(text) is None, text
+    assert shift_period(202401, -1) == 202312
+    assert shift_period(202312, 1) == 202401
+    assert shift_period(202405, -24) == 202205
+    assert last_months(3, today=date(2024, 2, 10)) == (202312, 202402)
+
+def test_parse_period_range():
+    def parse(**args):
+        return parse_period_range(MultiDict(args))
+
+    assert parse() == (None, None)
+    assert parse(**{'from': '', 'to': ''}) == (None, None) # Empty form fields are open ends
+    assert parse(**{'from': '2024-01'}) == (202401, None)
+    assert parse(to='2024-03') == (None, 202403)
+    assert parse(**{'from': '2024-03', 'to': '2024-03'}) == (202403, 202403)
+    assert parse(**{'from': '2024-04', 'to': '2024-03'}) is None
+    assert parse(**{'from': '2024-4'}) is None
+    assert parse(months='12')[1] - parse(months='12')[0] == 99 # e.g. 202311..202410
+    for months in ('0', '-1', '1201', 'twelve'):
+        assert parse(months=months) is None, months
+    assert range_args((202401, None)) == {'from': '2024-01'}
+
+def test_dashboards_and_api_limit_to_the_range(app, client):
+    seed(app, leaders=2, members_per_leader=3, months=5)
+    login(client)
+    expected = raw_series(app, 202002, 202004)
+    total = sum(expected.values())
+
+    page = client.get('/admin/dashboard?from=2020-02&to=2020-04').get_data(as_text=True)
+    assert f'<strong>{total}</strong>' in page
+    assert 'from=2020-02' in page # Links keep the range
+
+    series = client.get('/api/admin/series?from=2020-02&to=2020-04').get_json()
+    assert series['labels'] == ['2020-02', '2020-03', '2020-04']
+    assert [rollups.to_decimal(value) for value in series['values']] == list(expected.values())
+    assert rollups.to_decimal(client.get('/api/admin/totals?from=2020-02&to=2020-04')
+                              .get_json()['total_performance']) == total
+
+    assert client.get('/admin/dashboard?from=2020-04&to=2020-02').status_code == 302
+    assert client.get('/api/admin/series?to=2020-4').status_code == 400
+
+def test_leader_dashboard_ranges_match_the_raw_rows(app):
+    seed(app, leaders=2, members_per_leader=[4, 2], months=6)
+    with app.app_context():
+        leader = User.query.filter_by(username='leader_0').one()
+        for start, end in ((202002, 202004), (None, 202001), (202006, None), (202101, 202112)):
+            assert normalised(rollups.leader_dashboard(leader.id, start=start, end=end)) == \
+                expected_dashboard(leader.id, start=start, end=end), (start, end)
+        expected = expected_dashboard(leader.id, start=202003, end=202005)
+
+    client = app.test_client()
+    login_as(client, 'leader_0')
+    page = client.get('/leader/dashboard?from=2020-03&to=2020-05').get_data(as_text=True)
+    assert f"<strong>{expected['total']}</strong>" in page
+    series = client.get('/api/leader/series?from=2020-03&to=2020-05').get_json()
+    assert series['labels'] == [format_period(period) for period, _ in expected['series']]
+    top = client.get('/api/leader/top-members?from=2020-03&to=2020-05').get_json()
+    assert [member['username'] for member in top] == [username for username, _ in expected['top']]
@@ -0,0 +1,56 @@
+import json
+import logging
+import pytest
+from app import create_app, profiler
+from app.models import db, User
+from benchmarks.common import seed
+from .conftest import login
+
+@pytest.fixture
+def profiled(app):
+    return create_app(dict(app.config, SQL_PROFILER=True, SQL_PROFILER_SAMPLE_RATE=0.0,
+                           SQL_PROFILER_REPEAT_THRESHOLD=3))
+
+def test_responses_carry_the_query_count_and_db_time(profiled):
+    client = profiled.test_client()
+    login(client)
+    response = client.get('/admin/dashboard')
+    assert int(response.headers['X-SQL-Queries']) > 0
+    assert float(response.headers['X-SQL-Time-Ms']) > 0
+    assert response.headers['X-SQL-N-Plus-One'] == '0'
+    assert response.headers['Server-Timing'].startswith('db;dur=')
+
+def test_headers_are_off_by_default(client):
+    login(client)
+    assert 'X-SQL-Queries' not in client.get('/admin/dashboard').headers
+
+def test_repeated_lookups_are_flagged_and_logged(profiled, caplog, monkeypatch):
+    # Alembic's fileConfig disables existing loggers when a migration test ran first
+    monkeypatch.setattr(profiler.logger, 'disabled', False)
+    seed(profiled, leaders=1, members_per_leader=4, months=1)
+    with profiled.app_context():
+        ids = [user.id for user in User.query.filter_by(role='offline')]
+        db.session.expunge_all()
+        with profiler.profiling('lookups') as profile:
+            for user_id in ids:
+                db.session.get(User, user_id)
+        repeated = profile.repeated(3)
+        assert len(repeated) == 1 and repeated[0][1] == 4
+
+        with caplog.at_level(logging.INFO, logger='app.sql_profiler'):
+            profiler.log_profile(profiled, profile, path='/lookups')
+        record, = caplog.records
+        assert record.levelno == logging.WARNING # Logged whatever the sample rate
+        summary = json.loads(record.getMessage())
+        assert summary['queries'] == 4 and summary['path'] == '/lookups'
+        assert summary['n_plus_one'][0]['count'] == 4
+
+def test_in_lists_and_executemany_are_not_counted_as_repeats():
+    profile = profiler.Profile('test')
+    profile.record('SELECT * FROM users WHERE id IN (?, ?)', 0.001, False)
+    profile.record('SELECT * FROM users WHERE id IN (?,?,?)', 0.001, False)
+    profile.record('SELECT  *\n FROM users WHERE id IN ( ? )', 0.001, False)
+    for _ in range(5):
+        profile.record('INSERT INTO users (username) VALUES (?)', 0.001, True)
+    assert profile.repeated(3) == [('SELECT * FROM users WHERE id IN (?)', 3)]
+    assert profile.count == 8
@@ -0,0 +1,12 @@
+from benchmarks.common import bench_app, seed
+from benchmarks.query_plans import check_plans
+
+def test_dashboards_and_imports_avoid_full_scans(tmp_path):
+    # Small, but seed() runs ANALYZE, so SQLite plans as it would on a full dataset
+    app = bench_app(f"sqlite:///{tmp_path / 'plans.db'}", PASSWORD_HASH_METHOD='pbkdf2:sha256:1000',
+                    METRICS_DIR=str(tmp_path / 'metrics'), CACHE_DIR=str(tmp_path / 'cache'),
+                    IMPORT_UPLOAD_FOLDER=str(tmp_path / 'imports'), IMPORT_REPORT_FOLDER=str(tmp_path / 'import_reports'))
+    seed(app, leaders=20, members_per_leader=10, months=3)
+    checked = check_plans(app, 'leader_0', 'offline_0')
+    assert len(checked) > 10
+    assert [(statement, bad) for statement, bad, _ in checked if bad] == []
@@ -0,0 +1,60 @@
+import io
+from openpyxl import Workbook
+from app.importers import UploadReader
+from app.importers.common import row_numbers
+
+def xlsx_upload(rows):
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+def read_all(reader):
+    try:
+        return list(reader.batches())
+    finally:
+        reader.close()
+
+def test_csv_is_read_in_fixed_size_batches(app):
+    body = 'username,role\n' + ''.join(f'user_{n},offline\n' for n in range(7))
+    with app.app_context():
+        reader = UploadReader(io.BytesIO(body.encode()), 'users.csv', size=3)
+        assert reader.columns == ['username', 'role']
+        batches = read_all(reader)
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+    assert batches[2]['username'].tolist() == ['user_6']
+    # Row numbers count the header as row 1, across batch boundaries
+    assert row_numbers(batches[1]).tolist() == [5, 6, 7]
+
+def test_csv_falls_back_to_latin1(app):
+    body = 'username,role\nren\xe9,offline\n'.encode('latin1')
+    with app.app_context():
+        batches = read_all(UploadReader(io.BytesIO(body), 'users.csv'))
+    assert batches[0]['username'].tolist() == ['ren\xe9']
+
+def test_xlsx_keeps_row_numbers_across_blank_rows(app):
+    upload = xlsx_upload([
+        ['username', 'role'],
+        ['a', 'offline'],
+        [None, None], # Blank row in the middle: kept so later row numbers line up
+        ['b', 'leader'],
+        ['c', None],
+    ])
+    with app.app_context():
+        reader = UploadReader(upload, 'users.xlsx', size=2)
+        assert reader.columns == ['username', 'role']
+        batches = read_all(reader)
+    assert [len(batch) for batch in batches] == [3, 1]
+    names = batches[0]['username'].tolist()
+    assert (names[0], names[2]) == ('a', 'b')
+    assert row_numbers(batches[1]).tolist() == [5]
+    assert batches[1]['username'].tolist() == ['c']
+
+def test_header_only_file_has_no_rows(app):
+    with app.app_context():
+        reader = UploadReader(io.BytesIO(b'username,role\n'), 'users.csv')
+        assert reader.columns == ['username', 'role']
+        assert sum(len(batch) for batch in read_all(reader)) == 0
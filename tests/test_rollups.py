@@ -0,0 +1,69 @@
+from decimal import Decimal
+import pandas as pd
+from sqlalchemy import func
+from app import rollups
+from app.importers import import_performance_frame
+from app.models import db, User, PerformanceData, CompanyPeriodTotal, LeaderPeriodTotal
+from benchmarks.common import seed
+from .conftest import login
+
+def raw_leader_totals():
+    rows = db.session.query(User.leader_id, func.sum(PerformanceData.metric_value))\
+        .join(User, User.id == PerformanceData.offline_user_id)\
+        .filter(User.leader_id.isnot(None)).group_by(User.leader_id)
+    return {leader_id: rollups.to_decimal(total) for leader_id, total in rows}
+
+def rollup_leader_totals():
+    rows = db.session.query(LeaderPeriodTotal.leader_id, func.sum(LeaderPeriodTotal.total))\
+        .group_by(LeaderPeriodTotal.leader_id)
+    return {leader_id: rollups.to_decimal(total) for leader_id, total in rows if total}
+
+def test_performance_imports_update_the_rollups(app):
+    seed(app, leaders=2, members_per_leader=3, months=2)
+    with app.app_context():
+        before = rollups.to_decimal(rollups.company_total())
+        old = PerformanceData.query.join(User, User.id == PerformanceData.offline_user_id)\
+            .filter(User.username == 'offline_0', PerformanceData.period == 202001).one().metric_value
+        result = import_performance_frame(pd.DataFrame([
+            ['offline_0', '2020-01', '1000'], # Changed
+            ['offline_4', '2020-03', '250.25'], # New period
+        ], columns=['offline_username', 'period', 'sales_amount']))
+        db.session.commit()
+        assert (result.created, result.updated) == (1, 1)
+        assert rollups.verify() == []
+        assert rollups.to_decimal(rollups.company_total()) == before + Decimal('1000.00') - old + Decimal('250.25')
+        assert rollup_leader_totals() == raw_leader_totals()
+
+def test_member_moves_and_role_changes_update_the_rollups(app, client):
+    seed(app, leaders=2, members_per_leader=2, months=3)
+    login(client)
+    with app.app_context():
+        member = User.query.filter_by(username='offline_0').one()
+    response = client.post(f'/admin/users/{member.id}/edit', data={
+        'username': 'offline_0', 'role': 'offline', 'leader_username': 'leader_1'})
+    assert response.status_code == 302
+    with app.app_context():
+        assert rollups.verify() == []
+        assert rollup_leader_totals() == raw_leader_totals()
+
+    # No longer an offline user: their sales leave the offline totals
+    response = client.post(f'/admin/users/{member.id}/edit', data={'username': 'offline_0', 'role': 'admin'})
+    assert response.status_code == 302
+    with app.app_context():
+        assert rollups.verify() == []
+        assert rollup_leader_totals() == raw_leader_totals()
+
+def test_verify_and_rebuild_commands(app):
+    seed(app, leaders=1, members_per_leader=2, months=2)
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=['verify-rollups']).exit_code == 0
+
+    with app.app_context():
+        CompanyPeriodTotal.query.filter_by(period=202001).update({'total': CompanyPeriodTotal.total + 1})
+        db.session.commit()
+    result = runner.invoke(args=['verify-rollups'])
+    assert result.exit_code == 1
+    assert 'rollup_company_period (202001,)' in result.output
+
+    assert runner.invoke(args=['rebuild-rollups']).exit_code == 0
+    assert runner.invoke(args=['verify-rollups']).exit_code == 0
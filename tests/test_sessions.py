@@ -0,0 +1,43 @@
+from sqlalchemy import event
+from app.models import db, UserSession
+from .conftest import login
+
+def session_rows(app):
+    with app.app_context():
+        return UserSession.query.count()
+
+def session_cookie(client):
+    cookie = client.get_cookie('session')
+    return cookie.value if cookie else None
+
+def test_anonymous_flash_stays_in_the_cookie(app, client):
+    client.get('/admin/users') # Redirects to the login page with a flash
+    assert session_rows(app) == 0
+    assert '.' in session_cookie(client) # Signed cookie, not a session id
+    assert b'Please log in to access this page.' in client.get('/auth/login').data
+    assert session_cookie(client) is None # The flash was shown, so the cookie is cleared
+    assert session_rows(app) == 0
+
+def test_login_stores_a_row_and_logout_removes_it(app, client):
+    login(client)
+    assert session_rows(app) == 1
+    assert '.' not in session_cookie(client)
+    client.get('/auth/logout')
+    assert session_rows(app) == 0
+    assert b'You have been logged out.' in client.get('/auth/login').data
+    assert client.get('/admin/dashboard').status_code == 302
+
+def test_static_and_readiness_requests_skip_the_lookup(app, client):
+    login(client)
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        assert client.get('/readyz').status_code == 200
+        assert client.get('/static/style.css').status_code == 200
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert statements == []
+    assert client.get('/admin/dashboard').status_code == 200 # Still signed in